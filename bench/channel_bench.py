@@ -0,0 +1,229 @@
+"""
+Channel benchmark suite
+- measures latency, throughput and fan-out scaling of channel backends
+- scenarios: ping-pong latency, multicast, broadcast, receive with idle peers,
+  join/leave churn
+- runs across member counts and payload sizes
+- writes machine-readable results (JSON or CSV)
+
+Attention: the redis backends flush the redis database before each measurement!
+"""
+
+import argparse
+import csv
+import json
+import logging
+import sys
+import threading
+import time
+
+from context import lab_logging
+
+lab_logging.setup(stream_level=logging.WARNING, file_postfix='-bench', asynchronous=True)
+
+logger = logging.getLogger("vs2lab.bench.channel_bench")
+
+SCENARIOS = ['pingpong', 'multicast', 'broadcast', 'idle_peers', 'churn']
+
+
+def create_channel(backend: str, n_bits: int, host: str, port: int, shards: list = None):
+    """
+    Create a channel instance of a backend (imported lazily, so 'local' needs no redis)
+    :param backend: one of 'redis', 'stream', 'local'
+    :param n_bits: address range of the channel
+    :param host: redis host
+    :param port: redis port
+    :param shards: optional list of (host, port) tuples of redis instances holding the queues
+    :return: channel instance
+    """
+    if backend == 'local':
+        from lib import lab_local_channel  # pylint: disable=import-outside-toplevel
+        return lab_local_channel.LocalChannel(n_bits=n_bits)
+    from lib import lab_channel  # pylint: disable=import-outside-toplevel
+    if backend == 'stream':
+        return lab_channel.StreamChannel(n_bits=n_bits, host_ip=host, port_no=port, shards=shards)
+    return lab_channel.Channel(n_bits=n_bits, host_ip=host, port_no=port, shards=shards)
+
+
+class Bench:
+    """Runs benchmark scenarios for one backend and collects result rows"""
+
+    def __init__(self, backend: str, n_bits: int, host: str, port: int, ops: int, shards: list = None):
+        self.backend: str = backend
+        self.n_bits: int = n_bits
+        self.host: str = host
+        self.port: int = port
+        self.ops: int = ops
+        self.results: list = []
+        # channel instances are reused by all measurements
+        self.sender = create_channel(backend, n_bits, host, port, shards)
+        self.receiver = create_channel(backend, n_bits, host, port, shards)
+        self.filler = create_channel(backend, n_bits, host, port, shards)
+
+    def setup(self, members: int) -> tuple:
+        """
+        Flush the channel and join a bound sender, a bound receiver
+        and unbound members up to the given group size.
+        :param members: total number of members
+        :return: sender id, receiver id, set of all member ids
+        """
+        self.sender.flushall()
+        sender: str = self.sender.join('bench')
+        self.sender.bind(sender)
+        receiver: str = self.receiver.join('bench')
+        self.receiver.bind(receiver)
+        for _ in range(members - 2):
+            self.filler.join('idle')
+        return sender, receiver, self.sender.subgroup('bench') | self.sender.subgroup('idle')
+
+    def record(self, scenario: str, members: int, payload: int, samples: list, total: float, messages: int):
+        samples = sorted(samples)
+        row: dict = {
+            'backend': self.backend,
+            'scenario': scenario,
+            'members': members,
+            'payload': payload,
+            'ops': len(samples),
+            'seconds': round(total, 6),
+            'msgs_per_sec': round(messages / total, 1) if total > 0 else None,
+            'p50_us': round(samples[len(samples) // 2] * 1e6, 1),
+            'p99_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6, 1),
+        }
+        logger.info(row)
+        self.results.append(row)
+
+    def pingpong(self, members: int, payload: int):
+        """One-to-one round trip latency (an echo thread returns each message)"""
+        _, server, _ = self.setup(members)
+        sender, receiver = self.sender, self.receiver
+        message: bytes = b'x' * payload
+
+        def echo():
+            for _ in range(self.ops):
+                client, msg = receiver.receive_from_any()
+                receiver.send_to({client}, msg)
+
+        echo_thread = threading.Thread(target=echo, daemon=True)
+        echo_thread.start()
+        samples: list = []
+        start: float = time.perf_counter()
+        for _ in range(self.ops):
+            t: float = time.perf_counter()
+            sender.send_to({server}, message)
+            sender.receive_from({server})
+            samples.append(time.perf_counter() - t)
+        total: float = time.perf_counter() - start
+        echo_thread.join()
+        self.record('pingpong', members, payload, samples, total, 2 * self.ops)
+
+    def multicast(self, members: int, payload: int):
+        """send_to throughput for a multicast to all other members"""
+        me, _, ids = self.setup(members)
+        destinations: set = ids - {me}
+        self.__sends('multicast', members, payload,
+                     lambda message: self.sender.send_to(destinations, message), len(destinations))
+
+    def broadcast(self, members: int, payload: int):
+        """send_to_all throughput"""
+        _, _, ids = self.setup(members)
+        self.__sends('broadcast', members, payload, self.sender.send_to_all, len(ids))
+
+    def __sends(self, scenario: str, members: int, payload: int, send, fanout: int):
+        message: bytes = b'x' * payload
+        ops: int = max(1, min(self.ops, 100000 // max(1, fanout)))  # bound memory use of the queues
+        samples: list = []
+        start: float = time.perf_counter()
+        for _ in range(ops):
+            t: float = time.perf_counter()
+            send(message)
+            samples.append(time.perf_counter() - t)
+        total: float = time.perf_counter() - start
+        self.record(scenario, members, payload, samples, total, ops * fanout)
+        self.sender.flushall()
+
+    def idle_peers(self, members: int, payload: int):
+        """receive_from_any on a single pending message while all other peers stay idle"""
+        _, server, _ = self.setup(members)
+        sender, receiver = self.sender, self.receiver
+        message: bytes = b'x' * payload
+        samples: list = []
+        start: float = time.perf_counter()
+        for _ in range(self.ops):
+            sender.send_to({server}, message)
+            t: float = time.perf_counter()
+            receiver.receive_from_any()
+            samples.append(time.perf_counter() - t)
+        total: float = time.perf_counter() - start
+        self.record('idle_peers', members, payload, samples, total, self.ops)
+
+    def churn(self, members: int, payload: int):
+        """join/leave cycles while the group has the given size"""
+        self.setup(members)
+        chan = self.filler
+        ops: int = max(1, self.ops // 10)
+        samples: list = []
+        start: float = time.perf_counter()
+        for _ in range(ops):
+            t: float = time.perf_counter()
+            chan.bind(chan.join('churn'))
+            chan.leave('churn')
+            samples.append(time.perf_counter() - t)
+        total: float = time.perf_counter() - start
+        self.record('churn', members, 0, samples, total, ops)
+
+
+def write_results(results: list, output: str, fmt: str) -> None:
+    """
+    Write result rows as JSON or CSV
+    :param results: list of result dicts
+    :param output: file name or '-' for stdout
+    :param fmt: 'json' or 'csv'
+    """
+    stream = sys.stdout if output == '-' else open(output, 'w', newline='')
+    try:
+        if fmt == 'csv':
+            writer = csv.DictWriter(stream, fieldnames=list(results[0].keys()) if results else [])
+            writer.writeheader()
+            writer.writerows(results)
+        else:
+            json.dump(results, stream, indent=2)
+            stream.write('\n')
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark lab_channel backends.')
+    parser.add_argument('--backend', default='redis', choices=['redis', 'stream', 'local'])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma separated subset of ' + ','.join(SCENARIOS))
+    parser.add_argument('--members', default='2,8,64,256,1024', help='comma separated member counts')
+    parser.add_argument('--payloads', default='16,1024,65536', help='comma separated payload sizes in bytes')
+    parser.add_argument('--ops', type=int, default=1000, help='operations per measurement')
+    parser.add_argument('--n-bits', type=int, default=16, help='address range of the channel')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6379)
+    parser.add_argument('--shards', default='',
+                        help='comma separated host:port list of redis instances holding the queues')
+    parser.add_argument('--format', default='json', choices=['json', 'csv'])
+    parser.add_argument('--output', default='-', help="result file (default '-' for stdout)")
+    args = parser.parse_args(argv)
+
+    shards: list = [(address.rsplit(':', 1)[0], int(address.rsplit(':', 1)[1]))
+                    for address in args.shards.split(',') if address]
+    bench = Bench(args.backend, args.n_bits, args.host, args.port, args.ops, shards)
+    member_counts: list = [int(m) for m in args.members.split(',')]
+    payloads: list = [int(p) for p in args.payloads.split(',')]
+    for scenario in args.scenarios.split(','):
+        assert scenario in SCENARIOS, 'unknown scenario ' + scenario
+        for members in member_counts:
+            assert 2 <= members <= 2 ** args.n_bits, 'member count out of range'
+            # churn does not depend on payload size
+            for payload in payloads if scenario != 'churn' else payloads[:1]:
+                getattr(bench, scenario)(members, payload)
+    write_results(bench.results, args.output, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Channel monitor
+- inspects the queues of lab_channel.Channel and the inboxes of lab_channel.StreamChannel
+- views: per-queue depth and oldest-message age, per-member inbound/outbound backlog,
+  top-N hottest queues (fastest growing)
+- samples keys with SCAN in bounded batches, so monitoring a large deployment does not load redis
+- refreshes live until interrupted (or prints once)
+
+Message ages of list queues are only known for channels created with timestamps=True.
+Stream inboxes always have them (entry ids contain the send time).
+Messages are never transferred: only the timestamp prefix of queue heads and the ids of inbox entries are fetched.
+"""
+
+import argparse
+import ast
+import sys
+import time
+
+import redis
+
+from context import lab_logging  # pylint: disable=unused-import
+from lib import lab_channel, lab_serializer
+
+VIEWS = ['queues', 'members', 'top']
+
+# ANSI sequence moving the cursor home and clearing the screen
+CLEAR = '\x1b[H\x1b[J'
+
+# Depth and head of a queue without transferring the message:
+# only the timestamp prefix (lab_serializer.TIMESTAMP_SIZE bytes) of the head is returned,
+# or the whole head if it is a (short) reference to a shared payload.
+# KEYS: queue key
+# Returns {depth, head prefix or false if the queue is empty}.
+HEAD_SCRIPT = """
+local head = redis.call('LINDEX', KEYS[1], 0)
+if head and string.sub(head, 1, 1) ~= 'R' then
+    head = string.sub(head, 1, 9)
+end
+return {redis.call('LLEN', KEYS[1]), head}
+"""
+
+# Id of the first stream entry after a given id, without transferring the entry.
+# KEYS: stream key
+# ARGV: entry id
+# Returns the entry id or false if there is none.
+NEXT_ID_SCRIPT = """
+for _, entry in ipairs(redis.call('XRANGE', KEYS[1], ARGV[1], '+', 'COUNT', 2)) do
+    if entry[1] ~= ARGV[1] then
+        return entry[1]
+    end
+end
+return false
+"""
+
+
+class QueueSample:
+    """Last measurement of a queue (a redis list of Channel or a stream inbox of StreamChannel)"""
+
+    def __init__(self, key: str, sender: str, receiver: str, depth: int, oldest: float, sampled: float):
+        self.key: str = key
+        # sender is '*' for stream inboxes (they hold messages of all senders)
+        self.sender: str = sender
+        self.receiver: str = receiver
+        self.depth: int = depth
+        # send time of the oldest message (None if unknown)
+        self.oldest: float = oldest
+        self.sampled: float = sampled
+        # depth change per second since the previous measurement (None for the first one)
+        self.rate: float = None
+
+    def age(self, now: float) -> float:
+        return None if self.oldest is None else max(0.0, now - self.oldest)
+
+
+class Monitor:
+    """
+    Monitor samples the queues of a channel deployment.
+
+    Each refresh scans at most 'sample' keys per redis instance, continuing the SCAN of the previous refresh.
+    Thus, small deployments are measured completely on every refresh,
+    while large ones are covered over several refreshes at a bounded cost each.
+    Measurements are kept until a full SCAN cycle of their instance did not see their key anymore
+    (empty queues do not exist in redis).
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 6379, shards: list = None,
+                 sample: int = 1000, scan_count: int = 100):
+        """
+        :param host: main redis instance of the channel
+        :param port: port of the main redis instance
+        :param shards: optional list of (host, port) tuples of redis instances holding the queues
+        :param sample: maximum number of keys measured per instance and refresh
+        :param scan_count: SCAN batch size hint
+        """
+        clients: list = [redis.StrictRedis(host=host, port=port, db=0)]
+        clients += [redis.StrictRedis(host=h, port=p, db=0) for h, p in shards or []]
+        # one client per distinct instance
+        self.clients: list = list({(c.connection_pool.connection_kwargs['host'],
+                                    c.connection_pool.connection_kwargs['port']): c for c in clients}.values())
+        self.sample: int = sample
+        self.scan_count: int = scan_count
+        # per instance: SCAN cursor, keys seen in the current cycle
+        self.__cursors: list = [0] * len(self.clients)
+        self.__seen: list = [set() for _ in self.clients]
+        # maps (instance index, key) to QueueSample
+        self.samples: dict = {}
+        self.__head_script = self.clients[0].register_script(HEAD_SCRIPT)
+        self.__next_id_script = self.clients[0].register_script(NEXT_ID_SCRIPT)
+
+    def refresh(self) -> list:
+        """
+        Scan and measure the next batch of keys of every instance.
+        :return: list of all current QueueSamples
+        """
+        for index, client in enumerate(self.clients):
+            self.__refresh(index, client)
+        return list(self.samples.values())
+
+    def __refresh(self, index: int, client: redis.StrictRedis) -> None:
+        queues, inboxes, wrapped = self.__scan(index, client)
+        now: float = time.time()
+        self.__measure_queues(index, client, queues, now)
+        self.__measure_inboxes(index, client, inboxes, now)
+        if wrapped:
+            # drop keys that vanished during the completed cycle
+            for key in [k for k in self.samples if k[0] == index and k[1] not in self.__seen[index]]:
+                del self.samples[key]
+            self.__seen[index] = set()
+
+    def __scan(self, index: int, client: redis.StrictRedis) -> tuple:
+        queues: list = []
+        inboxes: list = []
+        cursor: int = self.__cursors[index]
+        wrapped: bool = False
+        while len(queues) + len(inboxes) < self.sample:
+            cursor, keys = client.scan(cursor, count=self.scan_count)
+            for key in keys:
+                key = key.decode(errors='replace')
+                if key.startswith("['"):
+                    queues.append(key)
+                elif key.startswith('inbox:'):
+                    inboxes.append(key)
+            if cursor == 0:
+                wrapped = True
+                break
+        self.__cursors[index] = cursor
+        self.__seen[index].update(queues, inboxes)
+        return queues, inboxes, wrapped
+
+    def __measure_queues(self, index: int, client: redis.StrictRedis, keys: list, now: float) -> None:
+        if not keys:
+            return
+        # depth and head (timestamp of the oldest message) of all queues in one round trip
+        with client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                self.__head_script(keys=[key], client=pipe)
+            results: list = pipe.execute()
+        heads: dict = {}
+        references: dict = {}
+        for key, (depth, head) in zip(keys, results):
+            if not depth:
+                self.samples.pop((index, key), None)
+                continue
+            heads[key] = (depth, head)
+            if head is not None and head[:1] == lab_channel.REFERENCE_TAG:
+                references[key] = head[1:].decode()
+        if references:
+            # shared payloads keep the timestamp of their data in a field of its own
+            with client.pipeline(transaction=False) as pipe:
+                for payload_key in references.values():
+                    pipe.hget(payload_key, 'ts')
+                stamps: list = pipe.execute()
+            for key, stamp in zip(references, stamps):
+                heads[key] = (heads[key][0], stamp)
+        for key, (depth, head) in heads.items():
+            try:
+                sender, receiver = ast.literal_eval(key)
+            except (ValueError, SyntaxError):
+                continue
+            oldest = lab_serializer.timestamp(head) if head is not None else None
+            self.__update(index, QueueSample(key, sender, receiver, depth, oldest, now))
+
+    def __measure_inboxes(self, index: int, client: redis.StrictRedis, keys: list, now: float) -> None:
+        if not keys:
+            return
+        # group state (pending entries, lag and last delivered id) of all inboxes in one round trip
+        with client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.xinfo_groups(key)
+                pipe.xpending(key, lab_channel.StreamChannel.GROUP)
+                pipe.xlen(key)
+            results: list = pipe.execute(raise_on_error=False)
+        depths: dict = {}
+        oldest_ids: dict = {}
+        undelivered_from: dict = {}
+        for i, key in enumerate(keys):
+            groups, summary, length = results[3 * i:3 * i + 3]
+            if any(isinstance(result, Exception) for result in (groups, summary, length)):
+                continue
+            group: dict = next((g for g in groups if g['name'] == lab_channel.StreamChannel.GROUP.encode()), None)
+            if group is None:
+                continue
+            # entries are deleted once read or acknowledged, so the stream length is the backlog
+            # unless the group reports its lag (entries not yet delivered)
+            lag: int = group.get('lag')
+            depth: int = length if lag is None else summary['pending'] + lag
+            if not depth:
+                self.samples.pop((index, key), None)
+                continue
+            depths[key] = depth
+            if summary['pending']:
+                oldest_ids[key] = summary['min']
+            else:
+                undelivered_from[key] = group['last-delivered-id']
+        if undelivered_from:
+            # ids of the oldest entries not yet delivered to the group
+            with client.pipeline(transaction=False) as pipe:
+                for key, last in undelivered_from.items():
+                    self.__next_id_script(keys=[key], args=[last], client=pipe)
+                oldest_ids.update(zip(undelivered_from, pipe.execute()))
+        for key, depth in depths.items():
+            oldest_id: bytes = oldest_ids.get(key)
+            oldest: float = None if oldest_id is None else int(oldest_id.split(b'-')[0]) / 1000
+            self.__update(index, QueueSample(key, '*', key[len('inbox:'):], depth, oldest, now))
+
+    def __update(self, index: int, sample: QueueSample) -> None:
+        previous: QueueSample = self.samples.get((index, sample.key))
+        if previous is not None and sample.sampled > previous.sampled:
+            sample.rate = (sample.depth - previous.depth) / (sample.sampled - previous.sampled)
+        self.samples[(index, sample.key)] = sample
+
+
+def format_age(seconds: float) -> str:
+    if seconds is None:
+        return '-'
+    if seconds < 120:
+        return '{:.1f}s'.format(seconds)
+    if seconds < 7200:
+        return '{:.1f}m'.format(seconds / 60)
+    return '{:.1f}h'.format(seconds / 3600)
+
+
+def format_table(header: list, rows: list) -> str:
+    widths: list = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    return '\n'.join('  '.join(str(cell).rjust(width) for cell, width in zip(row, widths))
+                     for row in [header] + rows)
+
+
+def queues_view(samples: list, now: float, limit: int) -> str:
+    """Queues ordered by depth"""
+    samples = sorted(samples, key=lambda s: s.depth, reverse=True)[:limit]
+    return format_table(['sender', 'receiver', 'depth', 'oldest'],
+                        [[s.sender, s.receiver, s.depth, format_age(s.age(now))] for s in samples])
+
+
+def members_view(samples: list, now: float, limit: int) -> str:
+    """Inbound and outbound backlog per member, ordered by total backlog"""
+    # maps member id to [inbound, outbound, oldest inbound send time]
+    members: dict = {}
+    for s in samples:
+        inbound: list = members.setdefault(s.receiver, [0, 0, None])
+        inbound[0] += s.depth
+        if s.oldest is not None and (inbound[2] is None or s.oldest < inbound[2]):
+            inbound[2] = s.oldest
+        if s.sender != '*':
+            members.setdefault(s.sender, [0, 0, None])[1] += s.depth
+    rows: list = sorted(members.items(), key=lambda m: m[1][0] + m[1][1], reverse=True)[:limit]
+    return format_table(['member', 'inbound', 'outbound', 'oldest inbound'],
+                        [[pid, i, o, format_age(None if t is None else max(0.0, now - t))]
+                         for pid, (i, o, t) in rows])
+
+
+def top_view(samples: list, now: float, limit: int) -> str:
+    """Fastest growing queues (by depth until a second measurement exists)"""
+    samples = sorted(samples, key=lambda s: (s.rate or 0.0, s.depth), reverse=True)[:limit]
+    return format_table(['sender', 'receiver', 'depth', 'growth/s', 'oldest'],
+                        [[s.sender, s.receiver, s.depth, '-' if s.rate is None else '{:+.1f}'.format(s.rate),
+                          format_age(s.age(now))] for s in samples])
+
+
+def render(monitor: Monitor, view: str, samples: list, limit: int) -> str:
+    now: float = time.time()
+    title: str = '{} - {} queues sampled on {} instance(s) - {}'.format(
+        view, len(samples), len(monitor.clients), time.strftime('%H:%M:%S'))
+    table: str = {'queues': queues_view, 'members': members_view, 'top': top_view}[view](samples, now, limit)
+    return title + '\n\n' + table + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Monitor queue backlogs of lab_channel deployments.')
+    parser.add_argument('--view', default='queues', choices=VIEWS)
+    parser.add_argument('--top', type=int, default=20, help='number of rows shown')
+    parser.add_argument('--interval', type=float, default=2.0, help='seconds between refreshes')
+    parser.add_argument('--once', action='store_true', help='print a single refresh and exit')
+    parser.add_argument('--sample', type=int, default=1000, help='keys measured per instance and refresh')
+    parser.add_argument('--scan-count', type=int, default=100, help='SCAN batch size hint')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6379)
+    parser.add_argument('--shards', default='',
+                        help='comma separated host:port list of redis instances holding the queues')
+    args = parser.parse_args(argv)
+
+    shards: list = [(address.rsplit(':', 1)[0], int(address.rsplit(':', 1)[1]))
+                    for address in args.shards.split(',') if address]
+    monitor = Monitor(args.host, args.port, shards, args.sample, args.scan_count)
+    try:
+        while True:
+            output: str = render(monitor, args.view, monitor.refresh(), args.top)
+            if args.once:
+                sys.stdout.write(output)
+                return
+            sys.stdout.write(CLEAR + output)
+            sys.stdout.flush()
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,136 @@
 """
 Client and server using classes
+
+Wire protocol: every request and response is a frame, i.e. a 4 byte length header (network byte order)
+followed by the UTF-8 encoded message. A request starts with a character giving its type (see const_cs):
+GET followed by a single name, GET_MANY followed by a JSON array of names (batch),
+or GET_PREFIX followed by a prefix (all names starting with prefix, getall if the prefix is empty).
+Names and prefixes are never interpreted, so any name can be looked up.
+Malformed requests make the server close the connection.
+Responses are JSON objects mapping names to numbers (null if unknown).
+getall and prefix responses are streamed as a sequence of frames, each holding up to GETALL_CHUNK entries,
+terminated by an empty frame. Clients may send further requests before the responses have arrived
+(pipelining), responses are sent in the order of the requests.
 """
 
+import itertools
 import logging
+import selectors
 import socket
 import json
+import struct
+from collections import OrderedDict, deque
 from typing import Dict
 
 import const_cs
 from context import lab_logging
+from phonebook import PhonebookStore
 
 lab_logging.setup(stream_level=logging.DEBUG)  # init loging channels for the lab
 
 # pylint: disable=logging-not-lazy, line-too-long
 
+HEADER = struct.Struct("!I")  # frame header holding the length of the message
+
+
+def frame(message: bytes) -> bytes:
+    """Prefix a message with its length"""
+    return HEADER.pack(len(message)) + message
+
+
+def recv_exactly(sock, size: int):
+    """Receive exactly size bytes (None if the peer closed the connection before sending any of them)"""
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            if received == 0:
+                return None
+            raise ConnectionError("connection closed within a frame")
+        received += count
+    return bytes(data)
+
+
+def recv_frame(sock, limit: int = None):
+    """
+    Receive the message of the next frame (None if the peer closed the connection).
+    Messages longer than limit are rejected with a ValueError before they are received.
+    """
+    header = recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    (length,) = HEADER.unpack(header)
+    if limit is not None and length > limit:
+        raise ValueError("frame too large")
+    if length == 0:
+        return b""
+    message = recv_exactly(sock, length)
+    if message is None:
+        raise ConnectionError("connection closed within a frame")
+    return message
+
 
 class Server:
-    """The server"""
+    """
+    The server
+
+    By default, the server handles one connection at a time with blocking sockets.
+    With concurrent=True, it serves many connections at once in a single thread:
+    non-blocking sockets are multiplexed by a selector (epoll/kqueue where available).
+
+    The phonebook is a dict by default. Given a store file, the server opens a PhonebookStore instead,
+    which keeps the entries on disk (see phonebook.py).
+    Responses are produced lazily (see _respond()), so streaming the phonebook takes bounded memory.
+    The concurrent server encodes the next chunk only when less than SEND_BUFFER bytes are pending.
+
+    Encoded responses are cached (see _encoded()): the getall response (up to GETALL_CACHE_LIMIT bytes)
+    and the responses of the RESPONSE_CACHE_SIZE most recently requested names.
+    The cache is dropped when the phonebook changes, i.e. it is replaced or a PhonebookStore is written to.
+    Dict phonebooks must not be changed in place, as getall responses iterate them lazily:
+    update() replaces them by an updated copy, so streams in progress finish with the old entries.
+    """
 
     _logger = logging.getLogger("vs2lab.lab1.clientserver.Server")
     _serving = True
 
-    def __init__(self):
-        self.phonebook = {"Alex": "+491514353453", "Bob": "+491233423423", "Charlie": "+49324234234124234", "Björn": "12345"}
+    def __init__(self, concurrent: bool = False, port: int = const_cs.PORT, store: str = None):
+        self.concurrent = concurrent
+        if store is not None:
+            self.phonebook = PhonebookStore(store)
+        else:
+            self.phonebook = {"Alex": "+491514353453", "Bob": "+491233423423", "Charlie": "+49324234234124234", "Björn": "12345"}
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.setsockopt(
             socket.SOL_SOCKET, socket.SO_REUSEADDR, 1
         )  # prevents errors due to "addresses in use"
-        self.sock.bind((const_cs.HOST, const_cs.PORT))
+        self.sock.bind((const_cs.HOST, port))
         self.sock.settimeout(3)  # time out in order not to block forever
         self._logger.info("Server bound to socket " + str(self.sock))
+        self._cache_state = None  # phonebook state the cached responses belong to
+        self._cached_phonebook = None
+        self._getall_cache = None  # encoded frames of the getall response
+        self._name_cache = OrderedDict()  # encoded responses of single names (least recently used first)
+
+    def update(self, entries):
+        """Change phonebook entries and drop cached responses"""
+        if isinstance(self.phonebook, dict):
+            phonebook = dict(self.phonebook)
+            phonebook.update(entries)
+            self.phonebook = phonebook
+        else:
+            self.phonebook.update(entries)
+
+    def _phonebook_state(self):
+        """Identity and version of the phonebook (compared to detect changes)"""
+        return (id(self.phonebook), getattr(self.phonebook, "version", None))
 
     def serve(self):
         """Serve echo"""
+        if self.concurrent:
+            self._serve_concurrent()
+            return
         self._logger.debug("Server starting...")
         self.sock.listen(1)
         self._logger.debug("Server listening for connections...")
@@ -46,26 +144,10 @@ class Server:
                     self.sock.accept()
                 )  # returns new socket and address of client
                 self._logger.info("Connection from " + str(address))
-                while True:  # forever
-                    self._logger.debug("Waiting for data...")
-                    data = connection.recv(1024)  # receive data from client
-                    if not data:
-                        self._logger.info("Client disconnected")
-                        break  # stop if client stopped
-                    self._logger.debug("Data received: " + str(data))
-                    request = data.decode("utf-8")
-                    if request == "*":
-                        self._logger.info("Sending all phonebook entries")
-                        response = json.dumps(self.phonebook)
-                    else:
-                        self._logger.info(f"Sending entry for {request}")
-                        response = json.dumps(
-                            {request: self.phonebook.get(request, None)}
-                        )
-                    self._logger.debug("Sending response: " + response)
-                    connection.send(
-                        response.encode("utf-8")
-                    )  # return sent data plus an "*"
+                try:
+                    self._handle(connection)
+                except OSError as ex:  # e.g. the client disconnected within a frame
+                    self._logger.warning("Connection failed: " + str(ex))
                 self._logger.debug("Closing connection")
                 connection.close()  # close the connection
             except socket.timeout:
@@ -74,32 +156,356 @@ class Server:
         self.sock.close()
         self._logger.info("Server down.")
 
+    def _handle(self, connection):
+        """Answer the requests of a connection until the client disconnects or sends an invalid request"""
+        while True:  # forever
+            self._logger.debug("Waiting for data...")
+            try:
+                data = recv_frame(connection, const_cs.MAX_REQUEST)  # receive request from client
+            except ValueError:
+                self._logger.warning("Request too large")
+                break  # drop the connection, the rest of the frame is not read
+            if data is None:
+                self._logger.info("Client disconnected")
+                break  # stop if client stopped
+            self._logger.debug("Data received: " + str(data))
+            try:
+                kind, argument = self._request(data)
+            except ValueError:
+                self._logger.warning("Malformed request")
+                break
+            for response in self._encoded(kind, argument):
+                connection.sendall(response)
+
+    @staticmethod
+    def _request(data: bytes):
+        """Decode a request into its type and argument (ValueError if it is malformed)"""
+        request = data.decode("utf-8")
+        kind, argument = request[:1], request[1:]
+        if kind in (const_cs.GET, const_cs.GET_PREFIX):
+            return kind, argument
+        if kind == const_cs.GET_MANY:
+            names = json.loads(argument)
+            if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+                raise ValueError("batch request is no list of names")
+            return kind, names
+        raise ValueError("unknown request type")
+
+    def _respond(self, kind: str, argument):
+        """Generate the response messages of a request (getall: chunks of entries and an empty end message)"""
+        if kind == const_cs.GET_PREFIX:
+            if not argument:
+                self._logger.info("Sending all phonebook entries")
+                entries = iter(self.phonebook.items())
+            else:
+                self._logger.info(f"Sending entries starting with {argument}")
+                entries = self._prefix(argument)
+            while True:
+                chunk = dict(itertools.islice(entries, const_cs.GETALL_CHUNK))
+                if not chunk:
+                    break
+                yield json.dumps(chunk)
+            yield ""  # end of stream
+            return
+        if kind == const_cs.GET_MANY:
+            self._logger.info(f"Sending entries for {len(argument)} names")
+            yield json.dumps({name: self.phonebook.get(name, None) for name in argument})
+            return
+        self._logger.info(f"Sending entry for {argument}")
+        yield json.dumps({argument: self.phonebook.get(argument, None)})
+
+    def _encoded(self, kind: str, argument):
+        """Generate the response frames of a request, taken from the cache if possible"""
+        state = self._phonebook_state()
+        if state != self._cache_state:
+            self._cache_state = state
+            self._cached_phonebook = self.phonebook  # keeps the id of the phonebook from being reused
+            self._getall_cache = None
+            self._name_cache.clear()
+        getall = kind == const_cs.GET_PREFIX and not argument
+        if getall and self._getall_cache is not None:
+            self._logger.info("Sending all phonebook entries (cached)")
+            # frame by frame, so the concurrent server still buffers at most SEND_BUFFER bytes ahead
+            yield from self._getall_cache
+            return
+        single = kind == const_cs.GET
+        if single and argument in self._name_cache:
+            self._name_cache.move_to_end(argument)
+            yield self._name_cache[argument]
+            return
+        frames = [] if getall else None
+        size = 0
+        for response in self._respond(kind, argument):
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("Sending response: " + response)
+            data = frame(response.encode("utf-8"))
+            if frames is not None:
+                size += len(data)
+                frames.append(data)
+                if size > const_cs.GETALL_CACHE_LIMIT:
+                    frames = None
+            yield data
+        # only cache responses of an unchanged phonebook (getall may have been streamed while it changed)
+        if self._phonebook_state() != state or self._cache_state != state:
+            return
+        if frames is not None:
+            self._getall_cache = frames
+        elif single:
+            self._name_cache[argument] = data
+            if len(self._name_cache) > const_cs.RESPONSE_CACHE_SIZE:
+                self._name_cache.popitem(last=False)
+
+    def _prefix(self, prefix: str):
+        """Iterate (name, number) tuples of all names starting with prefix"""
+        if isinstance(self.phonebook, PhonebookStore):
+            return self.phonebook.prefix(prefix)
+        return ((name, number) for name, number in sorted(self.phonebook.items()) if name.startswith(prefix))
+
+    def _serve_concurrent(self):
+        """Serve many connections at once with non-blocking sockets"""
+        self._logger.debug("Server starting (concurrent)...")
+        self.sock.listen(const_cs.BACKLOG)
+        self.sock.setblocking(False)
+        selector = selectors.DefaultSelector()
+        selector.register(self.sock, selectors.EVENT_READ)
+        self._logger.debug("Server listening for connections...")
+        while self._serving:  # checked at least every SELECT_TIMEOUT seconds
+            for key, events in selector.select(timeout=const_cs.SELECT_TIMEOUT):
+                if key.fileobj is self.sock:
+                    self._accept(selector)
+                else:
+                    self._service(selector, key, events)
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+        self._logger.info("Server down.")
+
+    def _accept(self, selector):
+        """Accept all pending connections"""
+        while True:
+            try:
+                (connection, address) = self.sock.accept()
+            except BlockingIOError:
+                return
+            self._logger.info("Connection from " + str(address))
+            connection.setblocking(False)
+            selector.register(connection, selectors.EVENT_READ, _Connection())
+
+    def _service(self, selector, key, events):
+        """Handle requests or send pending response bytes of a ready connection"""
+        connection, state = key.fileobj, key.data
+        if events & selectors.EVENT_READ:
+            try:
+                data = connection.recv(const_cs.RECV_SIZE)  # receive data from client
+            except BlockingIOError:
+                data = None
+            except ConnectionError:
+                data = b""
+            if data == b"":
+                self._disconnect(selector, connection)
+                return
+            if data:
+                state.received += data
+                if not self._parse(state):
+                    self._disconnect(selector, connection)
+                    return
+        # encode further response messages while the send buffer has space
+        while state.responses and len(state.pending) < const_cs.SEND_BUFFER:
+            response = next(state.responses[0], None)
+            if response is None:
+                state.responses.popleft()
+                continue
+            state.pending += response
+        if state.pending:
+            try:
+                del state.pending[:connection.send(state.pending)]
+            except BlockingIOError:
+                pass
+            except ConnectionError:
+                self._disconnect(selector, connection)
+                return
+        # read further requests only while the send buffer has space (backpressure),
+        # wait for writability only while responses are pending
+        wanted = (selectors.EVENT_READ if len(state.pending) < const_cs.SEND_BUFFER else 0) | \
+            (selectors.EVENT_WRITE if state.pending or state.responses else 0)
+        if key.events != wanted:
+            selector.modify(connection, wanted, state)
+
+    def _parse(self, state) -> bool:
+        """Take all complete request frames off the receive buffer (False if a request is too large or malformed)"""
+        received = state.received
+        offset = 0
+        while len(received) - offset >= HEADER.size:
+            (length,) = HEADER.unpack_from(received, offset)
+            if length > const_cs.MAX_REQUEST:
+                self._logger.warning("Request too large")
+                return False
+            if len(received) - offset - HEADER.size < length:
+                break
+            start = offset + HEADER.size
+            data = bytes(received[start:start + length])
+            offset = start + length
+            self._logger.debug("Data received: " + str(data))
+            try:
+                kind, argument = self._request(data)
+            except ValueError:
+                self._logger.warning("Malformed request")
+                return False
+            state.responses.append(self._encoded(kind, argument))
+        del received[:offset]
+        return True
+
+    def _disconnect(self, selector, connection):
+        """Close a connection of the concurrent server"""
+        self._logger.info("Client disconnected")
+        selector.unregister(connection)
+        connection.close()
+
+
+class _Connection:
+    """State of a connection of the concurrent server"""
+
+    def __init__(self):
+        self.received = bytearray()  # bytes of incomplete requests
+        self.responses = deque()  # generators of response messages not yet encoded
+        self.pending = bytearray()  # encoded response bytes not yet sent
+
 
 class Client:
     """The client"""
 
     logger = logging.getLogger("vs2lab.a1_layers.clientserver.Client")
 
-    def __init__(self):
+    def __init__(self, port: int = const_cs.PORT):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.connect((const_cs.HOST, const_cs.PORT))
+        self.sock.connect((const_cs.HOST, port))
         self.logger.info("Client connected to socket " + str(self.sock))
 
     def getall(self):
-        self.logger.info("Attempting getting all entries")
-        self.sock.send("*".encode("utf-8"))
+        entries = {}
+        for chunk in self.getall_chunks():
+            entries.update(chunk)
+        return entries
+
+    def getall_chunks(self, prefix: str = ""):
+        """
+        Stream all entries (starting with prefix) as a sequence of dicts, so they can be consumed with bounded memory.
+        The stream has to be consumed completely before the next request.
+        """
+        self.logger.info(f"Attempting getting all entries starting with '{prefix}'")
+        self.sock.sendall(frame((const_cs.GET_PREFIX + prefix).encode("utf-8")))
         self.logger.debug("Waiting for response...")
-        data = self.sock.recv(1024)
-        self.logger.debug("Received response")
-        return json.loads(data.decode("utf-8"))
+        while True:
+            data = self._receive()
+            if not data:  # end of stream
+                return
+            yield json.loads(data.decode("utf-8"))
+
+    def get_prefix(self, prefix: str):
+        """Look up all entries whose name starts with prefix"""
+        entries = {}
+        for chunk in self.getall_chunks(prefix):
+            entries.update(chunk)
+        return entries
 
     def get(self, name: str):
         self.logger.info(f"Attempting getting entry for {name}")
-        self.sock.send(name.encode("utf-8"))
+        self.sock.sendall(frame((const_cs.GET + name).encode("utf-8")))
         self.logger.debug("Waiting for response...")
-        data = self.sock.recv(1024)
+        return json.loads(self._receive().decode("utf-8"))
+
+    def get_many(self, names):
+        """
+        Look up many names with few round trips.
+        Names are sent in batch requests of up to GET_MANY_BATCH names, which are pipelined.
+        :param names: iterable of names
+        :return: dict mapping each name to its number (None if unknown)
+        """
+        names = list(names)
+        self.logger.info(f"Attempting getting entries for {len(names)} names")
+        entries = {}
+        for response in self._pipeline(self._batches(names)):
+            entries.update(response)
+        return entries
+
+    def get_pipelined(self, names):
+        """
+        Look up names with one request per name, all of them pipelined on this connection.
+        :param names: iterable of names
+        :return: list of responses (as returned by get()) in the order of names
+        """
+        return list(self._pipeline(frame((const_cs.GET + name).encode("utf-8")) for name in names))
+
+    @staticmethod
+    def _batches(names):
+        """Generate framed batch requests of up to GET_MANY_BATCH names and MAX_REQUEST bytes"""
+        empty = len(const_cs.GET_MANY) + 2  # type and brackets
+        batch, size = [], empty
+        for name in names:
+            length = len(json.dumps(name).encode("utf-8")) + 2
+            if batch and (len(batch) == const_cs.GET_MANY_BATCH or size + length > const_cs.MAX_REQUEST):
+                yield frame((const_cs.GET_MANY + json.dumps(batch)).encode("utf-8"))
+                batch, size = [], empty
+            batch.append(name)
+            size += length
+        if batch:
+            yield frame((const_cs.GET_MANY + json.dumps(batch)).encode("utf-8"))
+
+    def _pipeline(self, requests):
+        """
+        Send framed requests (each answered by a single response) and generate their responses in order.
+        Requests are written while responses are read, so neither side blocks on a full socket buffer.
+        """
+        requests = iter(requests)
+        outstanding = 0
+        pending = bytearray()  # request bytes not yet sent
+        received = bytearray()  # bytes of incomplete responses
+        selector = selectors.DefaultSelector()
+        self.sock.setblocking(False)
+        try:
+            selector.register(self.sock, selectors.EVENT_READ | selectors.EVENT_WRITE)
+            while True:
+                # encode further requests while the send buffer has space
+                while requests is not None and len(pending) < const_cs.SEND_BUFFER:
+                    request = next(requests, None)
+                    if request is None:
+                        requests = None
+                        break
+                    pending += request
+                    outstanding += 1
+                if not outstanding:
+                    return
+                wanted = selectors.EVENT_READ | (selectors.EVENT_WRITE if pending else 0)
+                selector.modify(self.sock, wanted)
+                for _, events in selector.select():
+                    if events & selectors.EVENT_WRITE:
+                        del pending[:self.sock.send(pending)]
+                    if events & selectors.EVENT_READ:
+                        data = self.sock.recv(const_cs.RECV_SIZE)
+                        if not data:
+                            raise ConnectionError("server closed the connection")
+                        received += data
+                # take all complete responses off the receive buffer
+                offset = 0
+                while len(received) - offset >= HEADER.size:
+                    (length,) = HEADER.unpack_from(received, offset)
+                    if len(received) - offset - HEADER.size < length:
+                        break
+                    start = offset + HEADER.size
+                    offset = start + length
+                    outstanding -= 1
+                    yield json.loads(received[start:offset].decode("utf-8"))
+                del received[:offset]
+        finally:
+            selector.close()
+            self.sock.setblocking(True)
+
+    def _receive(self):
+        data = recv_frame(self.sock)
+        if data is None:
+            raise ConnectionError("server closed the connection")
         self.logger.debug("Received response")
-        return json.loads(data.decode("utf-8"))
+        return data
 
     def close(self):
         """Close socket"""
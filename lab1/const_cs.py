@@ -4,3 +4,15 @@ Constant definitions
 
 HOST = '127.0.0.1'
 PORT = 50007
+BACKLOG = 1024  # pending connections of the concurrent server
+SELECT_TIMEOUT = 0.5  # seconds between checks for shutdown of the concurrent server
+GETALL_CHUNK = 1000  # phonebook entries per chunk of a getall response
+RECV_SIZE = 65536  # bytes read per receive of the concurrent server
+SEND_BUFFER = 65536  # encoded response bytes buffered per connection of the concurrent server
+MAX_REQUEST = 65536  # maximum length of a request message
+GET = "="  # request type of single name lookups (followed by the name)
+GET_MANY = "+"  # request type of batch lookups (followed by a JSON array of names)
+GET_PREFIX = "*"  # request type of prefix lookups (followed by the prefix, getall if empty)
+GET_MANY_BATCH = 1000  # names per batch request of get_many
+GETALL_CACHE_LIMIT = 16 * 1024 * 1024  # maximum size of the cached getall response in bytes
+RESPONSE_CACHE_SIZE = 10000  # number of cached responses of single names
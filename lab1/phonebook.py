@@ -0,0 +1,121 @@
+"""
+Disk-backed phonebook store
+- entries are kept in an SQLite table clustered by name (nothing is loaded at startup)
+- exact lookups use the primary key index, prefix lookups scan a key range in name order
+- hot names are served from an in-memory LRU cache
+- import of CSV files (name,number per line): python phonebook.py <store file> <csv file>
+"""
+
+import csv
+import logging
+import sqlite3
+import sys
+from collections import OrderedDict
+
+# pylint: disable=logging-not-lazy
+
+# largest code point, sorts after all other characters of a prefix range
+_MAX_CHAR = "\U0010ffff"
+
+
+class PhonebookStore:
+    """
+    Phonebook stored in an SQLite file.
+
+    Offers the read interface of a dict (get(), items(), in) plus prefix lookups.
+    Changes (update(), __setitem__, __delitem__) are committed at once and invalidate cached entries.
+    Each change increments the version, so users can invalidate their own caches.
+    A store is meant to be used by one thread at a time (e.g. the serving thread).
+    """
+
+    _logger = logging.getLogger("vs2lab.lab1.phonebook.PhonebookStore")
+
+    def __init__(self, path: str, cache_size: int = 10000):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # maps names to numbers (None for unknown names)
+        self.version = 0  # incremented on every change
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS phonebook (name TEXT PRIMARY KEY, number TEXT) WITHOUT ROWID"
+        )
+        self._db.commit()
+        self._logger.info("Phonebook store opened: " + path)
+
+    def get(self, name: str, default=None):
+        """Look up the number of a name"""
+        if name in self._cache:
+            self._cache.move_to_end(name)
+            number = self._cache[name]
+        else:
+            row = self._db.execute("SELECT number FROM phonebook WHERE name = ?", (name,)).fetchone()
+            number = row[0] if row is not None else None
+            self._cache[name] = number
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return default if number is None else number
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __getitem__(self, name: str) -> str:
+        number = self.get(name)
+        if number is None:
+            raise KeyError(name)
+        return number
+
+    def prefix(self, prefix: str):
+        """Generate (name, number) tuples of all names starting with prefix, in name order"""
+        if not prefix:
+            return self.items()
+        return iter(self._db.execute(
+            "SELECT name, number FROM phonebook WHERE name >= ? AND name < ? ORDER BY name",
+            (prefix, prefix + _MAX_CHAR),
+        ))
+
+    def items(self):
+        """Generate all (name, number) tuples in name order (streamed from disk)"""
+        return iter(self._db.execute("SELECT name, number FROM phonebook ORDER BY name"))
+
+    def update(self, entries):
+        """Insert or replace entries (a mapping or an iterable of (name, number) tuples)"""
+        if hasattr(entries, "items"):
+            entries = entries.items()
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO phonebook (name, number) VALUES (?, ?)", self._invalidating(entries)
+            )
+        self.version += 1
+
+    def _invalidating(self, entries):
+        """Drop cached numbers of entries as they are written"""
+        for name, number in entries:
+            self._cache.pop(name, None)
+            yield name, number
+
+    def __setitem__(self, name: str, number: str):
+        self.update([(name, number)])
+
+    def __delitem__(self, name: str):
+        with self._db:
+            deleted = self._db.execute("DELETE FROM phonebook WHERE name = ?", (name,)).rowcount
+        self._cache.pop(name, None)
+        self.version += 1
+        if not deleted:
+            raise KeyError(name)
+
+    def close(self):
+        """Close the store file"""
+        self._db.close()
+
+
+def import_csv(store: PhonebookStore, path: str):
+    """Import (name, number) lines of a CSV file into a store"""
+    with open(path, newline="", encoding="utf-8") as source:
+        store.update((row[0], row[1]) for row in csv.reader(source) if len(row) >= 2)
+
+
+if __name__ == "__main__":
+    phonebook = PhonebookStore(sys.argv[1])
+    import_csv(phonebook, sys.argv[2])
+    phonebook.close()
@@ -8,6 +8,7 @@ import unittest
 import time
 
 import clientserver
+import const_cs
 from context import lab_logging
 
 lab_logging.setup(stream_level=logging.INFO)
@@ -52,6 +53,18 @@ class TestEchoService(unittest.TestCase):
         result = self.client.get("Alice")
         self.assertEqual(result, {"Alice": None})
 
+    def test_request_too_large(self):
+        """Test that the server drops a connection announcing a too large request"""
+        self.client.sock.sendall(clientserver.HEADER.pack(const_cs.MAX_REQUEST + 1))
+        self.assertEqual(self.client.sock.recv(1), b"")
+
+    def test_truncated_header(self):
+        """Test that the server survives a client disconnecting within a frame header"""
+        self.client.sock.sendall(clientserver.HEADER.pack(1)[:2])
+        self.client.close()
+        self.client = clientserver.Client()
+        self.assertEqual(self.client.get("Alex"), {"Alex": "+491514353453"})
+
     def tearDown(self):
         self.client.close()  # terminate client after each test
 
@@ -63,5 +76,116 @@ class TestEchoService(unittest.TestCase):
         cls._server_thread.join()  # wait for server thread to terminate
 
 
+class TestConcurrentEchoService(unittest.TestCase):
+    """The test of the concurrent server"""
+
+    PORT = const_cs.PORT + 1
+
+    @classmethod
+    def setUpClass(cls):
+        cls._server = clientserver.Server(concurrent=True, port=cls.PORT)
+        cls._server_thread = threading.Thread(target=cls._server.serve)
+        cls._server_thread.start()
+        time.sleep(0.2)
+
+    def test_get_and_getall(self):
+        """Test that requests are answered as by the blocking server"""
+        client = clientserver.Client(port=self.PORT)
+        self.assertEqual(client.get("Alex"), {"Alex": "+491514353453"})
+        self.assertEqual(client.get("Alice"), {"Alice": None})
+        self.assertEqual(client.getall(), self._server.phonebook)
+        client.close()
+
+    def test_streamed_getall(self):
+        """Test that a large phonebook is streamed in chunks"""
+        large = {"name%d" % i: "+49%d" % i for i in range(5000)}
+        phonebook, self._server.phonebook = self._server.phonebook, large
+        try:
+            client = clientserver.Client(port=self.PORT)
+            chunks = list(client.getall_chunks())
+            self.assertEqual(len(chunks), 5)
+            self.assertEqual(client.getall(), large)
+            self.assertEqual(client.get("name42"), {"name42": "+4942"})
+            client.close()
+        finally:
+            self._server.phonebook = phonebook
+
+    def test_get_many(self):
+        """Test batched and pipelined lookups"""
+        client = clientserver.Client(port=self.PORT)
+        names = ["Alex", "Alice"] + ["Bob"] * 2500
+        self.assertEqual(client.get_many(names), {"Alex": "+491514353453", "Alice": None, "Bob": "+491233423423"})
+        self.assertEqual(client.get_pipelined(["Bob", "Alice", "Alex"]),
+                         [{"Bob": "+491233423423"}, {"Alice": None}, {"Alex": "+491514353453"}])
+        self.assertEqual(client.get("Alex"), {"Alex": "+491514353453"})
+        client.close()
+
+    def test_get_batch_like_name(self):
+        """Test that names looking like a batch request are looked up as names"""
+        client = clientserver.Client(port=self.PORT)
+        self.assertEqual(client.get('["Alex"]'), {'["Alex"]': None})
+        self.assertEqual(client.get_pipelined(['["Alex"]', "Alex"]),
+                         [{'["Alex"]': None}, {"Alex": "+491514353453"}])
+        client.close()
+
+    def test_get_prefix(self):
+        """Test retrieving entries by prefix"""
+        client = clientserver.Client(port=self.PORT)
+        self.assertEqual(client.get_prefix("B"), {"Bob": "+491233423423", "Björn": "12345"})
+        self.assertEqual(client.get_prefix("Z"), {})
+        client.close()
+
+    def test_get_prefix_like_name(self):
+        """Test that names ending with '*' are looked up as names"""
+        client = clientserver.Client(port=self.PORT)
+        self.assertEqual(client.get("Bob*"), {"Bob*": None})
+        self.assertEqual(client.get("Alex"), {"Alex": "+491514353453"})
+        self.assertEqual(client.get_pipelined(["Bob*", "*"]), [{"Bob*": None}, {"*": None}])
+        client.close()
+
+    def test_cached_responses(self):
+        """Test that cached responses are dropped when entries change"""
+        client = clientserver.Client(port=self.PORT)
+        self.assertEqual(client.getall(), client.getall())
+        self.assertEqual(client.get("Alex"), {"Alex": "+491514353453"})
+        self._server.update({"Alex": "+4930"})
+        try:
+            self.assertEqual(client.get("Alex"), {"Alex": "+4930"})
+            self.assertEqual(client.getall()["Alex"], "+4930")
+        finally:
+            self._server.update({"Alex": "+491514353453"})
+        client.close()
+
+    def test_update_while_streaming(self):
+        """Test that a getall being streamed is not disturbed by an update"""
+        large = {"name%d" % i: "+49%d" % i for i in range(200000)}
+        phonebook, self._server.phonebook = self._server.phonebook, large
+        try:
+            client = clientserver.Client(port=self.PORT)
+            chunks = client.getall_chunks()
+            entries = dict(next(chunks))
+            self._server.update({"new": "1"})
+            for chunk in chunks:
+                entries.update(chunk)
+            self.assertEqual(entries, large)
+            self.assertEqual(client.get("new"), {"new": "1"})
+            client.close()
+        finally:
+            self._server.phonebook = phonebook
+
+    def test_simultaneous_clients(self):
+        """Test that connected clients do not stall each other"""
+        clients = [clientserver.Client(port=self.PORT) for _ in range(50)]
+        for client in reversed(clients):
+            self.assertEqual(client.get("Bob"), {"Bob": "+491233423423"})
+        for client in clients:
+            client.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._server._serving = False  # pylint: disable=protected-access
+        cls._server_thread.join()
+
+
 if __name__ == "__main__":
     unittest.main()
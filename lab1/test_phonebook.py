@@ -0,0 +1,59 @@
+"""
+Phonebook store unit test
+"""
+
+import logging
+import os
+import tempfile
+import unittest
+
+from phonebook import PhonebookStore
+from context import lab_logging
+
+lab_logging.setup(stream_level=logging.INFO)
+
+
+class TestPhonebookStore(unittest.TestCase):
+    """The test"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "phonebook.db")
+        self.store = PhonebookStore(self.path, cache_size=2)
+        self.store.update({"Alex": "+491514353453", "Alexa": "+4930", "Bob": "+491233423423"})
+
+    def test_exact_lookup(self):
+        """Test retrieving existing and non-existing entries"""
+        self.assertEqual(self.store.get("Alex"), "+491514353453")
+        self.assertIsNone(self.store.get("Alice"))
+        self.assertEqual(self.store["Bob"], "+491233423423")
+
+    def test_prefix_lookup(self):
+        """Test retrieving entries by prefix in name order"""
+        self.assertEqual(list(self.store.prefix("Al")), [("Alex", "+491514353453"), ("Alexa", "+4930")])
+        self.assertEqual(list(self.store.prefix("X")), [])
+        self.assertEqual(len(list(self.store.items())), 3)
+
+    def test_cache_invalidation(self):
+        """Test that changes are visible despite cached lookups"""
+        self.assertIsNone(self.store.get("Alice"))
+        self.store["Alice"] = "+4940"
+        self.assertEqual(self.store.get("Alice"), "+4940")
+        del self.store["Alex"]
+        self.assertIsNone(self.store.get("Alex"))
+        self.assertEqual(self.store.version, 3)
+
+    def test_persistence(self):
+        """Test that entries survive reopening the store"""
+        self.store.close()
+        self.store = PhonebookStore(self.path)
+        self.assertEqual(self.store.get("Alexa"), "+4930")
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
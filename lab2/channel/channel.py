@@ -19,7 +19,7 @@ class Server:
             if message is not None:
                 try:
                     self.ci.send_to({message[0]}, 'Received ' + message[1])
-                except AssertionError:
+                except lab_channel.UnknownMemberError:
                     self.logger.warning('Client has already left the channel.')
 
 
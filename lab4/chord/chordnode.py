@@ -120,7 +120,7 @@ class ChordNode:
 
         # Initialize the node
         # Get all nodes from channel for bootstrapping
-        nodes = {node.decode() for node in self.channel.channel.smembers('node')}
+        nodes = self.channel.subgroup('node')
         others = list(nodes - {str(self.node_id)})
         for other_node in others:  # for all other ring nodes
             # register current ring locally (might change later)
@@ -138,19 +138,18 @@ class ChordNode:
             request = message[1]  # And the actual request
 
             # If sender is a node (that stays in the ring) then update known nodes
-            if request[0] != constChord.LEAVE and self.channel.channel.sismember('node', sender):
+            if request[0] != constChord.LEAVE and self.channel.exists(sender, 'node'):
                 self.add_node(sender)  # remember sender node
 
             if request[0] == constChord.STOP:  # this node is requested to shutdown
-                self.logger.debug("Node {:04n} received STOP from {:04n}."
-                                  .format(self.node_id, int(sender)))
+                self.logger.debug("Node %04d received STOP from %04d.", self.node_id, int(sender))
                 break
 
             if request[0] == constChord.LOOKUP_REQ:  # A lookup request
                 original_client = request[2]
                     
-                self.logger.info("Node {:04n} received LOOKUP {:04n} from {:04n}."
-                                 .format(self.node_id, int(request[1]), int(original_client)))
+                self.logger.info("Node %04d received LOOKUP %04d from %04d.",
+                                 self.node_id, int(request[1]), int(original_client))
 
                 if self.in_between(request[1], self.finger_table[0] + 1, self.node_id + 1):
                     # This node is the actual successor
@@ -161,18 +160,16 @@ class ChordNode:
                     if self.channel.exists(next_node):
                         self.channel.send_to([next_node_str], (constChord.LOOKUP_REQ, request[1], original_client))
                     else:
-                        self.logger.warning(f"Next node {next_node} not in channel, removing from list")
+                        self.logger.warning("Next node %s not in channel, removing from list", next_node)
                         self.delete_node(next_node) # purge disappeared node
 
             elif request[0] == constChord.JOIN:
                 # Join request (the node was already registered above)
-                self.logger.debug("Node {:04n} received JOIN from {:04n}."
-                                  .format(self.node_id, int(sender)))
+                self.logger.debug("Node %04d received JOIN from %04d.", self.node_id, int(sender))
                 # we don't care for storage re-location in this example
                 continue
             elif request[0] == constChord.LEAVE:  # Leave request
-                self.logger.info("Node {:04n} received LEAVE from {:04n}."
-                                 .format(self.node_id, int(sender)))
+                self.logger.info("Node %04d received LEAVE from %04d.", self.node_id, int(sender))
                 self.delete_node(sender)  # update known nodes
 
             self.recompute_finger_table()  # adjust finger-table based on updated node set
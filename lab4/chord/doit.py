@@ -30,7 +30,7 @@ class DummyChordClient:
 
     def run(self):
         
-        nodes = {i.decode() for i in list(self.channel.channel.smembers('node'))}
+        nodes = self.channel.subgroup('node')
         target_node = random.choice(list(nodes))
         key = random.randint(0, 2**self.channel.n_bits - 1)
         
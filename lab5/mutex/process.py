@@ -105,11 +105,12 @@ class Process:
             self.clock = max(self.clock, msg[0])  # Adjust clock value...
             self.clock = self.clock + 1  # ...and increment
 
-            self.logger.debug("{} received {} from {}.".format(
-                self.__mapid(),
-                "ENTER" if msg[2] == ENTER
-                else "ALLOW" if msg[2] == ALLOW
-                else "RELEASE", self.__mapid(msg[1])))
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("%s received %s from %s.",
+                                  self.__mapid(),
+                                  "ENTER" if msg[2] == ENTER
+                                  else "ALLOW" if msg[2] == ALLOW
+                                  else "RELEASE", self.__mapid(msg[1]))
 
             if msg[2] == ENTER:
                 self.queue.append(msg)  # Append an ENTER request
@@ -124,12 +125,13 @@ class Process:
 
             self.__cleanup_queue()  # Finally sort and cleanup the queue
         else:
-            self.logger.info("{} timed out on RECEIVE. Local queue: {}".
-                             format(self.__mapid(),
-                                    list(map(lambda msg: (
-                                        'Clock '+str(msg[0]),
-                                        self.__mapid(msg[1]),
-                                        msg[2]), self.queue))))
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("%s timed out on RECEIVE. Local queue: %s",
+                                 self.__mapid(),
+                                 list(map(lambda msg: (
+                                     'Clock '+str(msg[0]),
+                                     self.__mapid(msg[1]),
+                                     msg[2]), self.queue)))
 
     def init(self, peer_name, peer_type):
         self.channel.bind(self.process_id)
@@ -1 +1 @@
-__all__ = ['lab_channel.py', 'lab_logging.py']
+__all__ = ['lab_channel.py', 'lab_async_channel.py', 'lab_local_channel.py', 'lab_logging.py', 'lab_serializer.py', 'lab_metrics.py', 'lab_errors.py', 'lab_member.py']
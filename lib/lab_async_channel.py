@@ -0,0 +1,496 @@
+import asyncio
+import logging
+import random
+import uuid
+
+import redis.asyncio
+
+from . import lab_serializer
+from .lab_errors import ChannelError, UnknownMemberError
+from .lab_channel import (Channel, JOIN_SCRIPT, DRAIN_SCRIPT, DEREF_SCRIPT, LEAVE_SCRIPT, RECLAIM_SCRIPT,
+                          REFERENCE_TAG)
+
+# Select the queues holding messages.
+# KEYS: queue keys
+# Returns the keys of non-empty queues.
+PENDING_SCRIPT = """
+local pending = {}
+for _, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        table.insert(pending, key)
+    end
+end
+return pending
+"""
+
+
+class AsyncChannel:
+    """
+    AsyncChannel is an asyncio version of the communication channel (see lab_channel.Channel).
+    It uses the same redis data structures, so asynchronous and blocking members can talk to each other.
+
+    Members are not bound to OS processes.
+    Instead, join() returns an AsyncMember handle that offers the send and receive operations.
+    Thus, a single event loop can host thousands of members.
+
+    All members of a channel share a connection pool for regular commands.
+    Receive operations take pending messages without blocking (a single script call).
+    If there are none, the member registers as a waiter and awaits a future.
+    A single dispatcher task per channel blocks on behalf of all waiting members:
+    it pops from the union of their queues on a dedicated connection and hands each message to a waiter
+    of its queue, which then drains further pending messages. Thus, waiting members cost no connections
+    and no round trips, and a message wakes its receiver as soon as it arrives.
+    Messages often arrive in bursts: after each pop, the dispatcher looks up all other waited-on queues
+    holding messages (a single script call) and wakes their waiters, which drain the queues themselves.
+    So a burst for many members takes two round trips of the dispatcher, not one per member.
+    The union of the waited-on queues is kept up to date as waiters come and go.
+    The dispatcher's pop also watches a wakeup list of the channel, which is pushed to when the set of
+    waited-on queues grows, so the dispatcher blocks on the new queues right away.
+
+    The local membership view is shared by all members of the channel.
+    It is invalidated by notifications on the "membership" pub/sub channel (see lab_channel.Channel).
+    """
+
+    def __init__(self, n_bits: int = 5, host_ip: str = 'localhost', port_no: int = 6379,
+                 max_connections: int = 64, serializer: lab_serializer.Serializer = None):
+        # create redis client on top of a shared connection pool
+        self.pool = redis.asyncio.BlockingConnectionPool(
+            host=host_ip, port=port_no, db=0, max_connections=max_connections, timeout=None)
+        self.channel = redis.asyncio.StrictRedis(connection_pool=self.pool)
+        # dedicated connection of the dispatcher's blocking pops
+        self.blocking_channel = redis.asyncio.StrictRedis(host=host_ip, port=port_no, db=0)
+        # serializer for outgoing messages (incoming messages are decoded by their tag)
+        self.serializer = serializer if serializer is not None else lab_serializer.PickleSerializer()
+        # Number of bits for pid addresses
+        self.n_bits: int = n_bits
+        # Maximum corresponding pid
+        self.MAXPROC: int = pow(2, n_bits)
+        # local membership view (maps 'members' and subgroup names to sets of member ids)
+        self.__view: dict = {}
+        self.__view_epoch = None
+        self.__view_generation: int = 0
+        self.__listener = None
+        self.__listener_lock = asyncio.Lock()
+        # waiting receive operations as (set of queue keys, future) tuples, served by the dispatcher task
+        self.__waiters: set = set()
+        # maps each waited-on queue key to its waiters (in the order they started waiting)
+        self.__waited: dict = {}
+        self.__dispatcher = None
+        self.__wakeup_key: str = 'wakeup:' + uuid.uuid4().hex
+        self.__wakeup_pending: bool = False
+        # create instance logger
+        self.logger = logging.getLogger('vs2lab.channel.AsyncChannel')
+        # register server-side scripts (loaded lazily on first call, then called by hash)
+        self.__join_script = self.channel.register_script(JOIN_SCRIPT)
+        self._drain_script = self.channel.register_script(DRAIN_SCRIPT)
+        self._deref_script = self.channel.register_script(DEREF_SCRIPT)
+        self.__pending_script = self.channel.register_script(PENDING_SCRIPT)
+        self._leave_script = self.channel.register_script(LEAVE_SCRIPT)
+        self._reclaim_script = self.channel.register_script(RECLAIM_SCRIPT)
+        self.logger.debug('New AsyncChannel created.')
+
+    async def close(self) -> None:
+        """
+        Stop the membership listener and close all connections.
+        :return: None
+        """
+        if self.__listener is not None:
+            self.__listener.cancel()
+            self.__listener = None
+        if self.__dispatcher is not None:
+            self.__dispatcher.cancel()
+            self.__dispatcher = None
+        for _, future in self.__waiters:
+            future.cancel()
+        self.__waiters = set()
+        self.__waited = {}
+        await self.channel.delete(self.__wakeup_key)
+        await self.channel.aclose()
+        await self.blocking_channel.aclose()
+        await self.pool.disconnect()
+
+    async def join(self, subgroup: str) -> 'AsyncMember':
+        """
+        Join a new member to the global channel and associate it with a (sub)group.
+        :param subgroup: an identifier for the grouping
+        :return: handle of the new member
+        """
+        candidates: list = [random.randrange(self.MAXPROC) for _ in range(Channel.JOIN_CANDIDATES)]
+        result = await self.__join_script(keys=['members', subgroup, 'epoch', 'subgroups', 'leased', 'reaped'],
+                                          args=[self.MAXPROC, 0] + candidates)
+        if not result:
+            raise ChannelError('no free member id')
+        pid: str = result.decode()
+        self.logger.info("Member %s joining %s.", pid, subgroup)
+        return AsyncMember(self, pid, subgroup)
+
+    async def exists(self, pid: str, subgroup: str = 'members') -> bool:
+        """
+        Check if pid is in global member set (or in a subgroup) using the local membership view
+        :param pid: process identifier
+        :param subgroup: optional subgroup identifier
+        :return: boolean value, true if pid is a member
+        """
+        return (await self._are_members([str(pid)], subgroup))[0]
+
+    async def subgroup(self, subgroup: str) -> set:
+        """
+        Retrieve members of a subgroup.
+        The subgroup is always read from redis and then stored in the local membership view.
+        :param subgroup: subgroup string identifier
+        :return: set of member process identifiers
+        """
+        return set(await self._view_of(subgroup, refresh=True))
+
+    async def __start_listener(self) -> None:
+        """
+        Subscribe to membership notifications and handle them in a background task.
+        The subscription is confirmed before the local view is filled, so no change can be missed.
+        """
+        pubsub = self.channel.pubsub()
+        await pubsub.subscribe('membership')
+        await pubsub.get_message(timeout=1.0)  # wait for subscribe confirmation
+        self.__listener = asyncio.ensure_future(self.__listen(pubsub))
+
+    async def __listen(self, pubsub) -> None:
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                if message is not None:
+                    # some member joined or left, drop the whole view
+                    self.__view = {}
+                    self.__view_generation += 1
+        except (redis.ConnectionError, OSError) as ex:
+            # notifications may have been lost, drop the view and resubscribe on next use
+            self.logger.warning("Membership listener failed: %s", ex)
+            self.__view = {}
+            self.__listener = None
+        finally:
+            await pubsub.aclose()
+
+    async def _view_of(self, group: str, refresh: bool = False) -> set:
+        """
+        Retrieve the locally cached member set of a group ('members' or a subgroup).
+        :param group: group identifier
+        :param refresh: force reading the group from redis
+        :return: set of member ids (must not be modified)
+        """
+        if self.__listener is None:
+            async with self.__listener_lock:
+                if self.__listener is None:
+                    self.__view = {}
+                    await self.__start_listener()
+        if not refresh and group in self.__view:
+            return self.__view[group]
+        generation: int = self.__view_generation
+        # read group and epoch atomically
+        async with self.channel.pipeline(transaction=True) as pipe:
+            pipe.get('epoch')
+            pipe.smembers(group)
+            epoch, raw_members = await pipe.execute()
+        members: set = Channel._decode_set(raw_members)
+        # only store the group if no change was announced meanwhile
+        if generation == self.__view_generation:
+            # groups read at different epochs must not be mixed
+            if epoch != self.__view_epoch:
+                self.__view = {}
+                self.__view_epoch = epoch
+            self.__view[group] = members
+        return members
+
+    async def _are_members(self, pids: list, group: str = 'members') -> list:
+        """
+        Check membership of several ids against the local membership view.
+        The view is refreshed once if some id is unknown.
+        :param pids: list of member identifiers
+        :param group: group identifier ('members' or a subgroup)
+        :return: list of boolean values in the order of pids
+        """
+        members: set = await self._view_of(group)
+        known: list = [pid in members for pid in pids]
+        if not all(known):
+            members = await self._view_of(group, refresh=True)
+            known = [pid in members for pid in pids]
+        return known
+
+    async def _wait(self, keys: list, timeout) -> tuple:
+        """
+        Wait until the dispatcher pops a message off one of the queues.
+        :param keys: queue keys
+        :param timeout: timeout in seconds (None waits forever)
+        :return: tuple of queue key and queue entry, or None on timeout or if messages may be pending
+        """
+        future = asyncio.get_running_loop().create_future()
+        waiter: tuple = (frozenset(keys), future)
+        new_keys: bool = self.__add_waiter(waiter)
+        try:
+            if self.__dispatcher is None or self.__dispatcher.done():
+                self.__wakeup_pending = False
+                self.__dispatcher = asyncio.ensure_future(self.__dispatch())
+            elif new_keys and not self.__wakeup_pending:
+                # interrupt the dispatcher's pop, so it blocks on the new keys too
+                self.__wakeup_pending = True
+                await self.channel.rpush(self.__wakeup_key, 1)
+            # wait() leaves the future alone on timeout, so no handed over entry can get lost
+            await asyncio.wait([future], timeout=timeout)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None \
+                    and future.result() is not None:
+                # cancelled after the dispatcher handed over an entry: put it back
+                key, entry = future.result()
+                asyncio.ensure_future(self.channel.lpush(key, entry))
+            raise
+        finally:
+            self.__remove_waiter(waiter)
+            if not future.done():
+                future.cancel()
+        return None if future.cancelled() else future.result()
+
+    def __add_waiter(self, waiter: tuple) -> bool:
+        """
+        Register a waiter with the queues it waits on.
+        :param waiter: tuple of queue keys and future
+        :return: True if some of the queues were not waited on before
+        """
+        self.__waiters.add(waiter)
+        new_keys: bool = False
+        for key in waiter[0]:
+            waiters: list = self.__waited.get(key)
+            if waiters is None:
+                self.__waited[key] = [waiter]
+                new_keys = True
+            else:
+                waiters.append(waiter)
+        return new_keys
+
+    def __remove_waiter(self, waiter: tuple) -> None:
+        if waiter not in self.__waiters:
+            return
+        self.__waiters.remove(waiter)
+        for key in waiter[0]:
+            waiters: list = self.__waited[key]
+            waiters.remove(waiter)
+            if not waiters:
+                del self.__waited[key]
+
+    def __waiter_of(self, key: str) -> tuple:
+        # the first waiter of the queue that is still waiting (None if there is none)
+        return next((waiter for waiter in self.__waited.get(key, ()) if not waiter[1].done()), None)
+
+    async def __dispatch(self) -> None:
+        """
+        Block on the queues of all waiters and hand popped entries over to a waiter of their queue.
+        Runs while there are waiters.
+        """
+        try:
+            while self.__waiters:
+                result = await self.blocking_channel.blpop(list(self.__waited) + [self.__wakeup_key], 0)
+                key: str = result[0].decode()
+                if key == self.__wakeup_key:
+                    self.__wakeup_pending = False
+                    continue
+                waiter = self.__waiter_of(key)
+                if waiter is None:
+                    # the receiver stopped waiting meanwhile, restore the queue head
+                    await self.channel.lpush(key, result[1])
+                    continue
+                self.__remove_waiter(waiter)
+                waiter[1].set_result((result[0], result[1]))
+                if not self.__waited:
+                    continue
+                # wake the waiters of all other queues holding messages at once, they drain them themselves
+                for pending in await self.__pending_script(keys=list(self.__waited)):
+                    waiter = self.__waiter_of(pending.decode())
+                    if waiter is not None:
+                        self.__remove_waiter(waiter)
+                        waiter[1].set_result(None)
+        except (redis.RedisError, OSError) as ex:
+            self.logger.warning("Receive dispatcher failed: %s", ex)
+            for _, future in self.__waiters:
+                if not future.done():
+                    future.set_exception(ex)
+
+
+class AsyncMember:
+    """
+    Handle of a member of an AsyncChannel.
+    Provides awaitable send and receive operations on behalf of the member.
+    """
+
+    def __init__(self, chan: AsyncChannel, pid: str, subgroup: str):
+        self.chan: AsyncChannel = chan
+        self.pid: str = pid
+        self.subgroup: str = subgroup
+        self.logger = logging.getLogger('vs2lab.channel.AsyncMember')
+
+    def __str__(self) -> str:
+        return self.pid
+
+    def __repr__(self) -> str:
+        return "AsyncMember({}, {})".format(self.pid, self.subgroup)
+
+    async def leave(self) -> None:
+        """
+        Unregister the member from the global channel (and its subgroup).
+        :return: None
+        """
+        # remove the member and announce the membership change, the id is quarantined until its queues are deleted
+        remaining = await self.chan._leave_script(
+            keys=['members', self.subgroup, 'epoch', 'subgroups', 'leased', 'reaped'], args=[self.pid])
+        if remaining is None:
+            raise UnknownMemberError('member unknown')
+        self.logger.info("Member %s leaving %s", self.pid, self.subgroup)
+        # delete the queues of the member (see lab_channel.Channel.leave()), then release its id for join
+        others: set = {pid.decode() for pid in remaining} - {self.pid}
+        queues: list = [(Channel.queue_key(self.pid, self.pid), self.pid, self.pid)]
+        for other in others:
+            queues.append((Channel.queue_key(self.pid, other), self.pid, other))
+            queues.append((Channel.queue_key(other, self.pid), other, self.pid))
+        for i in range(0, len(queues), 100):
+            chunk: list = queues[i:i + 100]
+            await self.chan._reclaim_script(keys=['members'] + [k[0] for k in chunk],
+                                            args=[1] + [pid for k in chunk for pid in k[1:]])
+        await self.chan.channel.srem('reaped', self.pid)
+
+    async def send_to(self, destination_set: set, message: object) -> None:
+        """
+        Sends an asynchronous, persistent multicast message.
+        :param destination_set: a set of member identifiers
+        :param message: the message object to be send
+        :return: None
+        """
+        # destination_set needs to contain string identifiers
+        if not all(isinstance(k, str) for k in destination_set):
+            raise TypeError('destination ids must be strings')
+        destinations: list = list(destination_set)
+
+        # validate member and all destinations against the local membership view
+        known: list = await self.chan._are_members([self.pid] + destinations)
+        if not known[0]:
+            raise UnknownMemberError('unknown sender')
+        if not all(known[1:]):
+            raise UnknownMemberError('unknown receiver')
+        self.logger.debug("%s sends %s to %s", self.pid, message, destination_set)
+        await self.__push(destinations, message)
+
+    async def send_to_all(self, message: object) -> None:
+        """
+        Sends an asynchronous, persistent broadcast message.
+        :param message: the message object to be send
+        :return: None
+        """
+        members: set = await self.chan._view_of('members')
+        if self.pid not in members:
+            members = await self.chan._view_of('members', refresh=True)
+        if self.pid not in members:
+            raise UnknownMemberError('unknown sender')
+        self.logger.debug("%s sends %s to all members", self.pid, message)
+        await self.__push(members, message)
+
+    async def __push(self, destinations, message: object) -> None:
+        # serialize once and push message to incoming queues of all destinations in one round trip
+        data: bytes = self.chan.serializer.dumps(message)
+        async with self.chan.channel.pipeline(transaction=False) as pipe:
+            for destination in destinations:
+                pipe.rpush(Channel.queue_key(self.pid, destination), data)
+            await pipe.execute()
+
+    async def receive_from_any(self, timeout: int = 0) -> tuple:
+        """
+        Wait for the next message on any of the member's incoming queues.
+        :param timeout: optional timeout in seconds (0 waits forever)
+        :return: tuple of sender and message or None on timeout
+        """
+        results: list = await self.receive_many(1, timeout)
+        if results:
+            return results[0]
+
+    async def receive_from(self, sender_set: set, timeout: int = 0) -> tuple:
+        """
+        Wait for the next message from any of the members specified in the sender_set attribute.
+        :param sender_set: set of ids to watch respective incoming queues for a new message
+        :param timeout: optional timeout in seconds (0 waits forever)
+        :return: tuple of sender and message or None on timeout
+        """
+        results: list = await self.receive_from_many(sender_set, 1, timeout)
+        if results:
+            return results[0]
+
+    async def receive_many(self, max_count: int, timeout: int = 0) -> list:
+        """
+        Wait for the next message on any of the member's incoming queues
+        and take up to max_count pending messages in the same round trip.
+        :param max_count: maximum number of messages to take
+        :param timeout: optional timeout in seconds (0 waits forever)
+        :return: list of (sender, message) tuples, empty on timeout
+        """
+        members: set = await self.chan._view_of('members')
+        if self.pid not in members:
+            members = await self.chan._view_of('members', refresh=True)
+        if self.pid not in members:
+            raise UnknownMemberError('unknown receiver')
+        in_queues: set = {Channel.queue_key(member, self.pid) for member in members}
+        return await self.__pop_many(in_queues, max_count, timeout)
+
+    async def receive_from_many(self, sender_set: set, max_count: int, timeout: int = 0) -> list:
+        """
+        Wait for the next message from any of the members specified in the sender_set attribute
+        and take up to max_count pending messages from them in the same round trip.
+        :param sender_set: set of ids to watch respective incoming queues for new messages
+        :param max_count: maximum number of messages to take
+        :param timeout: optional timeout in seconds (0 waits forever)
+        :return: list of (sender, message) tuples, empty on timeout
+        """
+        # sender_set needs to contain string identifiers
+        if not all(isinstance(k, str) for k in sender_set):
+            raise TypeError('sender ids must be strings')
+        senders: list = list(sender_set)
+        known: list = await self.chan._are_members([self.pid] + senders)
+        if not known[0]:
+            raise UnknownMemberError('unknown receiver')
+        if not all(known[1:]):
+            raise UnknownMemberError('unknown sender')
+        in_queues: set = {Channel.queue_key(sender, self.pid) for sender in senders}
+        return await self.__pop_many(in_queues, max_count, timeout)
+
+    async def __pop_many(self, in_queues: set, max_count: int, timeout: int) -> list:
+        """
+        Take up to max_count pending messages off the queues.
+        If there are none, wait for the channel's dispatcher to pop the next one (or to report pending messages),
+        then drain further ones.
+        :param in_queues: set of queue keys
+        :param max_count: maximum number of messages
+        :param timeout: timeout in seconds (0 waits forever)
+        :return: list of (sender, message) tuples
+        """
+        assert max_count > 0, 'max_count must be positive'
+        keys: list = sorted(in_queues)
+        loop = asyncio.get_running_loop()
+        deadline: float = loop.time() + timeout
+        while True:
+            drained: list = await self.chan._drain_script(keys=keys, args=[max_count])
+            if drained:
+                return [self.__unpack(drained[i], drained[i + 1]) for i in range(0, len(drained), 2)]
+            remaining = None if timeout == 0 else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return []
+            first = await self.chan._wait(keys, remaining)
+            if first is None:
+                # timed out, or woken up because messages are pending: drain them (or return on timeout)
+                continue
+            # the drain script resolves references to shared payloads, the dispatcher does not
+            if first[1][:1] == REFERENCE_TAG:
+                data = await self.chan._deref_script(args=[first[1]])
+                if data is None:
+                    continue
+                first = (first[0], data)
+            drained = await self.chan._drain_script(keys=keys, args=[max_count - 1]) if max_count > 1 else []
+            return [self.__unpack(first[0], first[1])] + \
+                [self.__unpack(drained[i], drained[i + 1]) for i in range(0, len(drained), 2)]
+
+    def __unpack(self, key: bytes, data: bytes) -> tuple:
+        # extract sender id from key part and deserialize msg content
+        sender: str = key.decode().split("'")[1]
+        message = lab_serializer.loads(data)
+        self.logger.debug("%s received %s from %s", self.pid, message, sender)
+        return sender, message
@@ -1,10 +1,344 @@
+import ast
 import logging
 import os
-import pickle
 import random
+import threading
+import time
+import uuid
+import zlib
 
 import redis
 
+from . import lab_metrics, lab_serializer
+from .lab_errors import ChannelError, QueueFullError, UnknownMemberError
+from .lab_member import Member
+
+
+# Atomically claim a free member id and add it to the global member set and a subgroup.
+# Random candidates are tried first, which takes O(1) expected steps in sparse id spaces.
+# Only if all candidates are taken (dense id space) the ids following the first candidate are swept.
+# With a lease duration, the member is added to the leased members and its lease is taken (see REAP_SCRIPT).
+# Reaped ids are not claimed until their queues have been deleted (see Channel.collect()).
+# KEYS: member set, subgroup set, epoch counter, member subgroups hash, leased member set, reaped id set
+# ARGV: size of id space, lease duration in milliseconds (0: no lease), candidate ids
+# Returns the claimed id or nil if the id space is full.
+JOIN_SCRIPT = """
+local maxproc = tonumber(ARGV[1])
+local lease = tonumber(ARGV[2])
+if redis.call('SCARD', KEYS[1]) + redis.call('SCARD', KEYS[6]) >= maxproc then
+    return false
+end
+local function claim(id)
+    if redis.call('SISMEMBER', KEYS[6], id) == 1 or redis.call('SADD', KEYS[1], id) == 0 then
+        return nil
+    end
+    redis.call('SADD', KEYS[2], id)
+    redis.call('HSET', KEYS[4], id, KEYS[2])
+    if lease > 0 then
+        redis.call('SADD', KEYS[5], id)
+        redis.call('SET', 'lease:' .. id, 1, 'PX', lease)
+    end
+    redis.call('INCR', KEYS[3])
+    redis.call('PUBLISH', 'membership', id)
+    return id
+end
+for i = 3, #ARGV do
+    local id = claim(ARGV[i])
+    if id then
+        return id
+    end
+end
+local first = tonumber(ARGV[3])
+for offset = 1, maxproc - 1 do
+    local id = claim(string.format('%d', (first + offset) % maxproc))
+    if id then
+        return id
+    end
+end
+return false
+"""
+
+# Tag of queue entries referencing a shared payload (must differ from serializer and codec tags)
+REFERENCE_TAG = b'R'
+
+# Lua function resolving a queue entry: references are replaced by their shared payload,
+# which is deleted once the last reference has been resolved. Other entries are returned as they are.
+# Returns false if the shared payload does not exist (anymore).
+DEREF_FUNCTION = """
+local function deref(message)
+    if string.sub(message, 1, 1) ~= 'R' then
+        return message
+    end
+    local key = string.sub(message, 2)
+    local data = redis.call('HGET', key, 'data')
+    if data and redis.call('HINCRBY', key, 'refs', -1) <= 0 then
+        redis.call('DEL', key)
+    end
+    return data
+end
+"""
+
+# Resolve a single queue entry.
+# ARGV: queue entry
+# Returns the message or false if the shared payload is missing.
+DEREF_SCRIPT = DEREF_FUNCTION + """
+return deref(ARGV[1])
+"""
+
+# Pop up to a given number of messages off a list of queues without blocking.
+# Queues are drained one after another, so messages of each queue keep their order.
+# References to shared payloads are resolved.
+# KEYS: queue keys
+# ARGV: maximum number of messages
+# Returns a flat list of alternating queue keys and messages.
+DRAIN_SCRIPT = DEREF_FUNCTION + """
+local remaining = tonumber(ARGV[1])
+local result = {}
+for _, key in ipairs(KEYS) do
+    while remaining > 0 do
+        local message = redis.call('LPOP', key)
+        if not message then
+            break
+        end
+        message = deref(message)
+        if message then
+            table.insert(result, key)
+            table.insert(result, message)
+            remaining = remaining - 1
+        end
+    end
+end
+return result
+"""
+
+# Push a message to a list of queues bounded by a high-water mark.
+# With dropping enabled, each queue is trimmed to its newest messages after the push.
+# Otherwise, the message is pushed to all queues or (if any of them is full) to none.
+# KEYS: queue keys
+# ARGV: high-water mark, 1 to drop oldest messages (else 0), message
+# Returns the number of full queues (0 if the message was pushed).
+PUSH_SCRIPT = """
+local limit = tonumber(ARGV[1])
+if ARGV[2] == '1' then
+    for _, key in ipairs(KEYS) do
+        redis.call('RPUSH', key, ARGV[3])
+        redis.call('LTRIM', key, -limit, -1)
+    end
+    return 0
+end
+local full = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('LLEN', key) >= limit then
+        full = full + 1
+    end
+end
+if full == 0 then
+    for _, key in ipairs(KEYS) do
+        redis.call('RPUSH', key, ARGV[3])
+    end
+end
+return full
+"""
+
+# Lua function constructing queue keys (same format as Channel.queue_key, i.e. str([sender, receiver]))
+# Only used for queues of all members, which are not known before the script reads the member set.
+# Keys constructed in scripts (like those of shared payloads in DEREF_FUNCTION) are not declared in KEYS,
+# so these scripts do not work with Redis Cluster (scripted channels do not support shards anyway).
+QUEUE_FUNCTION = """
+local function queue(sender, receiver)
+    return "['" .. sender .. "', '" .. receiver .. "']"
+end
+"""
+
+# Validate sender and destinations against the global member set and push a message, atomically.
+# Bounded queues and shared payloads are handled as by PUSH_SCRIPT and Channel.__push.
+# KEYS: member set, queue keys of the destinations (in the order of ARGV), shared payload key (if shared)
+# ARGV: caller, message, high-water mark (0: unbounded), 1 to drop oldest messages (else 0),
+#       1 to store a shared payload (else 0), 1 to send to all members (else 0), destinations
+# Returns the list of receivers or an error code (UNKNOWN_CALLER, UNKNOWN_PEER, QUEUE_FULL).
+SEND_SCRIPT = QUEUE_FUNCTION + """
+local caller = ARGV[1]
+if redis.call('SISMEMBER', KEYS[1], caller) == 0 then
+    return -1
+end
+local destinations = {}
+local keys = {}
+if ARGV[6] == '1' then
+    destinations = redis.call('SMEMBERS', KEYS[1])
+    for _, destination in ipairs(destinations) do
+        table.insert(keys, queue(caller, destination))
+    end
+else
+    for i = 7, #ARGV do
+        if redis.call('SISMEMBER', KEYS[1], ARGV[i]) == 0 then
+            return -2
+        end
+        table.insert(destinations, ARGV[i])
+        table.insert(keys, KEYS[i - 5])
+    end
+end
+local limit = tonumber(ARGV[3])
+local drop = ARGV[4] == '1'
+if limit > 0 and not drop then
+    for _, key in ipairs(keys) do
+        if redis.call('LLEN', key) >= limit then
+            return -3
+        end
+    end
+end
+local entry = ARGV[2]
+if ARGV[5] == '1' and #destinations > 1 then
+    local payload = KEYS[#KEYS]
+    redis.call('HSET', payload, 'data', ARGV[2], 'refs', #destinations)
+    if string.sub(ARGV[2], 1, 1) == 'T' then
+        -- keep the timestamp readable without fetching the data (see bench/channel_monitor.py)
+        redis.call('HSET', payload, 'ts', string.sub(ARGV[2], 1, 9))
+    end
+    entry = 'R' .. payload
+end
+for _, key in ipairs(keys) do
+    redis.call('RPUSH', key, entry)
+    if limit > 0 and drop then
+        redis.call('LTRIM', key, -limit, -1)
+    end
+end
+return destinations
+"""
+
+# Validate receiver and senders against the global member set and pop the next pending message, atomically.
+# References to shared payloads are resolved.
+# KEYS: member set, queue keys of the senders (in the order of ARGV)
+# ARGV: caller, 1 to receive from all members (else 0), senders
+# Returns {1, queue key, message}, {0, queue keys to wait on} if no message is pending,
+# or an error code (UNKNOWN_CALLER, UNKNOWN_PEER).
+RECEIVE_SCRIPT = QUEUE_FUNCTION + DEREF_FUNCTION + """
+local caller = ARGV[1]
+if redis.call('SISMEMBER', KEYS[1], caller) == 0 then
+    return -1
+end
+local keys = {}
+if ARGV[2] == '1' then
+    for _, sender in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+        table.insert(keys, queue(sender, caller))
+    end
+else
+    for i = 3, #ARGV do
+        if redis.call('SISMEMBER', KEYS[1], ARGV[i]) == 0 then
+            return -2
+        end
+        table.insert(keys, KEYS[i - 1])
+    end
+end
+local waiting = {0}
+for _, key in ipairs(keys) do
+    local message = redis.call('LPOP', key)
+    while message do
+        message = deref(message)
+        if message then
+            return {1, key, message}
+        end
+        message = redis.call('LPOP', key)
+    end
+    table.insert(waiting, key)
+end
+return waiting
+"""
+
+# Remove all leased members whose lease has expired (from the global member set and their subgroup).
+# Their ids are added to the reaped ids, which JOIN_SCRIPT does not claim,
+# until Channel.collect() has deleted their queues.
+# KEYS: member set, epoch counter, member subgroups hash, leased member set, reaped id set
+# Returns the list of removed ids.
+REAP_SCRIPT = """
+local reaped = {}
+for _, id in ipairs(redis.call('SMEMBERS', KEYS[4])) do
+    if redis.call('EXISTS', 'lease:' .. id) == 0 then
+        local subgroup = redis.call('HGET', KEYS[3], id)
+        if subgroup then
+            redis.call('SREM', subgroup, id)
+        end
+        redis.call('SREM', KEYS[1], id)
+        redis.call('HDEL', KEYS[3], id)
+        redis.call('SREM', KEYS[4], id)
+        redis.call('SADD', KEYS[5], id)
+        table.insert(reaped, id)
+    end
+end
+if #reaped > 0 then
+    redis.call('INCR', KEYS[2])
+    for _, id in ipairs(reaped) do
+        redis.call('PUBLISH', 'membership', id)
+    end
+end
+return reaped
+"""
+
+# Remove a member from the global member set, its subgroup and the leased members (see Channel.leave()).
+# Its id is quarantined with the reaped ids (see REAP_SCRIPT) until its queues have been deleted.
+# KEYS: member set, subgroup set, epoch counter, member subgroups hash, leased member set, reaped id set
+# ARGV: member id
+# Returns the remaining members or nil if the id is no member.
+LEAVE_SCRIPT = """
+local id = ARGV[1]
+redis.call('SREM', KEYS[2], id)
+if redis.call('SREM', KEYS[1], id) == 0 then
+    return false
+end
+redis.call('HDEL', KEYS[4], id)
+redis.call('SREM', KEYS[5], id)
+redis.call('DEL', 'lease:' .. id)
+redis.call('SADD', KEYS[6], id)
+redis.call('INCR', KEYS[3])
+redis.call('PUBLISH', 'membership', id)
+return redis.call('SMEMBERS', KEYS[1])
+"""
+
+# Quarantine ids of former members with the reaped ids (see REAP_SCRIPT), so join does not claim them
+# while their queues are deleted.
+# KEYS: member set, reaped id set
+# ARGV: member ids
+# Returns the ids quarantined by this call (ids of members and ids quarantined before are left out).
+QUARANTINE_SCRIPT = """
+local quarantined = {}
+for _, id in ipairs(ARGV) do
+    if redis.call('SISMEMBER', KEYS[1], id) == 0 and redis.call('SADD', KEYS[2], id) == 1 then
+        table.insert(quarantined, id)
+    end
+end
+return quarantined
+"""
+
+# Delete orphaned queues (and stream inboxes), i.e. those of a sender or receiver that is no member anymore.
+# References to shared payloads held by deleted queues are resolved, so the payloads are released.
+# KEYS: member set, queue keys
+# ARGV: 1 to check membership again (only if the member set is on the same instance, else 0),
+#       then sender and receiver id of each queue key (empty sender for inboxes)
+# Returns the number of deleted keys.
+RECLAIM_SCRIPT = DEREF_FUNCTION + """
+local check = ARGV[1] == '1'
+local deleted = 0
+for i = 2, #KEYS do
+    local sender = ARGV[2 * i - 2]
+    local receiver = ARGV[2 * i - 1]
+    local live = check and redis.call('SISMEMBER', KEYS[1], receiver) == 1 and
+        (sender == '' or redis.call('SISMEMBER', KEYS[1], sender) == 1)
+    if not live then
+        if redis.call('TYPE', KEYS[i]).ok == 'list' then
+            for _, message in ipairs(redis.call('LRANGE', KEYS[i], 0, -1)) do
+                deref(message)
+            end
+        end
+        deleted = deleted + redis.call('DEL', KEYS[i])
+    end
+end
+return deleted
+"""
+
+# Error codes of SEND_SCRIPT and RECEIVE_SCRIPT
+UNKNOWN_CALLER: int = -1  # the calling member
+UNKNOWN_PEER: int = -2  # one of the given destinations or senders
+QUEUE_FULL: int = -3
+
 
 class Channel:
     """
@@ -13,7 +347,22 @@ class Channel:
     Processes are associated with "subgroups" that can be queried to obtain a set of all members (e.g. all "servers").
 
     Members can use the channel to send/receive a message to/from a set of members or all other members.
+    join() returns a Member endpoint (see lab_member), which acts as its member in any process or thread.
+    Alternatively, a process binds to a member id (bind()), which is then used by all operations of the process.
+    All operations also take an explicit member id (keyword argument 'member').
     Messages might be any serializable object.
+    Messages are serialized once per send operation by a pluggable serializer (see lab_serializer).
+    Large messages can be compressed by passing a lab_serializer.Compressor (receivers decompress transparently).
+    With stats=True, the channel collects per-operation metrics (see lab_metrics and attribute 'stats').
+    With timestamps=True, messages carry their send time (see lab_serializer.stamp()),
+    so monitoring tools can tell the age of the oldest message of a queue (see bench/channel_monitor.py).
+
+    Queues are unbounded by default. With max_queue set, each queue holds at most max_queue messages.
+    A send to a full queue is handled according to the overflow policy:
+    'block' waits until the receiver has taken messages off the queue,
+    'fail' raises QueueFullError and 'drop' discards the oldest messages of the queue.
+    A multicast is only pushed if all destination queues have space (except for 'drop').
+    try_send() never waits or raises but reports whether the message was sent.
 
     Internally, the channel manages a set of queues.
     A queue is associates with two channel members: a sender and a receiver.
@@ -24,6 +373,52 @@ class Channel:
     Queues are implemented as redis lists.
     The key is a string representation of a list containing sender and receiver ids.
     That is, sender and receiver can always be identified by parsing the queue keys.
+    The registry of all possible queues is not stored in redis but derived from the global member set:
+    there is a queue for every ordered pair of members (see queues()).
+
+    A message sent to several receivers is stored once if its serialized size reaches share_threshold
+    (and queues are unbounded): the queues then hold a small reference to a shared payload.
+    The shared payload counts its references and is deleted by the receive operation resolving the last one.
+    Receivers resolve references transparently (an extra round trip only if the first message is a reference).
+
+    By default, send and receive operations validate member ids against a local view (see below).
+    With scripted=True, send_to, try_send, send_to_all, receive_from and receive_from_any validate ids
+    against the global member set and push (or pop) in a single server-side script instead.
+    Thus, validation and push are atomic with respect to concurrent joins and leaves.
+    A scripted receive waits with a blocking pop (a second round trip) only if no message is pending.
+    Scripted operations need all queues on the main instance (no shards).
+
+    Operations raise UnknownMemberError (see lab_errors) if the caller or a peer is not a member,
+    and TypeError if destination or sender ids are no strings.
+
+    leave() deletes the queues of the member (O(members)), but members that crash never leave.
+    With a lease duration (seconds), members joined by this channel instance hold a lease in redis,
+    which a background thread renews every third of the duration while the process is alive.
+    collect() removes members whose lease has expired and deletes all orphaned queues
+    (of a sender or receiver that is no member anymore), sampled by SCAN.
+    The ids of members that left or expired are free for join only after their queues have been deleted
+    (by leave() or collect()), so a new member does not receive the backlog of a former member with the same id.
+    Any channel instance can run the collector periodically in a background thread (start_collector()).
+    Thus, redis memory stays proportional to the live members.
+    Members joined without a lease never expire, but their queues are reclaimed once they leave.
+
+    Redis commands of an operation are batched into pipelines.
+    Thus, the number of network round trips per operation does not grow with the number of destinations.
+
+    Each channel instance keeps a local view of the global member set and of the subgroups it has queried.
+    Send and receive operations validate member ids against this view instead of querying redis.
+    Joining and leaving members publish a notification on the "membership" pub/sub channel,
+    which is received by a listener thread of each channel instance and invalidates the local view.
+    Ids that are missing from the view cause a single refresh before they are rejected.
+
+    Queues can be spread over several redis instances (shards) by passing their addresses.
+    A queue is stored on the shard of its receiver, which is determined by a hash of the receiver id.
+    Thus, a receive operation only talks to the caller's shard, and send operations talk to the shards
+    of their destinations (one pipeline per shard).
+    Members, subgroups and the epoch are kept on the main instance (host_ip, port_no) only,
+    so there is a single, coherent membership.
+    Bounded queues (max_queue) cannot be sharded: a multicast could not be pushed to all or none of its
+    destination queues atomically across several instances.
 
     Redis data Structures:
 
@@ -33,29 +428,98 @@ class Channel:
     Subgroup Member Sets
         Key: <subgroup>
         Value: redis set of member ID strings
-    Global Queue List (containing all possible queue keys)
-        Key: "xchan"
-        Value: redis list of queue identifier objects
+    Membership Epoch
+        Key: "epoch"
+        Value: redis integer incremented on every join and leave
+    Member Subgroups
+        Key: "subgroups"
+        Value: redis hash mapping member ID strings to their subgroup
+    Leases
+        Key: "leased"
+        Value: redis set of member ID strings joined with a lease
+        Key: "lease:<member>"
+        Value: expiring redis string, exists while the lease of member is valid
     Queues
         Key: "['<member1>','<member2>']"
         Value: redis list of message objects send fom member1 to member2
+    Shared Payloads
+        Key: "payload:<id>"
+        Value: redis hash {data: serialized message, refs: number of unresolved references}
     """
 
-    def __init__(self, n_bits: int = 5, host_ip: str = 'localhost', port_no: int = 6379):
+    # Number of random candidate ids tried per join before sweeping the id space
+    JOIN_CANDIDATES: int = 16
+    # Overflow policies of bounded queues
+    OVERFLOW_POLICIES: tuple = ('block', 'fail', 'drop')
+    # Maximum delay (seconds) between two attempts of a sender blocked by a full queue
+    MAX_BACKOFF: float = 0.05
+
+    def __init__(self, n_bits: int = 5, host_ip: str = 'localhost', port_no: int = 6379,
+                 cache_members: bool = True, serializer: lab_serializer.Serializer = None,
+                 stats: bool = False, compressor: lab_serializer.Compressor = None,
+                 max_queue: int = None, overflow: str = 'block', shards: list = None,
+                 share_threshold: int = 1024, scripted: bool = False, timestamps: bool = False,
+                 lease: float = None):
+        assert max_queue is None or max_queue > 0, 'max_queue must be positive'
+        assert overflow in self.OVERFLOW_POLICIES, 'unknown overflow policy'
+        assert not (scripted and shards), 'scripted operations do not support shards'
+        assert not (max_queue and shards), 'bounded queues do not support shards'
+        assert lease is None or lease > 0, 'lease must be positive'
         # create redis client
         self.channel = redis.StrictRedis(host=host_ip, port=port_no, db=0)
+        # create redis clients of the queue shards (list of (host, port) tuples, default: main instance only)
+        self.shards: list = [self.channel] if not shards else \
+            [redis.StrictRedis(host=host, port=port, db=0) for host, port in shards]
+        # serializer for outgoing messages (incoming messages are decoded by their tag)
+        self.serializer = serializer if serializer is not None else lab_serializer.PickleSerializer()
+        # optional compression of large outgoing messages
+        self.compressor = compressor
+        # prefix outgoing messages with their send time
+        self.timestamps: bool = timestamps
+        # high-water mark of queues (None for unbounded queues) and overflow policy
+        self.max_queue = max_queue
+        self.overflow: str = overflow
+        # minimum size of multicast messages to be stored once (None to always store copies)
+        self.share_threshold = share_threshold
+        # validate and push/pop in server-side scripts
+        self.scripted: bool = scripted
+        # lease duration of joined members in seconds (None: members never expire)
+        self.lease = lease
+        # members joined with a lease by this instance (renewed by a background thread)
+        self.__leased: set = set()
+        self.__renewer = None
+        self.__collector = None
+        # metrics collector (None if collection is disabled)
+        self.stats = lab_metrics.ChannelStats() if stats else None
         # create dict of local pid bindings
         self.os_members = {}
+        # local membership view (maps 'members' and subgroup names to sets of member ids)
+        self.cache_members: bool = cache_members
+        self.__view: dict = {}
+        self.__view_epoch = None
+        self.__view_generation: int = 0
+        self.__view_lock = threading.Lock()
+        self.__listener = None
         # Number of bits for pid addresses
         self.n_bits: int = n_bits
         # Maximum corresponding pid
         self.MAXPROC: int = pow(2, n_bits)
         # create instance logger
         self.logger = logging.getLogger('vs2lab.channel.Channel')
+        # register server-side scripts (loaded lazily on first call)
+        self.__join_script = self.channel.register_script(JOIN_SCRIPT)
+        self.__push_script = self.channel.register_script(PUSH_SCRIPT)
+        self.__deref_script = self.channel.register_script(DEREF_SCRIPT)
+        self.__send_script = self.channel.register_script(SEND_SCRIPT)
+        self.__receive_script = self.channel.register_script(RECEIVE_SCRIPT)
+        self.__reap_script = self.channel.register_script(REAP_SCRIPT)
+        self.__reclaim_script = self.channel.register_script(RECLAIM_SCRIPT)
+        self.__leave_script = self.channel.register_script(LEAVE_SCRIPT)
+        self.__quarantine_script = self.channel.register_script(QUARANTINE_SCRIPT)
         self.logger.debug('New Channel created.')
 
     @staticmethod
-    def __decode_set(raw) -> set:
+    def _decode_set(raw) -> set:
         return {i.decode() for i in raw}
 
     def join(self, subgroup: str) -> str:
@@ -64,86 +528,207 @@ class Channel:
         Only members can communicate over the channel. 
         Subgroups can be used to retrieve a specific set of processes later (e.g. all servers).
         :param subgroup: an identifier for the grouping
-        :return: global member id of the process.
+        :return: global member id of the process (as a Member endpoint, see lab_member)
         """
-        # For concurrently assigning unique member ids, we need to use a transaction
-        # atomically reading and writing the member set. This can be implemented by
-        # means of the pipeline construct.
-        with self.channel.pipeline() as pipe:
-            while 1:
-                try:
-                    # Put a WATCH on the key that holds the member set
-                    pipe.watch('members')
-                    # After WATCHing, the pipeline is put into immediate execution
-                    # mode until we tell it to start buffering commands again.
-                    # This allows us to get the current value of the global member set
-                    raw_members = pipe.smembers('members')
-                    members = self.__decode_set(raw_members)
-                    # Now construct new/unused random member id
-                    remaining_ids = list(set([str(i) for i in range(self.MAXPROC)]) - members)
-                    new_pid = random.choice(remaining_ids)
-                    # Then we can put the pipeline back into buffered mode with MULTI
-                    pipe.multi()
-                    # Add new member id to global member set and subgroup
-                    pipe.sadd('members', new_pid)
-                    pipe.sadd(subgroup, new_pid)
-                    # and finally, execute the pipeline (the set command)
-                    pipe.execute()
-                    # if a WatchError wasn't raised during execution,
-                    # everything we just did happened atomically.
-                    break
-                except redis.WatchError:
-                    # another client must have changed 'members' between
-                    # the time we started WATCHing it and the pipeline's execution.
-                    # our best bet is to just retry.
-                    continue
-        self.logger.info("Member {} joining {}.".format(new_pid, subgroup))
+        start: float = time.perf_counter()
+        # Draw random candidate ids locally and let a server-side script claim the first free one.
+        # The script runs atomically, so concurrent joiners never need to retry.
+        candidates: list = [random.randrange(self.MAXPROC) for _ in range(self.JOIN_CANDIDATES)]
+        lease_ms: int = 0 if self.lease is None else int(self.lease * 1000)
+        result = self.__join_script(keys=['members', subgroup, 'epoch', 'subgroups', 'leased', 'reaped'],
+                                    args=[self.MAXPROC, lease_ms] + candidates)
+        if not result:
+            raise ChannelError('no free member id')
+        new_pid: str = result.decode()
+        if self.lease is not None:
+            self.__leased.add(new_pid)
+            self.__start_renewer()
+        if self.stats is not None:
+            self.stats.record('join', 1, time.perf_counter() - start)
+        self.logger.info("Member %s joining %s.", new_pid, subgroup)
+        return Member(new_pid, self, subgroup)
 
-        # construct bidirectional queue names for new member and all existing members (if any)
-        if len(members) > 0:
-            xchan: list = [[new_pid, other] for other in members] + [[other, new_pid] for other in members]
-            # push queue names to global list of all possible transfer queues
-            for xc in xchan:
-                self.channel.rpush('xchan', pickle.dumps(xc))
-        return new_pid
-
-    def leave(self, subgroup: str):
+    def leave(self, subgroup: str, member: str = None):
         """
         Unregister a process from the global channel (and subgroup).
         :param subgroup: subgroup identifier
+        :param member: acting member (default: the member bound to the calling process)
         :return: None
         """
-        # retrieve member id via os pid and validate it
-        os_pid: int = os.getpid()
-        pid: str = self.os_members[os_pid]
-        assert self.channel.sismember('members', pid), 'member unknown'
-        self.logger.info("Member {} leaving {}".format(pid, subgroup))
+        start: float = time.perf_counter()
+        pid: str = self._caller(member)
+
+        # remove global member element, subgroup element and lease and announce the membership change
+        # in one round trip, the id is quarantined until the queues of the member are deleted
+        remaining = self.__leave_script(keys=['members', subgroup, 'epoch', 'subgroups', 'leased', 'reaped'],
+                                        args=[pid])
+        self.__leased.discard(pid)
+        if remaining is None:
+            if self.stats is not None:
+                self.stats.record('leave', 1, time.perf_counter() - start)
+            raise UnknownMemberError('member unknown')
+        self.logger.info("Member %s leaving %s", pid, subgroup)
+
+        # delete the queues of the member on all shards, then release its id for join
+        by_shard: dict = {}
+        for queue in self._member_queues(pid, self._decode_set(remaining)):
+            by_shard.setdefault(self._shard_index(queue[2]), []).append(queue)
+        for index, queues in by_shard.items():
+            self.__reclaim(self.shards[index], queues)
+        self.channel.srem('reaped', pid)
+        if self.stats is not None:
+            self.stats.record('leave', 2 + len(by_shard), time.perf_counter() - start)
+
+        # remove binding of the calling process
+        if self.os_members.get(os.getpid()) == pid:
+            del self.os_members[os.getpid()]
+
+    def _member_queues(self, pid: str, members: set) -> list:
+        """
+        List all queues a member can have.
+        :param pid: member identifier
+        :param members: the other members
+        :return: list of (queue key, sender, receiver) tuples
+        """
+        queues: list = [(self.queue_key(pid, pid), pid, pid)]
+        for other in members - {pid}:
+            queues.append((self.queue_key(pid, other), pid, other))
+            queues.append((self.queue_key(other, pid), other, pid))
+        return queues
+
+    def __reclaim(self, client: redis.StrictRedis, queues: list, batch: int = 100) -> int:
+        """
+        Delete queues of a redis instance (and release the shared payloads they reference).
+        :param client: redis instance holding the queues
+        :param queues: list of (queue key, sender, receiver) tuples (empty sender for inboxes)
+        :param batch: maximum number of keys deleted per script call
+        :return: number of deleted keys
+        """
+        # membership is checked again by the script only if the member set is on the same instance
+        check: int = 1 if client is self.channel else 0
+        deleted: int = 0
+        for i in range(0, len(queues), batch):
+            chunk: list = queues[i:i + batch]
+            deleted += self.__reclaim_script(keys=['members'] + [k[0] for k in chunk],
+                                             args=[check] + [pid for k in chunk for pid in k[1:]], client=client)
+        return deleted
+
+    def _caller(self, member: str = None) -> str:
+        """
+        Resolve the acting member of an operation.
+        :param member: explicitly given member or None
+        :return: member id (the member bound to the calling process if none is given)
+        """
+        return member if member is not None else self.os_members[os.getpid()]
+
+    def __start_renewer(self) -> None:
+        if self.__renewer is not None:
+            return
+        self.__renewer = threading.Thread(target=self.__renew, name='ChannelLeaseRenewer', daemon=True)
+        self.__renewer.start()
+
+    def __renew(self) -> None:
+        # renew the leases of all members joined by this instance, lost leases are not taken again
+        interval_ms: int = int(self.lease * 1000)
+        while True:
+            time.sleep(self.lease / 3)
+            pids: list = list(self.__leased)
+            if not pids:
+                continue
+            try:
+                with self.channel.pipeline(transaction=False) as pipe:
+                    for pid in pids:
+                        pipe.pexpire('lease:' + pid, interval_ms)
+                    renewed: list = pipe.execute()
+            except redis.RedisError as ex:
+                self.logger.warning("Renewing leases failed: %s", ex)
+                continue
+            for pid, ok in zip(pids, renewed):
+                if not ok and pid in self.__leased:
+                    self.logger.warning("Member %s lost its lease", pid)
+                    self.__leased.discard(pid)
 
-        # remove binding and global member element
-        del self.os_members[os_pid]
-        self.channel.srem('members', pid)
+    def collect(self, batch: int = 100) -> tuple:
+        """
+        Remove members with expired leases and delete orphaned queues of all shards.
+        Keys are sampled by SCAN and deleted in batches of server-side script calls.
+        :param batch: SCAN batch size hint and maximum number of keys deleted per script call
+        :return: tuple of the list of removed member ids and the number of deleted queues
+        """
+        reaped: list = [pid.decode() for pid in
+                        self.__reap_script(keys=['members', 'epoch', 'subgroups', 'leased', 'reaped'])]
+        if reaped:
+            self.logger.info("Members %s expired", reaped)
+        # reaped ids (including those of interrupted collections and leaves) are released
+        # once their queues are deleted
+        released: set = self._decode_set(self.channel.smembers('reaped'))
+        deleted: int = 0
+        for client in {id(client): client for client in self.shards}.values():
+            keys: list = []
+            for key in client.scan_iter(count=batch):
+                key = key.decode(errors='replace')
+                if key.startswith("['"):
+                    try:
+                        keys.append((key,) + tuple(ast.literal_eval(key)))
+                    except (ValueError, SyntaxError):
+                        pass
+                elif key.startswith('inbox:'):
+                    keys.append((key, '', key[len('inbox:'):]))
+            # read members after the scan: members owning a scanned queue had joined before
+            members: set = self._decode_set(self.channel.smembers('members'))
+            orphans: list = [k for k in keys if k[2] not in members or (k[1] and k[1] not in members)]
+            if client is not self.channel:
+                # membership cannot be checked again when deleting from other instances,
+                # so quarantine the former members first: their ids must not be claimed meanwhile
+                former: list = list({pid for k in orphans for pid in k[1:]
+                                     if pid and pid not in members and pid not in released})
+                if former:
+                    released |= self._decode_set(
+                        self.__quarantine_script(keys=['members', 'reaped'], args=former))
+                orphans = [k for k in orphans if all(not pid or pid in members or pid in released for pid in k[1:])]
+            deleted += self.__reclaim(client, orphans, batch)
+        if released:
+            self.channel.srem('reaped', *released)
+        if deleted:
+            self.logger.info("Deleted %d orphaned queues", deleted)
+        return reaped, deleted
+
+    def start_collector(self, interval: float) -> None:
+        """
+        Periodically run collect() in a daemon thread.
+        :param interval: seconds between two collections
+        :return: None
+        """
+        assert self.__collector is None, 'collector already running'
+        stop = threading.Event()
 
-        # decode member set binary elements to string list
-        raw_members: set = self.channel.smembers('members')
-        members: set = self.__decode_set(raw_members)
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.collect()
+                except redis.RedisError as ex:
+                    self.logger.warning("Collecting orphaned queues failed: %s", ex)
 
-        # construct bidirectional queue names for new member and all existing members (if any)
-        if len(members) > 0:
-            xchan: list = [[pid, other] for other in members] + [[other, pid] for other in members]
-            # pop queue names from global list of all possible transfer queues
-            for xc in xchan:
-                self.channel.lrem('xchan', 0, pickle.dumps(xc))
+        self.__collector = stop
+        threading.Thread(target=run, name='ChannelCollector', daemon=True).start()
 
-        # remove member id from subgroup set
-        self.channel.srem(subgroup, pid)
+    def stop_collector(self) -> None:
+        """
+        Stop periodic collection.
+        :return: None
+        """
+        if self.__collector is not None:
+            self.__collector.set()
+            self.__collector = None
 
-    def exists(self, pid: str) -> bool:
+    def exists(self, pid: str, subgroup: str = 'members') -> bool:
         """
-        Check if pid is in global member set
+        Check if pid is in global member set (or in a subgroup) using the local membership view
         :param pid: process identifier
+        :param subgroup: optional subgroup identifier
         :return: boolean value, true if pid is a member
         """
-        return self.channel.sismember('members', pid)
+        return self._are_members([str(pid)], subgroup)[0]
 
     def bind(self, pid: str) -> int:
         """
@@ -155,19 +740,123 @@ class Channel:
         # retrieve os pid and map to given member id
         os_pid: int = os.getpid()
         self.os_members[os_pid] = pid
-        self.logger.debug("Member {} bound {}".format(pid, os_pid))
+        self.logger.debug("Member %s bound %s", pid, os_pid)
         return os_pid
 
     def subgroup(self, subgroup: str) -> set:
         """
         Retrieve members of a subgroup.
+        The subgroup is always read from redis and then stored in the local membership view.
         :param subgroup: subgroup string identifier
         :return: set of member process identifiers
         """
-        return self.__decode_set(self.channel.smembers(subgroup))
+        return set(self._view_of(subgroup, refresh=True))
+
+    def __start_listener(self) -> None:
+        """
+        Subscribe to membership notifications and handle them in a daemon thread.
+        The subscription is confirmed before the local view is filled, so no change can be missed.
+        """
+        pubsub = self.channel.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{'membership': self.__on_membership_change})
+        pubsub.get_message(timeout=1.0)  # wait for subscribe confirmation
+        self.__listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True,
+                                               exception_handler=self.__on_listener_error)
+
+    def __on_membership_change(self, message) -> None:
+        # some member joined or left, drop the whole view
+        with self.__view_lock:
+            self.__view = {}
+            self.__view_generation += 1
+        self.logger.debug("Membership view invalidated by %s", message['data'])
+
+    def __on_listener_error(self, ex, pubsub, thread) -> None:
+        # notifications may have been lost, drop the view and resubscribe on next use
+        self.logger.warning("Membership listener failed: %s", ex)
+        thread.stop()
+        pubsub.close()
+        with self.__view_lock:
+            self.__view = {}
+            self.__listener = None
+
+    def _view_of(self, group: str, refresh: bool = False) -> set:
+        """
+        Retrieve the locally cached member set of a group ('members' or a subgroup).
+        :param group: group identifier
+        :param refresh: force reading the group from redis
+        :return: set of member ids (must not be modified)
+        """
+        start: float = time.perf_counter()
+        if not self.cache_members:
+            members: set = self._decode_set(self.channel.smembers(group))
+            if self.stats is not None:
+                self.stats.record('membership', 1, time.perf_counter() - start)
+            return members
+        with self.__view_lock:
+            if self.__listener is None:
+                self.__view = {}
+                self.__start_listener()
+            if not refresh and group in self.__view:
+                return self.__view[group]
+            generation = self.__view_generation
+        # read group and epoch atomically
+        with self.channel.pipeline(transaction=True) as pipe:
+            pipe.get('epoch')
+            pipe.smembers(group)
+            epoch, raw_members = pipe.execute()
+        if self.stats is not None:
+            self.stats.record('membership', 1, time.perf_counter() - start)
+        members = self._decode_set(raw_members)
+        with self.__view_lock:
+            # only store the group if no change was announced meanwhile
+            if generation == self.__view_generation:
+                # groups read at different epochs must not be mixed
+                if epoch != self.__view_epoch:
+                    self.__view = {}
+                    self.__view_epoch = epoch
+                self.__view[group] = members
+        return members
+
+    def _are_members(self, pids: list, group: str = 'members') -> list:
+        """
+        Check membership of several ids against the local membership view.
+        The view is refreshed once if some id is unknown.
+        :param pids: list of member identifiers
+        :param group: group identifier ('members' or a subgroup)
+        :return: list of boolean values in the order of pids
+        """
+        members = self._view_of(group)
+        known = [pid in members for pid in pids]
+        if not all(known) and self.cache_members:
+            members = self._view_of(group, refresh=True)
+            known = [pid in members for pid in pids]
+        return known
+
+    def _caller_and_members(self, caller: str) -> tuple:
+        """
+        Validate the caller and retrieve the global member set from the local membership view.
+        :param caller: member identifier of the caller
+        :return: tuple of caller membership flag and set of member identifiers
+        """
+        members = self._view_of('members')
+        if caller not in members and self.cache_members:
+            members = self._view_of('members', refresh=True)
+        return caller in members, members
+
+    def queues(self, pid: str = None) -> tuple:
+        """
+        List the queues of a member as derived from the local membership view.
+        :param pid: member identifier (defaults to the member bound to the calling process)
+        :return: tuple of the sets of incoming and outgoing queue keys
+        """
+        pid = self._caller(pid)
+        others: set = self._view_of('members') - {pid}
+        incoming: set = {self.queue_key(other, pid) for other in others}
+        outgoing: set = {self.queue_key(pid, other) for other in others}
+        return incoming, outgoing
 
     @staticmethod
-    def __queue_key(sender: str, receiver: str) -> str:
+    def queue_key(sender: str, receiver: str) -> str:
         """
         Construct queue name from sender and receiver ids.
         :param sender: member identifier
@@ -176,100 +865,738 @@ class Channel:
         """
         return str([sender, receiver])
 
-    def send_to(self, destination_set: set, message: object) -> None:
+    def _shard_index(self, pid: str) -> int:
+        if len(self.shards) == 1:
+            return 0
+        return zlib.crc32(pid.encode()) % len(self.shards)
+
+    def shard(self, pid: str) -> redis.StrictRedis:
+        """
+        Lookup the redis instance holding the incoming queues of a member.
+        :param pid: member identifier
+        :return: redis client
+        """
+        return self.shards[self._shard_index(pid)]
+
+    def flushall(self) -> None:
+        """
+        Remove all members, subgroups and queues from the main instance and all shards.
+        :return: None
+        """
+        for client in {id(client): client for client in [self.channel] + self.shards}.values():
+            client.flushall()
+
+    def send_to(self, destination_set: set, message: object, member: str = None) -> None:
         """
         Sends an asynchronous, persistent multicast message.
         :param destination_set: a set of member identifiers
         :param message: the message object to be send (see 'message format' in class doc)
+        :param member: acting member (default: the member bound to the calling process)
         :return: None
         """
-        # destination_set needs to contain string identifiers
-        assert all(type(k) is str for k in destination_set), 'type error'
+        start: float = time.perf_counter()
+        caller: str = self._caller(member)
+        if self.scripted:
+            pushed: bool = self.__send_scripted('send_to', caller, destination_set, message, start, self.overflow)
+        else:
+            destinations: list = self.__destinations(caller, destination_set)
+            self.logger.debug("%s sends %s to %s", caller, message, destination_set)
+            pushed = self.__push('send_to', caller, destinations, message, start, self.overflow)
+        if not pushed:
+            raise QueueFullError('queue full')
 
-        # lookup member id by pid and validate it
-        caller: str = self.os_members[os.getpid()]
-        assert self.channel.sismember('members', caller), 'unknown sender'
-        self.logger.debug("{} sends {} to {}".format(caller, message, destination_set))
+    def try_send(self, destination_set: set, message: object, member: str = None) -> bool:
+        """
+        Sends an asynchronous, persistent multicast message unless a destination queue is full.
+        Never blocks on full queues (with overflow policy 'drop', the oldest messages are discarded instead).
+        :param destination_set: a set of member identifiers
+        :param message: the message object to be send
+        :param member: acting member (default: the member bound to the calling process)
+        :return: True if the message was sent, False if it was rejected due to a full queue
+        """
+        start: float = time.perf_counter()
+        caller: str = self._caller(member)
+        overflow: str = 'drop' if self.overflow == 'drop' else 'fail'
+        if self.scripted:
+            return self.__send_scripted('try_send', caller, destination_set, message, start, overflow)
+        destinations: list = self.__destinations(caller, destination_set)
+        self.logger.debug("%s tries to send %s to %s", caller, message, destination_set)
+        return self.__push('try_send', caller, destinations, message, start, overflow)
+
+    def __destinations(self, caller: str, destination_set: set) -> list:
+        """
+        Validate the caller and a set of destinations.
+        :param caller: member identifier of the sender
+        :param destination_set: a set of member identifiers
+        :return: list of destination ids
+        """
+        # destination_set needs to contain string identifiers
+        if not all(isinstance(k, str) for k in destination_set):
+            raise TypeError('destination ids must be strings')
+        destinations: list = list(destination_set)
 
-        # push message to incoming queues of all destinations
-        for destination in destination_set:
-            assert self.channel.sismember('members', destination), 'unknown receiver'
-            self.channel.rpush(self.__queue_key(caller, destination), pickle.dumps(message))
+        # validate caller and all destinations against the local membership view
+        known: list = self._are_members([caller] + destinations)
+        if not known[0]:
+            raise UnknownMemberError('unknown sender')
+        if not all(known[1:]):
+            raise UnknownMemberError('unknown receiver')
+        return destinations
 
-    def send_to_all(self, message: object) -> None:
+    def send_to_all(self, message: object, member: str = None) -> None:
         """
         Sends an asynchronous, persistent broadcast message.
         The message is delivered to all queues of currently registered members.
         :param message: the message object to be send
+        :param member: acting member (default: the member bound to the calling process)
         :return: None
         """
-        # lookup member id by pid and validate it
-        caller: str = self.os_members[os.getpid()]
-        assert self.channel.sismember('members', caller), 'unknown sender'
-        self.logger.debug("{} sends {} to all members".format(caller, message))
+        start: float = time.perf_counter()
+        caller: str = self._caller(member)
+        if self.scripted:
+            pushed: bool = self.__send_scripted('send_to_all', caller, None, message, start, self.overflow)
+        else:
+            # validate caller
+            known, members = self._caller_and_members(caller)
+            if not known:
+                raise UnknownMemberError('unknown sender')
+            self.logger.debug("%s sends %s to all members", caller, message)
+            pushed = self.__push('send_to_all', caller, members, message, start, self.overflow)
+        if not pushed:
+            raise QueueFullError('queue full')
 
-        members = self.__decode_set(self.channel.smembers('members'))
-        # push message to incoming queues of all members
-        for destination in members:
-            self.channel.rpush([self.__queue_key(caller, destination)], pickle.dumps(message))
+    def __send_scripted(self, operation: str, caller: str, destination_set, message: object, start: float,
+                        overflow: str) -> bool:
+        """
+        Validate caller and destinations and push a message in one server-side script.
+        The script is called again while blocking on full queues.
+        :param operation: name of the calling operation (for metrics)
+        :param caller: member identifier of the sender
+        :param destination_set: a set of member identifiers or None for all members
+        :param message: the message object
+        :param start: start time of the calling operation (for metrics)
+        :param overflow: overflow policy for bounded queues
+        :return: True if the message was pushed, False if it was rejected due to a full queue
+        """
+        destinations: list = [] if destination_set is None else list(destination_set)
+        # destinations needs to contain string identifiers
+        if not all(isinstance(k, str) for k in destinations):
+            raise TypeError('destination ids must be strings')
+        self.logger.debug("%s sends %s to %s", caller, message, 'all members' if destination_set is None
+                          else destination_set)
+        data, size = self._encode(message)
+        payload_key: str = ''
+        if self.max_queue is None and self.share_threshold is not None and len(data) >= self.share_threshold:
+            payload_key = 'payload:' + uuid.uuid4().hex
+        keys: list = ['members'] + [self.queue_key(caller, destination) for destination in destinations] + \
+            ([payload_key] if payload_key else [])
+        args: list = [caller, data, self.max_queue or 0, 1 if overflow == 'drop' else 0, 1 if payload_key else 0,
+                      1 if destination_set is None else 0] + destinations
+        round_trips: int = 0
+        blocked: float = 0.0
+        delay: float = 0.001
+        while True:
+            round_trips += 1
+            result = self.__send_script(keys, args)
+            if result != QUEUE_FULL or overflow != 'block':
+                break
+            # back off until the receivers have caught up
+            time.sleep(delay)
+            blocked += delay
+            delay = min(2 * delay, self.MAX_BACKOFF)
+        if result == UNKNOWN_CALLER:
+            raise UnknownMemberError('unknown sender')
+        if result == UNKNOWN_PEER:
+            raise UnknownMemberError('unknown receiver')
+        receivers: list = [] if result == QUEUE_FULL else [receiver.decode() for receiver in result]
+        if self.stats is not None:
+            bytes_sent: int = len(data) * len(receivers)
+            bytes_shared: int = 0
+            if payload_key and len(receivers) > 1:
+                bytes_shared = bytes_sent
+                bytes_sent = len(data) + (len(payload_key) + len(REFERENCE_TAG)) * len(receivers)
+                bytes_shared -= bytes_sent
+            self.stats.record(operation, round_trips, time.perf_counter() - start, bytes_sent=bytes_sent,
+                              bytes_serialized=size * len(receivers), bytes_shared=bytes_shared, blocked=blocked,
+                              sent=[self.queue_key(caller, receiver) for receiver in receivers])
+        return result != QUEUE_FULL
+
+    def __push(self, operation: str, caller: str, destinations, message: object, start: float,
+               overflow: str) -> bool:
+        """
+        Serialize a message once and push it to the incoming queues of all destinations in one round trip per shard.
+        Bounded queues (on the main instance only) are checked and pushed to by a server-side script
+        (retried while blocking).
+        :param operation: name of the calling operation (for metrics)
+        :param caller: member identifier of the sender
+        :param destinations: member identifiers of the receivers
+        :param message: the message object
+        :param start: start time of the calling operation (for metrics)
+        :param overflow: overflow policy for bounded queues
+        :return: True if the message was pushed, False if it was rejected due to a full queue
+        """
+        data, size = self._encode(message)
+        # group queue keys by shard of the receiver
+        by_shard: dict = {}
+        for destination in destinations:
+            by_shard.setdefault(self._shard_index(destination), []).append(self.queue_key(caller, destination))
+        round_trips: int = 0
+        blocked: float = 0.0
+        sent: list = []
+        bytes_sent: int = 0
+        bytes_shared: int = 0
+        share: bool = self.share_threshold is not None and len(data) >= self.share_threshold
+        for index, keys in by_shard.items():
+            round_trips += 1
+            if self.max_queue is None:
+                entry: bytes = data
+                with self.shards[index].pipeline(transaction=False) as pipe:
+                    if share and len(keys) > 1:
+                        # store the message once and push references
+                        payload_key: str = 'payload:' + uuid.uuid4().hex
+                        mapping: dict = {'data': data, 'refs': len(keys)}
+                        if self.timestamps:
+                            # keep the timestamp readable without fetching the data (see bench/channel_monitor.py)
+                            mapping['ts'] = data[:lab_serializer.TIMESTAMP_SIZE]
+                        pipe.hset(payload_key, mapping=mapping)
+                        entry = REFERENCE_TAG + payload_key.encode()
+                        bytes_sent += len(data)
+                    for key in keys:
+                        pipe.rpush(key, entry)
+                    pipe.execute()
+                sent += keys
+                bytes_sent += len(entry) * len(keys)
+                if entry is not data:
+                    # copies that were not sent
+                    bytes_shared += len(data) * (len(keys) - 1) - len(entry) * len(keys)
+                continue
+            args: list = [self.max_queue, 1 if overflow == 'drop' else 0, data]
+            delay: float = 0.001
+            while self.__push_script(keys, args, client=self.shards[index]) > 0:
+                if overflow != 'block':
+                    break
+                # back off until the receivers have caught up
+                time.sleep(delay)
+                blocked += delay
+                delay = min(2 * delay, self.MAX_BACKOFF)
+                round_trips += 1
+            else:
+                sent += keys
+                bytes_sent += len(data) * len(keys)
+                continue
+            break
+        if self.stats is not None:
+            self.stats.record(operation, round_trips, time.perf_counter() - start, bytes_sent=bytes_sent,
+                              bytes_serialized=size * len(sent), bytes_shared=bytes_shared, blocked=blocked,
+                              sent=sent)
+        return len(sent) == len(destinations)
+
+    def _encode(self, message: object) -> tuple:
+        """
+        Serialize a message, compress it if a compressor is set and timestamp it if enabled.
+        :param message: the message object
+        :return: tuple of encoded message and its serialized size before compression
+        """
+        data: bytes = self.serializer.dumps(message)
+        size: int = len(data)
+        if self.compressor is not None:
+            data = self.compressor.pack(data)
+        if self.timestamps:
+            data = lab_serializer.stamp(data)
+        return data, size
 
-    def receive_from_any(self, timeout: int = 0) -> tuple:
+    def receive_from_any(self, timeout: int = 0, member: str = None) -> tuple:
         """
         Make a blocking request to take the next message off any of the callers' incoming queues.
         :param timeout: optional timeout for blocking read.
+        :param member: acting member (default: the member bound to the calling process)
         :return: list containing the queue name and message
         """
-        # lookup member id by pid and validate it
-        caller = self.os_members[os.getpid()]
-        assert self.channel.sismember('members', str(caller)), 'unknown receiver'
+        start: float = time.perf_counter()
+        caller: str = self._caller(member)
+        if self.scripted:
+            return self.__receive_scripted('receive_from_any', caller, None, timeout, start)
+        # validate caller
+        known, members = self._caller_and_members(caller)
+        if not known:
+            raise UnknownMemberError('unknown receiver')
 
-        # decode member set binary elements
-        members: set = self.__decode_set(self.channel.smembers('members'))
         # construct incoming message queues for all members
-        in_queues: set = {self.__queue_key(member, caller) for member in members}
-        self.logger.debug("{} receives from {}".format(caller, in_queues))
-
-        # block until new msg appears on one of the incoming queues
-        result = self.channel.blpop(in_queues, timeout)
-        if result is not None:
-            # extract sender id from key part
-            key: str = result[0].decode()
-            sender: str = key.split("'")[1]
-            # deserialize msg content
-            message = pickle.loads(result[1])
-            # log and return results
-            self.logger.debug("{} received {} from {}".format(caller, message, sender))
-            return sender, message
-
-    def receive_from(self, sender_set: set, timeout: int = 0) -> tuple:
+        in_queues: set = {self.queue_key(other, caller) for other in members}
+        self.logger.debug("%s receives from %s", caller, in_queues)
+        return self.__pop('receive_from_any', caller, in_queues, timeout, start)
+
+    def receive_many(self, max_count: int, timeout: int = 0, member: str = None) -> list:
+        """
+        Make a blocking request to take the next message off any of the callers' incoming queues.
+        Up to max_count messages that are pending on these queues are taken off in the same round trip.
+        :param max_count: maximum number of messages to take
+        :param timeout: optional timeout for blocking read.
+        :param member: acting member (default: the member bound to the calling process)
+        :return: list of (sender, message) tuples, empty on timeout
+        """
+        start: float = time.perf_counter()
+        # validate caller
+        caller: str = self._caller(member)
+        known, members = self._caller_and_members(caller)
+        if not known:
+            raise UnknownMemberError('unknown receiver')
+
+        # construct incoming message queues for all members
+        in_queues: set = {self.queue_key(other, caller) for other in members}
+        self.logger.debug("%s receives up to %s from %s", caller, max_count, in_queues)
+        return self.__pop_many('receive_many', caller, in_queues, max_count, timeout, start)
+
+    def receive_from(self, sender_set: set, timeout: int = 0, member: str = None) -> tuple:
         """
         Make a blocking call to pop the next message off any of the callers' queues
         from the members specified in the sender_set attribute.
         :param sender_set: set of ids to watch respective incoming queues for a new message
         :param timeout: optional timeout for blocking call
+        :param member: acting member (default: the member bound to the calling process)
         :return:
         """
-        assert (type(k) is str for k in sender_set), 'Address type mismatch.'
-
-        # lookup member id by pid and validate it
-        caller: str = self.os_members[os.getpid()]
-        assert self.channel.sismember('members', caller), 'unknown receiver'
-        self.logger.debug("{} receives from {}".format(caller, sender_set))
-
-        # validate all senders and construct incoming queues for them
-        in_queues: set = set()
-        for sender in sender_set:
-            assert self.channel.sismember('members', sender), 'unknown sender'
-            in_queues.add(self.__queue_key(sender, caller))
-
-        # block until new msg appears on one of the queues
-        result = self.channel.blpop(in_queues, timeout)
-        if result is not None:
-            # extract sender id from key part
-            key: str = result[0].decode()
-            sender: str = key.split("'")[1]
-            # deserialize msg content
-            message = pickle.loads(result[1])
-            # log and return results
-            self.logger.debug("{} received {} from {}".format(caller, message, sender))
-            return sender, message
+        start: float = time.perf_counter()
+        # sender_set needs to contain string identifiers
+        if not all(isinstance(k, str) for k in sender_set):
+            raise TypeError('sender ids must be strings')
+        caller: str = self._caller(member)
+        if self.scripted:
+            return self.__receive_scripted('receive_from', caller, list(sender_set), timeout, start)
+        senders: list = list(sender_set)
+
+        # validate caller and all senders against the local membership view
+        known: list = self._are_members([caller] + senders)
+        if not known[0]:
+            raise UnknownMemberError('unknown receiver')
+        if not all(known[1:]):
+            raise UnknownMemberError('unknown sender')
+        self.logger.debug("%s receives from %s", caller, sender_set)
+
+        # construct incoming queues for all senders
+        in_queues: set = {self.queue_key(sender, caller) for sender in senders}
+        return self.__pop('receive_from', caller, in_queues, timeout, start)
+
+    def receive_from_many(self, sender_set: set, max_count: int, timeout: int = 0, member: str = None) -> list:
+        """
+        Make a blocking call to pop the next message off any of the callers' queues
+        from the members specified in the sender_set attribute.
+        Up to max_count messages that are pending on these queues are taken off in the same round trip.
+        :param sender_set: set of ids to watch respective incoming queues for new messages
+        :param max_count: maximum number of messages to take
+        :param timeout: optional timeout for blocking call
+        :param member: acting member (default: the member bound to the calling process)
+        :return: list of (sender, message) tuples, empty on timeout
+        """
+        start: float = time.perf_counter()
+        # sender_set needs to contain string identifiers
+        if not all(isinstance(k, str) for k in sender_set):
+            raise TypeError('sender ids must be strings')
+        caller: str = self._caller(member)
+        senders: list = list(sender_set)
+
+        # validate caller and all senders against the local membership view
+        known: list = self._are_members([caller] + senders)
+        if not known[0]:
+            raise UnknownMemberError('unknown receiver')
+        if not all(known[1:]):
+            raise UnknownMemberError('unknown sender')
+        self.logger.debug("%s receives up to %s from %s", caller, max_count, sender_set)
+
+        # construct incoming queues for all senders
+        in_queues: set = {self.queue_key(sender, caller) for sender in senders}
+        return self.__pop_many('receive_from_many', caller, in_queues, max_count, timeout, start)
+
+    def __receive_scripted(self, operation: str, caller: str, senders, timeout: int, start: float) -> tuple:
+        """
+        Validate caller and senders and pop the next pending message in one server-side script.
+        If no message is pending, block on the queues returned by the script.
+        :param operation: name of the calling operation (for metrics)
+        :param caller: member identifier of the receiver
+        :param senders: list of member identifiers or None for all members
+        :param timeout: timeout for blocking call
+        :param start: start time of the calling operation (for metrics)
+        :return: tuple of sender and message or None on timeout
+        """
+        self.logger.debug("%s receives from %s", caller, 'any' if senders is None else senders)
+        keys: list = ['members'] + [self.queue_key(sender, caller) for sender in senders or []]
+        result = self.__receive_script(keys, [caller, 1 if senders is None else 0] + (senders or []))
+        if result == UNKNOWN_CALLER:
+            raise UnknownMemberError('unknown receiver')
+        if result == UNKNOWN_PEER:
+            raise UnknownMemberError('unknown sender')
+        if result[0] == 0:
+            # nothing pending: wait for the next message
+            return self.__pop(operation, caller, result[1:], timeout, start, round_trips=2)
+        if self.stats is not None:
+            self.stats.record(operation, 1, time.perf_counter() - start, bytes_received=len(result[2]),
+                              received=[result[1].decode()])
+        return self.__unpack(caller, result[1], result[2])
+
+    def __pop(self, operation: str, caller: str, in_queues, timeout: int, start: float,
+              round_trips: int = 1) -> tuple:
+        """
+        Block until a message appears on one of the queues and take it off.
+        :param operation: name of the calling operation (for metrics)
+        :param caller: member identifier of the receiver
+        :param in_queues: set of queue keys
+        :param timeout: timeout for blocking call
+        :param start: start time of the calling operation (for metrics)
+        :param round_trips: number of round trips including the blocking pop (for metrics)
+        :return: tuple of sender and message or None on timeout
+        """
+        blocking: float = time.perf_counter()
+        result = self.shard(caller).blpop(in_queues, timeout)
+        blocked: float = time.perf_counter() - blocking
+        data = result[1] if result is not None else None
+        if data is not None and data[:1] == REFERENCE_TAG:
+            data = self.__deref(caller, data)
+            round_trips += 1
+        if self.stats is not None:
+            self.stats.record(operation, round_trips, time.perf_counter() - start, blocked=blocked,
+                              bytes_received=len(data) if data is not None else 0,
+                              received=[result[0].decode()] if result is not None else ())
+        if data is not None:
+            return self.__unpack(caller, result[0], data)
+
+    def __deref(self, caller: str, entry: bytes):
+        """
+        Resolve a reference to a shared payload.
+        :param caller: member identifier of the receiver
+        :param entry: queue entry holding the reference
+        :return: serialized message or None if the payload is missing
+        """
+        data = self.__deref_script(args=[entry], client=self.shard(caller))
+        if data is None:
+            self.logger.warning("%s lost shared payload %s", caller, entry[1:].decode())
+        return data
+
+    def __pop_many(self, operation: str, caller: str, in_queues: set, max_count: int, timeout: int,
+                   start: float) -> list:
+        """
+        Block until a message appears on one of the queues, then drain up to max_count messages.
+        Both steps are pipelined into a single round trip.
+        :param operation: name of the calling operation (for metrics)
+        :param caller: member identifier of the receiver
+        :param in_queues: set of queue keys
+        :param max_count: maximum number of messages
+        :param timeout: timeout for blocking call
+        :param start: start time of the calling operation (for metrics)
+        :return: list of (sender, message) tuples
+        """
+        assert max_count > 0, 'max_count must be positive'
+        keys: list = sorted(in_queues)
+        blocking: float = time.perf_counter()
+        with self.shard(caller).pipeline(transaction=False) as pipe:
+            pipe.blpop(keys, timeout)
+            # the script is sent along instead of being preloaded to avoid an extra round trip
+            pipe.eval(DRAIN_SCRIPT, len(keys), *keys, max_count - 1)
+            first, drained = pipe.execute()
+        blocked: float = time.perf_counter() - blocking
+        round_trips: int = 1
+        # the drain script resolves references, the blocking pop does not
+        if first is not None and first[1][:1] == REFERENCE_TAG:
+            first = (first[0], self.__deref(caller, first[1]))
+            round_trips += 1
+            if first[1] is None:
+                first = None
+        # flatten to alternating queue keys and messages
+        items: list = (list(first) if first is not None else []) + drained
+        if self.stats is not None:
+            self.stats.record(operation, round_trips, time.perf_counter() - start, blocked=blocked,
+                              bytes_received=sum(len(data) for data in items[1::2]),
+                              received=[key.decode() for key in items[0::2]])
+        return [self.__unpack(caller, items[i], items[i + 1]) for i in range(0, len(items), 2)]
+
+    def __unpack(self, caller: str, key: bytes, data: bytes) -> tuple:
+        """
+        Extract sender id from queue key and deserialize message.
+        :param caller: member identifier of the receiver
+        :param key: queue key
+        :param data: serialized message
+        :return: tuple of sender and message
+        """
+        # extract sender id from key part
+        sender: str = key.decode().split("'")[1]
+        # deserialize msg content
+        message = lab_serializer.loads(data)
+        # log and return results
+        self.logger.debug("%s received %s from %s", caller, message, sender)
+        return sender, message
+
+
+class StreamChannel(Channel):
+    """
+    StreamChannel is an alternative channel backend with a single inbox per member.
+    It offers the same API as Channel and can be used as a drop-in replacement.
+
+    Inboxes are implemented as redis streams (stored on the shard of their member).
+    Send operations append an entry to the inbox stream of each receiver.
+    Entries carry the sender id, a message id (shared by all copies of a multicast) and the serialized message.
+    Receive operations read from the caller's inbox via a consumer group.
+    Thus, the cost of a receive does not depend on the number of members.
+
+    Selective receive operations (receive_from) keep entries of other senders in a local buffer,
+    so they are delivered by later receive operations in their original order.
+
+    By default, entries are acknowledged on delivery.
+    With auto_ack=False, delivered entries stay pending until the receiver calls ack().
+    Pending entries are delivered again when a (restarted) process binds to the same member id.
+
+    Entries are deleted from the inbox once they are read (auto_ack) or acknowledged (ack()).
+    Thus, the length of an inbox is its backlog of undelivered (and unacknowledged) entries.
+    Inboxes are not bounded, so try_send() always sends.
+
+    Redis data Structures (in addition to Channel):
+
+    Inboxes
+        Key: "inbox:<member>"
+        Value: redis stream of entries {sender, mid, data} send to member, with consumer group "inbox"
+    """
+
+    GROUP: str = 'inbox'
+
+    def __init__(self, n_bits: int = 5, host_ip: str = 'localhost', port_no: int = 6379,
+                 cache_members: bool = True, serializer: lab_serializer.Serializer = None, auto_ack: bool = True,
+                 stats: bool = False, compressor: lab_serializer.Compressor = None, shards: list = None,
+                 lease: float = None):
+        super().__init__(n_bits, host_ip, port_no, cache_members, serializer, stats, compressor, shards=shards,
+                         lease=lease)
+        self.auto_ack: bool = auto_ack
+        # entries read from the inbox but not yet delivered (per member)
+        self.__buffer: dict = {}
+        # entry ids delivered but not yet acknowledged (per member)
+        self.__unacked: dict = {}
+
+    @staticmethod
+    def inbox_key(pid: str) -> str:
+        """
+        Construct inbox name of a member.
+        :param pid: member identifier
+        :return: redis key
+        """
+        return 'inbox:' + pid
+
+    def _member_queues(self, pid: str, members: set) -> list:
+        return [(self.inbox_key(pid), '', pid)]
+
+    def join(self, subgroup: str) -> str:
+        pid: Member = super().join(subgroup)
+        # create a fresh inbox, dropping any leftovers of a former member with the same id
+        with self.shard(pid).pipeline(transaction=True) as pipe:
+            pipe.delete(self.inbox_key(pid))
+            pipe.xgroup_create(self.inbox_key(pid), self.GROUP, id='0', mkstream=True)
+            pipe.execute()
+        return pid
+
+    def bind(self, pid: str) -> int:
+        os_pid: int = super().bind(pid)
+        # entries that were read before a crash but never acknowledged are delivered first
+        self.__buffer[pid] = self.__read(pid, '0', None)
+        self.__unacked[pid] = []
+        return os_pid
+
+    def ack(self, member: str = None) -> int:
+        """
+        Acknowledge all entries delivered to the calling member so far.
+        :param member: acting member (default: the member bound to the calling process)
+        :return: number of acknowledged entries
+        """
+        caller: str = self._caller(member)
+        entry_ids: list = self.__unacked.get(caller, [])
+        if self.auto_ack or not entry_ids:
+            return 0
+        self.__unacked[caller] = []
+        # acknowledge and delete the entries in one round trip
+        with self.shard(caller).pipeline(transaction=False) as pipe:
+            pipe.xack(self.inbox_key(caller), self.GROUP, *entry_ids)
+            pipe.xdel(self.inbox_key(caller), *entry_ids)
+            return pipe.execute()[0]
+
+    def __read(self, caller: str, start: str, block, count: int = None, tally: list = None) -> list:
+        """
+        Read entries from the inbox of a member.
+        :param caller: member identifier
+        :param start: '>' for new entries or '0' for pending entries
+        :param block: milliseconds to block or None
+        :param count: maximum number of entries or None
+        :param tally: optional list of [round trips, bytes received, seconds blocked] to add to (for metrics)
+        :return: list of (entry id, sender, message id, message) tuples
+        """
+        blocking: float = time.perf_counter()
+        result = self.shard(caller).xreadgroup(self.GROUP, caller, {self.inbox_key(caller): start},
+                                               count=count, block=block, noack=self.auto_ack)
+        if tally is not None:
+            tally[0] += 1
+            tally[2] += time.perf_counter() - blocking
+        if self.auto_ack and result:
+            # entries read without acknowledgement are never delivered again, drop them from the inbox
+            self.shard(caller).xdel(self.inbox_key(caller),
+                                    *[entry_id for _, stream_entries in result for entry_id, _ in stream_entries])
+            if tally is not None:
+                tally[0] += 1
+        entries: list = []
+        for _, stream_entries in result or []:
+            for entry_id, fields in stream_entries:
+                if not fields:  # pending entry that has been deleted meanwhile
+                    continue
+                if tally is not None:
+                    tally[1] += len(fields[b'data'])
+                entries.append((entry_id, fields[b'sender'].decode(), fields[b'mid'].decode(),
+                                lab_serializer.loads(fields[b'data'])))
+        return entries
+
+    def __deliver(self, operation: str, caller: str, accept, max_count: int, timeout: int, start: float) -> list:
+        """
+        Deliver buffered or newly read entries accepted by a filter.
+        :param operation: name of the calling operation (for metrics)
+        :param caller: member identifier
+        :param accept: predicate on sender ids
+        :param max_count: maximum number of entries
+        :param timeout: timeout in seconds (0 blocks forever)
+        :param start: start time of the calling operation (for metrics)
+        :return: list of (sender, message) tuples, empty on timeout
+        """
+        assert max_count > 0, 'max_count must be positive'
+        tally: list = [0, 0, 0.0] if self.stats is not None else None
+        delivered: list = self.__take(caller, accept, max_count, timeout, tally)
+        if tally is not None:
+            self.stats.record(operation, tally[0], time.perf_counter() - start, bytes_received=tally[1],
+                              blocked=tally[2], received=[self.inbox_key(caller)] * len(delivered))
+        return delivered
+
+    def __take(self, caller: str, accept, max_count: int, timeout: int, tally: list) -> list:
+        buffer: list = self.__buffer.setdefault(caller, [])
+        deadline: float = time.monotonic() + timeout
+        while True:
+            delivered: list = []
+            remaining: list = []
+            for entry in buffer:
+                if len(delivered) < max_count and accept(entry[1]):
+                    delivered.append(entry)
+                else:
+                    remaining.append(entry)
+            if delivered:
+                buffer[:] = remaining
+                if not self.auto_ack:
+                    self.__unacked.setdefault(caller, []).extend(entry[0] for entry in delivered)
+                for _, sender, _, message in delivered:
+                    self.logger.debug("%s received %s from %s", caller, message, sender)
+                return [(sender, message) for _, sender, _, message in delivered]
+            # block for the remaining time (redis blocks forever on 0 ms)
+            block: int = 0 if timeout == 0 else int((deadline - time.monotonic()) * 1000)
+            if timeout != 0 and block <= 0:
+                return []
+            entries: list = self.__read(caller, '>', block, max_count, tally)
+            if not entries and timeout != 0:
+                return []
+            buffer.extend(entries)
+
+    def send_to(self, destination_set: set, message: object, member: str = None) -> None:
+        start: float = time.perf_counter()
+        # destination_set needs to contain string identifiers
+        if not all(isinstance(k, str) for k in destination_set):
+            raise TypeError('destination ids must be strings')
+
+        # resolve acting member
+        caller: str = self._caller(member)
+        destinations: list = list(destination_set)
+
+        # validate caller and all destinations against the local membership view
+        known: list = self._are_members([caller] + destinations)
+        if not known[0]:
+            raise UnknownMemberError('unknown sender')
+        if not all(known[1:]):
+            raise UnknownMemberError('unknown receiver')
+        self.logger.debug("%s sends %s to %s", caller, message, destination_set)
+        self.__append('send_to', caller, destinations, message, start)
+
+    def try_send(self, destination_set: set, message: object, member: str = None) -> bool:
+        self.send_to(destination_set, message, member)
+        return True
+
+    def send_to_all(self, message: object, member: str = None) -> None:
+        start: float = time.perf_counter()
+        # resolve acting member and validate it
+        caller: str = self._caller(member)
+        known, members = self._caller_and_members(caller)
+        if not known:
+            raise UnknownMemberError('unknown sender')
+        self.logger.debug("%s sends %s to all members", caller, message)
+        self.__append('send_to_all', caller, members, message, start)
+
+    def __append(self, operation: str, caller: str, destinations, message: object, start: float) -> None:
+        # serialize once and append an entry to the inboxes of all destinations in one round trip per shard
+        data, size = self._encode(message)
+        fields: dict = {'sender': caller, 'mid': uuid.uuid4().hex, 'data': data}
+        by_shard: dict = {}
+        for destination in destinations:
+            by_shard.setdefault(self._shard_index(destination), []).append(self.inbox_key(destination))
+        for index, keys in by_shard.items():
+            with self.shards[index].pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.xadd(key, fields)
+                pipe.execute()
+        if self.stats is not None:
+            keys: list = [key for keys in by_shard.values() for key in keys]
+            self.stats.record(operation, len(by_shard), time.perf_counter() - start,
+                              bytes_sent=len(data) * len(keys), bytes_serialized=size * len(keys), sent=keys)
+
+    def receive_from_any(self, timeout: int = 0, member: str = None) -> tuple:
+        start: float = time.perf_counter()
+        # resolve acting member and validate it
+        caller: str = self._caller(member)
+        if not self._are_members([caller])[0]:
+            raise UnknownMemberError('unknown receiver')
+        self.logger.debug("%s receives from any", caller)
+        delivered: list = self.__deliver('receive_from_any', caller, lambda sender: True, 1, timeout, start)
+        if delivered:
+            return delivered[0]
+
+    def receive_many(self, max_count: int, timeout: int = 0, member: str = None) -> list:
+        start: float = time.perf_counter()
+        # resolve acting member and validate it
+        caller: str = self._caller(member)
+        if not self._are_members([caller])[0]:
+            raise UnknownMemberError('unknown receiver')
+        self.logger.debug("%s receives up to %s from any", caller, max_count)
+        return self.__deliver('receive_many', caller, lambda sender: True, max_count, timeout, start)
+
+    def receive_from(self, sender_set: set, timeout: int = 0, member: str = None) -> tuple:
+        start: float = time.perf_counter()
+        # sender_set needs to contain string identifiers
+        if not all(isinstance(k, str) for k in sender_set):
+            raise TypeError('sender ids must be strings')
+        # resolve acting member
+        caller: str = self._caller(member)
+        senders: set = set(sender_set)
+
+        # validate caller and all senders against the local membership view
+        known: list = self._are_members([caller] + list(senders))
+        if not known[0]:
+            raise UnknownMemberError('unknown receiver')
+        if not all(known[1:]):
+            raise UnknownMemberError('unknown sender')
+        self.logger.debug("%s receives from %s", caller, sender_set)
+        delivered: list = self.__deliver('receive_from', caller, lambda sender: sender in senders, 1, timeout, start)
+        if delivered:
+            return delivered[0]
+
+    def receive_from_many(self, sender_set: set, max_count: int, timeout: int = 0, member: str = None) -> list:
+        start: float = time.perf_counter()
+        # sender_set needs to contain string identifiers
+        if not all(isinstance(k, str) for k in sender_set):
+            raise TypeError('sender ids must be strings')
+        # resolve acting member
+        caller: str = self._caller(member)
+        senders: set = set(sender_set)
+
+        # validate caller and all senders against the local membership view
+        known: list = self._are_members([caller] + list(senders))
+        if not known[0]:
+            raise UnknownMemberError('unknown receiver')
+        if not all(known[1:]):
+            raise UnknownMemberError('unknown sender')
+        self.logger.debug("%s receives up to %s from %s", caller, max_count, sender_set)
+        return self.__deliver('receive_from_many', caller, lambda sender: sender in senders, max_count,
+                              timeout, start)
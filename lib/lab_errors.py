@@ -0,0 +1,10 @@
+class ChannelError(Exception):
+    """Base class of errors raised by channel operations"""
+
+
+class UnknownMemberError(ChannelError):
+    """Raised if the caller or a destination/sender of a channel operation is not a member (anymore)"""
+
+
+class QueueFullError(ChannelError):
+    """Raised by send operations if a destination queue is at its high-water mark (overflow policy 'fail')"""
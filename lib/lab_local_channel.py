@@ -0,0 +1,387 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from multiprocessing.managers import BaseManager
+
+from . import lab_serializer
+from .lab_errors import ChannelError, UnknownMemberError
+from .lab_member import Member
+
+
+class LocalHub:
+    """
+    LocalHub holds the state of a local channel: members, subgroups and queues.
+    All operations are atomic and validate member ids.
+
+    Within a process, the hub is shared directly by all LocalChannel instances (e.g. one per thread).
+    Across processes, the hub runs in a LocalHubManager server process and is shared via proxies.
+    The proxies talk to the hub through local pipes or sockets.
+
+    Queues are indexed by receiver, so a receive only looks at the queues of the receiving member.
+    Each receiver waits on its own condition, so a send only wakes up its receivers.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__groups: dict = {'members': set()}
+        # maps receiver id to dict of sender id to queue of serialized messages
+        self.__inboxes: dict = {}
+        # maps receiver id to its wakeup condition
+        self.__conditions: dict = {}
+
+    def flushall(self) -> None:
+        """
+        Remove all members, subgroups and queues.
+        :return: None
+        """
+        with self.__lock:
+            self.__groups = {'members': set()}
+            self.__inboxes = {}
+            for condition in self.__conditions.values():
+                condition.notify_all()
+            self.__conditions = {}
+
+    def join(self, subgroup: str, maxproc: int, candidates: list):
+        """
+        Claim a free member id and add it to the global member set and a subgroup.
+        Random candidates are tried first, the id space is only swept if all candidates are taken.
+        :param subgroup: subgroup identifier
+        :param maxproc: size of id space
+        :param candidates: list of random candidate ids
+        :return: the claimed member id or None if the id space is full
+        """
+        with self.__lock:
+            members: set = self.__groups['members']
+            if len(members) >= maxproc:
+                return None
+            pid = next((str(c) for c in candidates if str(c) not in members), None)
+            offset = 1
+            while pid is None:
+                candidate = str((candidates[0] + offset) % maxproc)
+                pid = candidate if candidate not in members else None
+                offset += 1
+            members.add(pid)
+            self.__groups.setdefault(subgroup, set()).add(pid)
+            self.__inboxes[pid] = {}
+            self.__conditions[pid] = threading.Condition(self.__lock)
+            return pid
+
+    def leave(self, pid: str, subgroup: str) -> bool:
+        """
+        Remove a member from the global member set and a subgroup.
+        :param pid: member identifier
+        :param subgroup: subgroup identifier
+        :return: True if pid was a member
+        """
+        with self.__lock:
+            if pid not in self.__groups['members']:
+                return False
+            self.__groups['members'].discard(pid)
+            self.__groups.get(subgroup, set()).discard(pid)
+            return True
+
+    def members(self, group: str = 'members') -> set:
+        """
+        Retrieve a copy of the global member set or a subgroup.
+        :param group: group identifier
+        :return: set of member ids
+        """
+        with self.__lock:
+            return set(self.__groups.get(group, set()))
+
+    def are_members(self, pids: list, group: str = 'members') -> list:
+        """
+        Check membership of several ids.
+        :param pids: list of member identifiers
+        :param group: group identifier
+        :return: list of boolean values in the order of pids
+        """
+        with self.__lock:
+            members: set = self.__groups.get(group, set())
+            return [pid in members for pid in pids]
+
+    def push(self, sender: str, destinations, data: bytes) -> str:
+        """
+        Validate sender and destinations and append a message to the respective queues.
+        :param sender: member identifier of the sender
+        :param destinations: list of receiver ids or None for all members
+        :param data: serialized message
+        :return: None on success or an error text
+        """
+        with self.__lock:
+            members: set = self.__groups['members']
+            if sender not in members:
+                return 'unknown sender'
+            if destinations is None:
+                destinations = list(members)
+            elif not all(destination in members for destination in destinations):
+                return 'unknown receiver'
+            for destination in destinations:
+                self.__inboxes[destination].setdefault(sender, deque()).append(data)
+                self.__conditions[destination].notify_all()
+            return None
+
+    def pop(self, receiver: str, senders, max_count: int, timeout: float):
+        """
+        Wait for messages on the queues of a receiver and take up to max_count of them.
+        :param receiver: member identifier of the receiver
+        :param senders: list of sender ids or None for all members
+        :param max_count: maximum number of messages
+        :param timeout: timeout in seconds (0 waits forever)
+        :return: list of (sender, serialized message) tuples or an error text
+        """
+        with self.__lock:
+            members: set = self.__groups['members']
+            if receiver not in members:
+                return 'unknown receiver'
+            if senders is not None and not all(sender in members for sender in senders):
+                return 'unknown sender'
+            inbox: dict = self.__inboxes[receiver]
+            deadline: float = time.monotonic() + timeout
+            while True:
+                results: list = []
+                for sender in (list(inbox) if senders is None else senders):
+                    # only messages of current members are received (as with the redis channel)
+                    queue: deque = inbox.get(sender)
+                    if sender not in members or not queue:
+                        continue
+                    while queue and len(results) < max_count:
+                        results.append((sender, queue.popleft()))
+                    if len(results) == max_count:
+                        break
+                if results:
+                    return results
+                remaining = None if timeout == 0 else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                condition = self.__conditions.get(receiver)
+                if condition is None:  # flushed meanwhile
+                    return []
+                condition.wait(remaining)
+                members = self.__groups['members']
+                inbox = self.__inboxes.get(receiver, {})
+
+
+# The hub instance shared by all local channels of this process (unless another hub is given)
+_default_hub = LocalHub()
+
+
+class LocalHubManager(BaseManager):
+    """
+    Manager serving a single LocalHub to several processes.
+
+    Usage:
+        manager = LocalHubManager()
+        manager.start()
+        hub = manager.LocalHub()  # pass this proxy to child processes
+    """
+
+
+LocalHubManager.register('LocalHub', LocalHub)
+
+
+class LocalChannel:
+    """
+    LocalChannel is a drop-in replacement for lab_channel.Channel that does not need a redis server.
+    It offers the same API for members living on the same host.
+
+    By default, all LocalChannel instances of a process share one hub (e.g. members running in threads).
+    Members in different processes share a hub served by a LocalHubManager:
+    the manager's LocalHub proxy is passed to each process and handed to the LocalChannel constructor.
+
+    Messages are serialized on send and deserialized on receive.
+    Thus, receivers get copies, just as with the redis channel.
+    As with the redis channel, join() returns a Member endpoint and all operations take an explicit member id.
+    For compatibility, the hub is also available as attribute 'channel' (e.g. chan.channel.flushall()).
+    """
+
+    def __init__(self, n_bits: int = 5, hub: LocalHub = None, serializer: lab_serializer.Serializer = None):
+        # use shared hub of the process unless another one is given
+        self.channel = hub if hub is not None else _default_hub
+        # serializer for outgoing messages (incoming messages are decoded by their tag)
+        self.serializer = serializer if serializer is not None else lab_serializer.PickleSerializer()
+        # create dict of local pid bindings
+        self.os_members = {}
+        # Number of bits for pid addresses
+        self.n_bits: int = n_bits
+        # Maximum corresponding pid
+        self.MAXPROC: int = pow(2, n_bits)
+        # create instance logger
+        self.logger = logging.getLogger('vs2lab.channel.LocalChannel')
+        self.logger.debug('New LocalChannel created.')
+
+    def flushall(self) -> None:
+        """
+        Remove all members, subgroups and queues of the hub.
+        :return: None
+        """
+        self.channel.flushall()
+
+    def join(self, subgroup: str) -> str:
+        """
+        Join a process as a member to the global channel and associate it with a (sub)group.
+        :param subgroup: an identifier for the grouping
+        :return: global member id of the process (as a Member endpoint, see lab_member)
+        """
+        candidates: list = [random.randrange(self.MAXPROC) for _ in range(16)]
+        pid = self.channel.join(subgroup, self.MAXPROC, candidates)
+        if pid is None:
+            raise ChannelError('no free member id')
+        self.logger.info("Member %s joining %s.", pid, subgroup)
+        return Member(pid, self, subgroup)
+
+    def leave(self, subgroup: str, member: str = None):
+        """
+        Unregister a process from the global channel (and subgroup).
+        :param subgroup: subgroup identifier
+        :param member: acting member (default: the member bound to the calling process)
+        :return: None
+        """
+        pid: str = self._caller(member)
+        if not self.channel.leave(pid, subgroup):
+            raise UnknownMemberError('member unknown')
+        self.logger.info("Member %s leaving %s", pid, subgroup)
+        if self.os_members.get(os.getpid()) == pid:
+            del self.os_members[os.getpid()]
+
+    def exists(self, pid: str, subgroup: str = 'members') -> bool:
+        """
+        Check if pid is in global member set (or in a subgroup)
+        :param pid: process identifier
+        :param subgroup: optional subgroup identifier
+        :return: boolean value, true if pid is a member
+        """
+        return self.channel.are_members([str(pid)], subgroup)[0]
+
+    def bind(self, pid: str) -> int:
+        """
+        Associate os pid with channel member id.
+        :param pid: identifier of process member
+        :return: os pid value
+        """
+        os_pid: int = os.getpid()
+        self.os_members[os_pid] = pid
+        self.logger.debug("Member %s bound %s", pid, os_pid)
+        return os_pid
+
+    def _caller(self, member: str = None) -> str:
+        """
+        Resolve the acting member of an operation.
+        :param member: explicit member id or None for the member bound to the calling process
+        :return: member id
+        """
+        if member is not None:
+            return str(member)
+        return self.os_members[os.getpid()]
+
+    def subgroup(self, subgroup: str) -> set:
+        """
+        Retrieve members of a subgroup.
+        :param subgroup: subgroup string identifier
+        :return: set of member process identifiers
+        """
+        return self.channel.members(subgroup)
+
+    def send_to(self, destination_set: set, message: object, member: str = None) -> None:
+        """
+        Sends an asynchronous multicast message.
+        :param destination_set: a set of member identifiers
+        :param message: the message object to be send
+        :param member: acting member (default: the member bound to the calling process)
+        :return: None
+        """
+        # destination_set needs to contain string identifiers
+        if not all(isinstance(k, str) for k in destination_set):
+            raise TypeError('destination ids must be strings')
+        caller: str = self._caller(member)
+        self.logger.debug("%s sends %s to %s", caller, message, destination_set)
+        error = self.channel.push(caller, [str(k) for k in destination_set], self.serializer.dumps(message))
+        if error is not None:
+            raise UnknownMemberError(error)
+
+    def try_send(self, destination_set: set, message: object, member: str = None) -> bool:
+        """
+        Non-blocking variant of send_to. Local queues are unbounded, so the message is always sent.
+        :param destination_set: a set of member identifiers
+        :param message: the message object to be send
+        :param member: acting member (default: the member bound to the calling process)
+        :return: True
+        """
+        self.send_to(destination_set, message, member=member)
+        return True
+
+    def send_to_all(self, message: object, member: str = None) -> None:
+        """
+        Sends an asynchronous broadcast message to all currently registered members.
+        :param message: the message object to be send
+        :param member: acting member (default: the member bound to the calling process)
+        :return: None
+        """
+        caller: str = self._caller(member)
+        self.logger.debug("%s sends %s to all members", caller, message)
+        error = self.channel.push(caller, None, self.serializer.dumps(message))
+        if error is not None:
+            raise UnknownMemberError(error)
+
+    def receive_from_any(self, timeout: int = 0, member: str = None) -> tuple:
+        """
+        Make a blocking request to take the next message off any of the callers' incoming queues.
+        :param timeout: optional timeout for blocking read.
+        :param member: acting member (default: the member bound to the calling process)
+        :return: tuple of sender and message or None on timeout
+        """
+        results: list = self.receive_many(1, timeout, member=member)
+        if results:
+            return results[0]
+
+    def receive_from(self, sender_set: set, timeout: int = 0, member: str = None) -> tuple:
+        """
+        Make a blocking call to take the next message off any of the callers' queues
+        from the members specified in the sender_set attribute.
+        :param sender_set: set of ids to watch respective incoming queues for a new message
+        :param timeout: optional timeout for blocking call
+        :param member: acting member (default: the member bound to the calling process)
+        :return: tuple of sender and message or None on timeout
+        """
+        results: list = self.receive_from_many(sender_set, 1, timeout, member=member)
+        if results:
+            return results[0]
+
+    def receive_many(self, max_count: int, timeout: int = 0, member: str = None) -> list:
+        """
+        Make a blocking request to take up to max_count messages off the callers' incoming queues.
+        :param max_count: maximum number of messages to take
+        :param timeout: optional timeout for blocking read.
+        :param member: acting member (default: the member bound to the calling process)
+        :return: list of (sender, message) tuples, empty on timeout
+        """
+        return self.__pop(self._caller(member), None, max_count, timeout)
+
+    def receive_from_many(self, sender_set: set, max_count: int, timeout: int = 0, member: str = None) -> list:
+        """
+        Make a blocking call to take up to max_count messages off the callers' queues
+        from the members specified in the sender_set attribute.
+        :param sender_set: set of ids to watch respective incoming queues for new messages
+        :param max_count: maximum number of messages to take
+        :param timeout: optional timeout for blocking call
+        :param member: acting member (default: the member bound to the calling process)
+        :return: list of (sender, message) tuples, empty on timeout
+        """
+        # sender_set needs to contain string identifiers
+        if not all(isinstance(k, str) for k in sender_set):
+            raise TypeError('sender ids must be strings')
+        return self.__pop(self._caller(member), [str(k) for k in sender_set], max_count, timeout)
+
+    def __pop(self, caller: str, senders, max_count: int, timeout: int) -> list:
+        assert max_count > 0, 'max_count must be positive'
+        self.logger.debug("%s receives from %s", caller, 'any' if senders is None else senders)
+        results = self.channel.pop(caller, senders, max_count, timeout)
+        if isinstance(results, str):
+            raise UnknownMemberError(results)
+        messages: list = [(sender, lab_serializer.loads(data)) for sender, data in results]
+        for sender, message in messages:
+            self.logger.debug("%s received %s from %s", caller, message, sender)
+        return messages
@@ -1,10 +1,120 @@
+import atexit
 import logging
+import logging.handlers
+import queue
+import threading
 
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
-def setup(stream_level=logging.WARNING, file_level=logging.DEBUG, file_postfix=''):
+# the writer thread of asynchronous logging (if set up)
+_writer = None
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for a size-bounded queue.
+    If the queue is full, debug and info records are dropped (and counted) instead of blocking the logging thread.
+    Warnings and errors wait for free space, but at most timeout seconds (in case the writer thread is gone),
+    before they are dropped as well.
+
+    Records are queued unformatted, so message arguments are converted to text by the writer thread.
+    Thus, arguments must not be changed after logging them.
+    """
+
+    def __init__(self, record_queue: queue.Queue, timeout: float = 5.0):
+        super().__init__(record_queue)
+        self.timeout: float = timeout
+        self.dropped: int = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the queue never leaves the process, so the record does not need to be made picklable
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=self.timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class AsyncWriter:
+    """
+    AsyncWriter hands queued log records to the file and console handlers in a background thread.
+    Records are taken off the queue in batches, and the lines of a batch are written to the file at once.
+    Records failing to be formatted (e.g. due to wrong message arguments) are passed to handleError() of the
+    handler, as by logging.Handler, and do not stop the thread.
+    """
+
+    def __init__(self, record_queue: queue.Queue, file_handler: logging.FileHandler,
+                 stream_handler: logging.Handler, batch_size: int = 256):
+        self.queue: queue.Queue = record_queue
+        self.file_handler: logging.FileHandler = file_handler
+        self.stream_handler: logging.Handler = stream_handler
+        self.batch_size: int = batch_size
+        self.__thread = threading.Thread(target=self.__run, name='LogWriter', daemon=True)
+
+    def start(self) -> None:
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Write all pending records and stop the writer thread.
+        :return: None
+        """
+        if self.__thread.is_alive():
+            self.queue.put(None)
+            self.__thread.join()
+        self.file_handler.close()
+
+    def __run(self) -> None:
+        while True:
+            # wait for a record, then take whatever else is pending (up to a batch)
+            records: list = [self.queue.get()]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop: bool = None in records
+            records = [record for record in records if record is not None]
+            self.__write(records)
+            for record in records:
+                if record.levelno >= self.stream_handler.level:
+                    self.stream_handler.handle(record)
+            if stop:
+                return
+
+    def __write(self, records: list) -> None:
+        handler: logging.FileHandler = self.file_handler
+        lines: list = []
+        for record in records:
+            if record.levelno < handler.level:
+                continue
+            try:
+                lines.append(handler.format(record))
+            except Exception:  # pylint: disable=broad-except
+                handler.handleError(record)
+        if not lines:
+            return
+        handler.acquire()
+        try:
+            handler.stream.write(handler.terminator.join(lines) + handler.terminator)
+            handler.flush()
+        except Exception:  # pylint: disable=broad-except
+            handler.handleError(records[-1])
+        finally:
+            handler.release()
+
+
+def setup(stream_level=logging.WARNING, file_level=logging.DEBUG, file_postfix='',
+          asynchronous=False, buffer_size=10000, batch_size=256):
     # create logger with 'vs2lab'
     logger = logging.getLogger('vs2lab')
-    logger.setLevel(logging.DEBUG)
+    # records below both handler levels are discarded before they are formatted
+    logger.setLevel(min(stream_level, file_level))
 
     # create file handler which logs even debug messages
     fh = logging.FileHandler('vs2lab' + file_postfix + '.log')
@@ -15,11 +125,38 @@ def setup(stream_level=logging.WARNING, file_level=logging.DEBUG, file_postfix='
     ch.setLevel(stream_level)
 
     # create formatter and add it to the handlers
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter(FORMAT)
     fh.setFormatter(formatter)
     ch.setFormatter(formatter)
 
-    # add the handlers to the logger
-    logger.addHandler(fh)
-    logger.addHandler(ch)
+    if not asynchronous:
+        # add the handlers to the logger
+        logger.addHandler(fh)
+        logger.addHandler(ch)
+        return
+
+    # queue records in a bounded buffer and write them in a background thread
+    global _writer
+    shutdown()
+    record_queue = queue.Queue(buffer_size)
+    logger.addHandler(BoundedQueueHandler(record_queue))
+    _writer = AsyncWriter(record_queue, fh, ch, batch_size)
+    _writer.start()
+
+
+def shutdown():
+    """
+    Flush and stop asynchronous logging (called on exit).
+    :return: None
+    """
+    global _writer
+    if _writer is not None:
+        logger = logging.getLogger('vs2lab')
+        for handler in list(logger.handlers):
+            if isinstance(handler, BoundedQueueHandler):
+                logger.removeHandler(handler)
+        _writer.stop()
+        _writer = None
+
+
+atexit.register(shutdown)
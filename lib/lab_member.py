@@ -0,0 +1,88 @@
+class Member(str):
+    """
+    Handle of a member of a Channel (or LocalChannel), as returned by join().
+    Provides the channel operations on behalf of the member, independent of the calling process or thread.
+    Thus, one process can host many members, and threads can use their own members concurrently.
+
+    A Member is the member id itself (a str), so it can be used wherever member ids are expected
+    (bind(), destination and sender sets, ...). It is pickled as plain id.
+    MarshalSerializer does not accept str subclasses, use str(member) in marshalled messages.
+    """
+
+    def __new__(cls, pid: str, chan, subgroup: str):
+        member = super().__new__(cls, pid)
+        member.chan = chan
+        member.subgroup = subgroup
+        return member
+
+    def __reduce__(self):
+        return str, (str(self),)
+
+    def leave(self) -> None:
+        """
+        Unregister the member from the global channel (and its subgroup).
+        :return: None
+        """
+        self.chan.leave(self.subgroup, member=self)
+
+    def send_to(self, destination_set: set, message: object) -> None:
+        """
+        Sends an asynchronous multicast message (see Channel.send_to).
+        :param destination_set: a set of member identifiers
+        :param message: the message object to be send
+        :return: None
+        """
+        self.chan.send_to(destination_set, message, member=self)
+
+    def try_send(self, destination_set: set, message: object) -> bool:
+        """
+        Non-blocking variant of send_to (see Channel.try_send).
+        :param destination_set: a set of member identifiers
+        :param message: the message object to be send
+        :return: True if the message was sent
+        """
+        return self.chan.try_send(destination_set, message, member=self)
+
+    def send_to_all(self, message: object) -> None:
+        """
+        Sends an asynchronous broadcast message (see Channel.send_to_all).
+        :param message: the message object to be send
+        :return: None
+        """
+        self.chan.send_to_all(message, member=self)
+
+    def receive_from_any(self, timeout: int = 0) -> tuple:
+        """
+        Wait for the next message on any of the member's incoming queues.
+        :param timeout: optional timeout for blocking read
+        :return: tuple of sender and message or None on timeout
+        """
+        return self.chan.receive_from_any(timeout, member=self)
+
+    def receive_from(self, sender_set: set, timeout: int = 0) -> tuple:
+        """
+        Wait for the next message from any member of sender_set.
+        :param sender_set: set of ids to watch respective incoming queues for a new message
+        :param timeout: optional timeout for blocking read
+        :return: tuple of sender and message or None on timeout
+        """
+        return self.chan.receive_from(sender_set, timeout, member=self)
+
+    def receive_many(self, max_count: int, timeout: int = 0) -> list:
+        """
+        Wait for messages and take up to max_count of them off the member's incoming queues.
+        :param max_count: maximum number of messages to take
+        :param timeout: optional timeout for blocking read
+        :return: list of (sender, message) tuples, empty on timeout
+        """
+        return self.chan.receive_many(max_count, timeout, member=self)
+
+    def receive_from_many(self, sender_set: set, max_count: int, timeout: int = 0) -> list:
+        """
+        Wait for messages and take up to max_count of them from the members of sender_set.
+        :param sender_set: set of ids to watch respective incoming queues for new messages
+        :param max_count: maximum number of messages to take
+        :param timeout: optional timeout for blocking read
+        :return: list of (sender, message) tuples, empty on timeout
+        """
+        return self.chan.receive_from_many(sender_set, max_count, timeout, member=self)
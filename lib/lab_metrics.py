@@ -0,0 +1,171 @@
+import json
+import logging
+import threading
+import time
+
+
+class Histogram:
+    """
+    Latency histogram with logarithmic buckets.
+    Bucket i counts durations below 2^i microseconds (the last bucket also counts all longer ones).
+    """
+
+    BUCKETS: int = 26  # up to 2^25 us (about 33 seconds)
+
+    def __init__(self):
+        self.counts: list = [0] * self.BUCKETS
+        self.total: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.counts[min(int(seconds * 1e6).bit_length(), self.BUCKETS - 1)] += 1
+        self.total += seconds
+
+    def snapshot(self) -> dict:
+        """
+        :return: dict mapping bucket upper bounds (in microseconds) to counts, empty buckets are left out
+        """
+        return {str(2 ** i): count for i, count in enumerate(self.counts) if count > 0}
+
+
+class OperationStats:
+    """Counters of a single channel operation"""
+
+    def __init__(self):
+        self.calls: int = 0
+        self.round_trips: int = 0
+        self.bytes_serialized: int = 0
+        self.bytes_sent: int = 0
+        self.bytes_shared: int = 0
+        self.bytes_received: int = 0
+        self.blocked: float = 0.0
+        self.latency: Histogram = Histogram()
+
+    def snapshot(self) -> dict:
+        return {
+            'calls': self.calls,
+            'round_trips': self.round_trips,
+            'bytes_serialized': self.bytes_serialized,
+            'bytes_sent': self.bytes_sent,
+            'bytes_shared': self.bytes_shared,
+            'bytes_received': self.bytes_received,
+            # serialized bytes per byte sent (> 1 if messages were compressed),
+            # bytes saved by shared payloads count as sent, so sharing does not change the ratio
+            'compression_ratio': round(self.bytes_serialized / (self.bytes_sent + self.bytes_shared), 3)
+            if self.bytes_sent + self.bytes_shared else None,
+            'blocked_seconds': round(self.blocked, 6),
+            'latency_seconds': round(self.latency.total, 6),
+            'latency_us': self.latency.snapshot(),
+        }
+
+
+class ChannelStats:
+    """
+    ChannelStats collects per-operation metrics of a channel:
+    - redis round trips per call
+    - bytes serialized and sent (or received) and the resulting compression ratio
+    - bytes saved by storing multicast messages once (shared payloads)
+    - latency histograms
+    - time spent blocking in receive operations
+    - message counts per queue
+
+    A channel only creates a ChannelStats instance if collection is enabled.
+    Otherwise, the hot paths only check for None.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__operations: dict = {}
+        # maps queue keys to [sent, received] message counts
+        self.__queues: dict = {}
+        self.__since: float = time.time()
+        self.__dumper = None
+        self.logger = logging.getLogger('vs2lab.channel.stats')
+
+    def record(self, operation: str, round_trips: int, latency: float, bytes_sent: int = 0,
+               bytes_received: int = 0, blocked: float = 0.0, sent: list = (), received: list = (),
+               bytes_serialized: int = None, bytes_shared: int = 0) -> None:
+        """
+        Record a single call of a channel operation.
+        :param operation: operation name (e.g. 'send_to')
+        :param round_trips: number of redis round trips
+        :param latency: duration of the call in seconds
+        :param bytes_sent: number of serialized bytes sent
+        :param bytes_received: number of serialized bytes received
+        :param blocked: seconds spent waiting in blocking calls
+        :param sent: keys of queues a message was pushed to
+        :param received: keys of queues a message was taken from
+        :param bytes_serialized: number of bytes sent before compression (default: bytes_sent)
+        :param bytes_shared: number of bytes not sent because copies were replaced by shared payload references
+        :return: None
+        """
+        with self.__lock:
+            stats: OperationStats = self.__operations.get(operation)
+            if stats is None:
+                stats = self.__operations[operation] = OperationStats()
+            stats.calls += 1
+            stats.round_trips += round_trips
+            stats.bytes_serialized += bytes_sent if bytes_serialized is None else bytes_serialized
+            stats.bytes_sent += bytes_sent
+            stats.bytes_shared += bytes_shared
+            stats.bytes_received += bytes_received
+            stats.blocked += blocked
+            stats.latency.add(latency)
+            for key in sent:
+                self.__queues.setdefault(key, [0, 0])[0] += 1
+            for key in received:
+                self.__queues.setdefault(key, [0, 0])[1] += 1
+
+    def snapshot(self) -> dict:
+        """
+        Take a consistent copy of all metrics.
+        :return: dict with collection start time, per-operation and per-queue metrics
+        """
+        with self.__lock:
+            return {
+                'since': self.__since,
+                'time': time.time(),
+                'operations': {name: stats.snapshot() for name, stats in self.__operations.items()},
+                'queues': {key: {'sent': counts[0], 'received': counts[1]}
+                           for key, counts in self.__queues.items()},
+            }
+
+    def reset(self) -> None:
+        """
+        Drop all metrics collected so far.
+        :return: None
+        """
+        with self.__lock:
+            self.__operations = {}
+            self.__queues = {}
+            self.__since = time.time()
+
+    def start_dump(self, interval: float, path: str = None) -> None:
+        """
+        Periodically dump snapshots in a daemon thread.
+        :param interval: seconds between two dumps
+        :param path: file to append JSON lines to (default: log on INFO level)
+        :return: None
+        """
+        assert self.__dumper is None, 'dump already running'
+        stop = threading.Event()
+
+        def dump():
+            while not stop.wait(interval):
+                line: str = json.dumps(self.snapshot())
+                if path is None:
+                    self.logger.info(line)
+                else:
+                    with open(path, 'a') as out:
+                        out.write(line + '\n')
+
+        self.__dumper = stop
+        threading.Thread(target=dump, name='ChannelStatsDump', daemon=True).start()
+
+    def stop_dump(self) -> None:
+        """
+        Stop periodic dumps.
+        :return: None
+        """
+        if self.__dumper is not None:
+            self.__dumper.set()
+            self.__dumper = None
@@ -0,0 +1,326 @@
+import io
+import lzma
+import marshal
+import pickle
+import struct
+import time
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional
+    msgpack = None
+
+
+class Serializer:
+    """
+    Serializer converts channel messages to bytes and back.
+
+    Serialized messages start with a one byte tag identifying the serializer.
+    Thus, receivers can decode messages of any registered serializer (see loads()),
+    and members of a channel may use different serializers.
+    Custom serializers have to be registered (see register_serializer()) in all processes receiving their messages.
+    """
+
+    # one byte identifying the serializer (set by subclasses)
+    tag: bytes = b''
+
+    def dumps(self, message: object) -> bytes:
+        """
+        Serialize a message.
+        :param message: the message object
+        :return: tagged serialized message
+        """
+        raise NotImplementedError
+
+    def loads(self, view: memoryview) -> object:
+        """
+        Deserialize a message.
+        :param view: serialized message without tag
+        :return: the message object
+        """
+        raise NotImplementedError
+
+
+def _load_memoryview(buffer) -> memoryview:
+    return memoryview(buffer)
+
+
+class _OutOfBandPickler(pickle.Pickler):
+    """
+    Pickler moving large binary objects out of band.
+    Memoryviews (not picklable otherwise) are reconstructed as memoryviews of the received data.
+    """
+
+    def __init__(self, file, threshold: int, buffer_callback):
+        super().__init__(file, protocol=5, buffer_callback=buffer_callback)
+        self.threshold: int = threshold
+
+    def reducer_override(self, obj):
+        if type(obj) is memoryview:
+            if obj.contiguous:
+                return _load_memoryview, (pickle.PickleBuffer(obj),)
+            return _load_memoryview, (obj.tobytes(),)
+        if type(obj) is bytes and len(obj) >= self.threshold:
+            return bytes, (pickle.PickleBuffer(obj),)
+        return NotImplemented
+
+
+class PickleSerializer(Serializer):
+    """
+    Serializer based on pickle.
+
+    With protocol 5 (default), large binary objects (bytes, bytearray, memoryview, NumPy arrays)
+    are moved out of band: they are not copied into the pickle stream but appended to it in a single join.
+    On receive, they are reconstructed from slices of the received data.
+    Memoryviews and NumPy arrays thus reference the received data without a copy (read-only).
+
+    Layout: tag | number of buffers | length of pickle stream | lengths of buffers | pickle stream | buffers
+    """
+
+    tag: bytes = b'P'
+    __header = struct.Struct('<IQ')
+    __length = struct.Struct('<Q')
+
+    def __init__(self, protocol: int = 5, threshold: int = 4096):
+        """
+        :param protocol: pickle protocol (out-of-band buffers require protocol 5)
+        :param threshold: minimum size of bytes objects to be moved out of band
+        """
+        self.protocol: int = protocol
+        self.threshold: int = threshold
+
+    def dumps(self, message: object) -> bytes:
+        buffers: list = []
+        if self.protocol >= 5:
+            stream = io.BytesIO()
+            _OutOfBandPickler(stream, self.threshold, buffers.append).dump(message)
+            body = stream.getbuffer()
+        else:
+            body = pickle.dumps(message, protocol=self.protocol)
+        raw: list = [buffer.raw() for buffer in buffers]
+        header: bytes = self.tag + self.__header.pack(len(raw), len(body)) + \
+            b''.join(self.__length.pack(r.nbytes) for r in raw)
+        return b''.join([header, body] + raw)
+
+    def loads(self, view: memoryview) -> object:
+        count, body_length = self.__header.unpack_from(view)
+        offset: int = self.__header.size
+        lengths: list = [self.__length.unpack_from(view, offset + i * self.__length.size)[0] for i in range(count)]
+        offset += count * self.__length.size
+        body: memoryview = view[offset:offset + body_length]
+        offset += body_length
+        buffers: list = []
+        for length in lengths:
+            buffers.append(view[offset:offset + length])
+            offset += length
+        return pickle.loads(body, buffers=buffers)
+
+
+class MarshalSerializer(Serializer):
+    """
+    Serializer based on marshal.
+    Fast, but limited to core types (None, numbers, strings, bytes, tuples, lists, sets, dicts).
+    """
+
+    tag: bytes = b'M'
+
+    def dumps(self, message: object) -> bytes:
+        return self.tag + marshal.dumps(message)
+
+    def loads(self, view: memoryview) -> object:
+        return marshal.loads(view)
+
+
+class MsgpackSerializer(Serializer):
+    """
+    Serializer based on msgpack (optional dependency).
+    Compact and language independent, but limited to core types.
+    Sequences are decoded as tuples.
+    """
+
+    tag: bytes = b'K'
+
+    def __init__(self):
+        assert msgpack is not None, 'msgpack is not installed'
+
+    def dumps(self, message: object) -> bytes:
+        return self.tag + msgpack.packb(message, use_bin_type=True)
+
+    def loads(self, view: memoryview) -> object:
+        return msgpack.unpackb(view, raw=False, use_list=False)
+
+
+class Codec:
+    """
+    Codec compresses serialized messages.
+
+    Compressed messages start with a one byte tag identifying the codec, followed by the compressed
+    (tagged) serialized message. Thus, receivers decompress transparently (see loads()).
+    Codec tags must differ from serializer tags (and from 'R', which marks references to shared payloads,
+    and 'T', which marks timestamped messages).
+    Custom codecs have to be registered (see register_codec()) in all processes receiving their messages.
+    """
+
+    # one byte identifying the codec (set by subclasses)
+    tag: bytes = b''
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, view: memoryview) -> bytes:
+        raise NotImplementedError
+
+
+class ZlibCodec(Codec):
+    """Codec based on zlib (the default level favours speed over ratio)"""
+
+    tag: bytes = b'Z'
+
+    def __init__(self, level: int = 1):
+        self.level: int = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, view: memoryview) -> bytes:
+        return zlib.decompress(view)
+
+
+class LzmaCodec(Codec):
+    """Codec based on lzma (better ratio, but much slower than zlib)"""
+
+    tag: bytes = b'X'
+
+    def __init__(self, preset: int = 1):
+        self.preset: int = preset
+
+    def compress(self, data: bytes) -> bytes:
+        return lzma.compress(data, preset=self.preset)
+
+    def decompress(self, view: memoryview) -> bytes:
+        return lzma.decompress(view)
+
+
+class Compressor:
+    """
+    Compressor applies a codec to serialized messages of at least threshold bytes.
+    Messages that do not get smaller are sent uncompressed.
+    """
+
+    def __init__(self, codec: Codec = None, threshold: int = 4096):
+        """
+        :param codec: the codec (default: zlib)
+        :param threshold: minimum size of serialized messages to be compressed
+        """
+        self.codec: Codec = codec if codec is not None else ZlibCodec()
+        self.threshold: int = threshold
+
+    def pack(self, data: bytes) -> bytes:
+        """
+        Compress a serialized message if it is large enough.
+        :param data: tagged serialized message
+        :return: tagged compressed message or data
+        """
+        if len(data) < self.threshold:
+            return data
+        packed: bytes = self.codec.tag + self.codec.compress(data)
+        return packed if len(packed) < len(data) else data
+
+
+# Tag of timestamped messages (see stamp())
+TIMESTAMP_TAG: bytes = b'T'
+_timestamp = struct.Struct('>Q')
+# Size of the prefix added by stamp()
+TIMESTAMP_SIZE: int = 1 + _timestamp.size
+
+
+def stamp(data: bytes) -> bytes:
+    """
+    Prefix an encoded (possibly compressed) message with the current time.
+    Layout: tag | milliseconds since the epoch | encoded message
+    :param data: encoded message
+    :return: timestamped message
+    """
+    return TIMESTAMP_TAG + _timestamp.pack(int(time.time() * 1000)) + data
+
+
+def timestamp(data) -> float:
+    """
+    Read the time a message was stamped at without decoding it.
+    :param data: encoded message (only the first bytes are needed)
+    :return: seconds since the epoch or None if the message carries no timestamp
+    """
+    if len(data) < TIMESTAMP_SIZE or data[:1] != TIMESTAMP_TAG:
+        return None
+    return _timestamp.unpack_from(data, 1)[0] / 1000
+
+
+# Tags with a fixed meaning in queue entries: references to shared payloads (see lab_channel.REFERENCE_TAG)
+# and timestamps
+_RESERVED_TAGS: tuple = (b'R', TIMESTAMP_TAG)
+
+# Registered serializers by tag
+_serializers: dict = {
+    PickleSerializer.tag[0]: PickleSerializer(),
+    MarshalSerializer.tag[0]: MarshalSerializer(),
+}
+if msgpack is not None:
+    _serializers[MsgpackSerializer.tag[0]] = MsgpackSerializer()
+
+# Registered codecs by tag
+_codecs: dict = {
+    ZlibCodec.tag[0]: ZlibCodec(),
+    LzmaCodec.tag[0]: LzmaCodec(),
+}
+
+
+def _check_tag(tag: bytes, registry: dict, handler) -> None:
+    """
+    Reject the tag of a serializer or codec to be registered if it is malformed or used otherwise.
+    Registering another instance of the same class under its tag is allowed.
+    """
+    if len(tag) != 1:
+        raise ValueError('tag must be a single byte')
+    if tag in _RESERVED_TAGS:
+        raise ValueError('tag {!r} is reserved'.format(tag))
+    for other in (_serializers, _codecs):
+        used = other.get(tag[0])
+        if used is not None and (other is not registry or type(used) is not type(handler)):
+            raise ValueError('tag {!r} is used by {}'.format(tag, type(used).__name__))
+
+
+def register_serializer(serializer: Serializer) -> None:
+    """
+    Register a serializer, so loads() decodes the messages it creates.
+    :param serializer: the serializer (its tag must not be used by another serializer or codec)
+    :return: None
+    """
+    _check_tag(serializer.tag, _serializers, serializer)
+    _serializers[serializer.tag[0]] = serializer
+
+
+def register_codec(codec: Codec) -> None:
+    """
+    Register a codec, so loads() decompresses the messages it creates.
+    :param codec: the codec (its tag must not be used by another codec or a serializer)
+    :return: None
+    """
+    _check_tag(codec.tag, _codecs, codec)
+    _codecs[codec.tag[0]] = codec
+
+
+def loads(data) -> object:
+    """
+    Deserialize a tagged message with the serializer it was created by.
+    Timestamps are skipped and compressed messages are decompressed first.
+    :param data: serialized message (bytes-like)
+    :return: the message object
+    """
+    view = memoryview(data)
+    if view[0] == TIMESTAMP_TAG[0]:
+        view = view[1 + _timestamp.size:]
+    codec: Codec = _codecs.get(view[0])
+    if codec is not None:
+        view = memoryview(codec.decompress(view[1:]))
+    return _serializers[view[0]].loads(view[1:])
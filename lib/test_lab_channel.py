@@ -0,0 +1,246 @@
+"""
+Redis channel unit test
+
+Needs a redis server on localhost:6379, whose data is flushed by the tests.
+"""
+
+import threading
+import time
+import unittest
+
+import redis
+
+from lib.lab_channel import REFERENCE_TAG, Channel
+from lib.lab_errors import ChannelError, QueueFullError, UnknownMemberError
+
+
+def setUpModule():
+    try:
+        redis.StrictRedis().ping()
+    except redis.ConnectionError:
+        raise unittest.SkipTest('no redis server on localhost:6379')
+
+
+class ChannelTestCase(unittest.TestCase):
+    """Base of the channel tests, starting each test with an empty redis instance"""
+
+    def setUp(self):
+        super().setUp()
+        self.redis = redis.StrictRedis()
+        self.redis.flushall()
+
+    def unknown_id(self) -> str:
+        """Find an id that is not claimed by a member (ids are claimed at random)"""
+        members = {pid.decode() for pid in self.redis.smembers('members')}
+        return next(str(i) for i in range(16) if str(i) not in members)
+
+
+class TestBoundedQueues(ChannelTestCase):
+    """The test of bounded queues and their overflow policies"""
+
+    def make_channel(self, overflow: str) -> tuple:
+        chan = Channel(n_bits=4, max_queue=2, overflow=overflow)
+        return chan, chan.join('client'), chan.join('server')
+
+    def test_fail(self):
+        """Test that sends to a full queue raise QueueFullError and leave the queue as it is"""
+        _, client, server = self.make_channel('fail')
+        client.send_to({server}, 1)
+        client.send_to({server}, 2)
+        with self.assertRaises(QueueFullError):
+            client.send_to({server}, 3)
+        self.assertEqual(server.receive_many(5, 1), [(client, 1), (client, 2)])
+
+    def test_drop(self):
+        """Test that sends to a full queue discard its oldest messages"""
+        _, client, server = self.make_channel('drop')
+        for i in range(4):
+            client.send_to({server}, i)
+        self.assertEqual(server.receive_many(5, 1), [(client, 2), (client, 3)])
+
+    def test_block(self):
+        """Test that sends to a full queue wait until the receiver has taken messages off"""
+        _, client, server = self.make_channel('block')
+        client.send_to({server}, 1)
+        client.send_to({server}, 2)
+        receiver = threading.Thread(target=lambda: (time.sleep(0.2), server.receive_from_any(1)))
+        receiver.start()
+        start = time.monotonic()
+        client.send_to({server}, 3)
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        receiver.join()
+        self.assertEqual(server.receive_many(5, 1), [(client, 2), (client, 3)])
+
+    def test_try_send(self):
+        """Test that try_send rejects a multicast if any destination queue is full"""
+        chan, client, server = self.make_channel('block')
+        other = chan.join('server')
+        client.send_to({server}, 1)
+        client.send_to({server}, 2)
+        self.assertFalse(client.try_send({server, other}, 3))
+        self.assertIsNone(other.receive_from_any(0.1))
+        self.assertTrue(client.try_send({other}, 4))
+        self.assertEqual(other.receive_from_any(1), (client, 4))
+
+
+class TestSharedPayloads(ChannelTestCase):
+    """The test of multicast messages stored once"""
+
+    def setUp(self):
+        super().setUp()
+        self.chan = Channel(n_bits=4, share_threshold=100)
+        self.client = self.chan.join('client')
+        self.servers = [self.chan.join('server') for _ in range(3)]
+
+    def test_references(self):
+        """Test that the shared payload is deleted once the last reference has been resolved"""
+        message = 'x' * 1000
+        self.client.send_to(set(self.servers), message)
+        payloads = self.redis.keys('payload:*')
+        self.assertEqual(len(payloads), 1)
+        head = self.redis.lindex(self.chan.queue_key(self.client, self.servers[0]), 0)
+        self.assertEqual(head, REFERENCE_TAG + payloads[0])
+        for count, server in enumerate(self.servers):
+            self.assertEqual(self.redis.hget(payloads[0], 'refs'), str(len(self.servers) - count).encode())
+            self.assertEqual(server.receive_from_any(1), (self.client, message))
+        self.assertEqual(self.redis.keys('payload:*'), [])
+
+    def test_receive_many(self):
+        """Test that batched receives resolve references"""
+        for i in range(3):
+            self.client.send_to(set(self.servers), str(i) * 1000)
+        for server in self.servers:
+            self.assertEqual([m for _, m in server.receive_many(5, 1)], [str(i) * 1000 for i in range(3)])
+        self.assertEqual(self.redis.keys('payload:*'), [])
+
+    def test_small_messages(self):
+        """Test that messages below the threshold are copied"""
+        self.client.send_to(set(self.servers), 'small')
+        self.assertEqual(self.redis.keys('payload:*'), [])
+        for server in self.servers:
+            self.assertEqual(server.receive_from_any(1), (self.client, 'small'))
+
+
+class TestScripted(ChannelTestCase):
+    """The test of send and receive operations validated and executed by server-side scripts"""
+
+    def setUp(self):
+        super().setUp()
+        self.chan = Channel(n_bits=4, scripted=True, share_threshold=100)
+        self.client = self.chan.join('client')
+        self.server = self.chan.join('server')
+
+    def test_send_receive(self):
+        """Test unicast, broadcast and selective receive"""
+        self.client.send_to({self.server}, 'unicast')
+        self.assertEqual(self.server.receive_from({self.client}, 1), (self.client, 'unicast'))
+        self.client.send_to_all('broadcast')
+        self.assertEqual(self.server.receive_from_any(1), (self.client, 'broadcast'))
+        self.assertEqual(self.client.receive_from_any(1), (self.client, 'broadcast'))
+
+    def test_blocking_receive(self):
+        """Test that a receive without pending messages waits for the next one"""
+        sender = threading.Thread(target=lambda: (time.sleep(0.1), self.client.send_to({self.server}, 'late')))
+        sender.start()
+        self.assertEqual(self.server.receive_from_any(5), (self.client, 'late'))
+        sender.join()
+        self.assertIsNone(self.server.receive_from({self.client}, 0.1))
+
+    def test_unknown_members(self):
+        """Test that the error codes of the scripts raise UnknownMemberError"""
+        unknown = self.unknown_id()
+        with self.assertRaisesRegex(UnknownMemberError, 'unknown receiver'):
+            self.client.send_to({unknown}, 'x')
+        with self.assertRaisesRegex(UnknownMemberError, 'unknown sender'):
+            self.chan.send_to({self.server}, 'x', member=unknown)
+        with self.assertRaisesRegex(UnknownMemberError, 'unknown sender'):
+            self.chan.send_to_all('x', member=unknown)
+        with self.assertRaisesRegex(UnknownMemberError, 'unknown receiver'):
+            self.chan.receive_from_any(0.1, member=unknown)
+        with self.assertRaisesRegex(UnknownMemberError, 'unknown sender'):
+            self.server.receive_from({unknown}, 0.1)
+        self.assertEqual(self.redis.keys('\\[*'), [])
+
+    def test_shared_payload(self):
+        """Test that scripted multicasts store large messages once and release them"""
+        other = self.chan.join('server')
+        self.client.send_to({self.server, other}, 'y' * 1000)
+        self.assertEqual(len(self.redis.keys('payload:*')), 1)
+        self.assertEqual(self.server.receive_from_any(1), (self.client, 'y' * 1000))
+        self.assertEqual(other.receive_from({self.client}, 1), (self.client, 'y' * 1000))
+        self.assertEqual(self.redis.keys('payload:*'), [])
+
+    def test_bounded_queues(self):
+        """Test the overflow policies of scripted sends"""
+        chan = Channel(n_bits=4, scripted=True, max_queue=1, overflow='fail')
+        chan.send_to({self.server}, 1, member=self.client)
+        with self.assertRaises(QueueFullError):
+            chan.send_to({self.server}, 2, member=self.client)
+        self.assertFalse(chan.try_send({self.server}, 2, member=self.client))
+        dropping = Channel(n_bits=4, scripted=True, max_queue=1, overflow='drop')
+        self.assertTrue(dropping.try_send({self.server}, 3, member=self.client))
+        self.assertEqual(self.server.receive_many(5, 1), [(self.client, 3)])
+
+
+class TestLeases(ChannelTestCase):
+    """The test of member leases, leave and the collection of orphaned queues"""
+
+    def test_reap(self):
+        """Test that collect removes members whose lease has expired and deletes their queues"""
+        chan = Channel(n_bits=4, lease=5, share_threshold=100)
+        client = chan.join('client')
+        crashed = chan.join('server')
+        live = chan.join('server')
+        client.send_to({crashed, live}, 'z' * 1000)
+        crashed.send_to({client}, 'last words')
+        self.redis.delete('lease:' + crashed)
+        self.assertEqual(chan.collect(), ([crashed], 2))
+        self.assertFalse(self.redis.sismember('members', crashed))
+        self.assertEqual(self.redis.smembers('reaped'), set())
+        self.assertIsNone(client.receive_from_any(0.1))
+        # the queue of the live member and the shared payload it references are kept
+        self.assertEqual(live.receive_from_any(1), (client, 'z' * 1000))
+        self.assertEqual(self.redis.keys('payload:*'), [])
+
+    def test_collect_keeps_live_queues(self):
+        """Test that collect only deletes queues of former members"""
+        chan = Channel(n_bits=4)
+        client = chan.join('client')
+        server = chan.join('server')
+        client.send_to({server}, 'kept')
+        self.redis.rpush(chan.queue_key(self.unknown_id(), server), b'orphaned')
+        self.assertEqual(chan.collect(), ([], 1))
+        self.assertEqual(server.receive_from_any(1), (client, 'kept'))
+
+    def test_quarantine(self):
+        """Test that join does not claim reaped ids before their queues are deleted"""
+        chan = Channel(n_bits=1)
+        self.redis.sadd('reaped', '0')
+        self.assertEqual(chan.join('client'), '1')
+        with self.assertRaises(ChannelError):
+            chan.join('client')
+        self.redis.rpush(chan.queue_key('1', '0'), b'orphaned')
+        chan.collect()
+        self.assertEqual(self.redis.keys('\\[*'), [])
+        self.assertEqual(chan.join('client'), '0')
+
+    def test_leave(self):
+        """Test that leave deletes the queues of the member, so a new member with its id starts empty"""
+        chan = Channel(n_bits=1, share_threshold=100)
+        client = chan.join('client')
+        server = chan.join('server')
+        client.send_to({server}, 'for the old server')
+        client.send_to({client, server}, 'w' * 1000)
+        server.leave()
+        self.assertEqual(self.redis.smembers('reaped'), set())
+        new = chan.join('server')
+        self.assertEqual(new, server)
+        self.assertIsNone(new.receive_from_any(0.1))
+        self.assertEqual(client.receive_from_any(1), (client, 'w' * 1000))
+        self.assertEqual(self.redis.keys('payload:*'), [])
+        with self.assertRaises(UnknownMemberError):
+            chan.leave('server', member='2')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+"""
+Local channel unit test
+"""
+
+import threading
+import time
+import unittest
+
+from lib.lab_errors import ChannelError, UnknownMemberError
+from lib.lab_local_channel import LocalChannel, LocalHub
+from lib.lab_serializer import MarshalSerializer
+
+
+class TestLocalHub(unittest.TestCase):
+    """The test of the hub"""
+
+    def setUp(self):
+        super().setUp()
+        self.hub = LocalHub()
+
+    def test_join_claims_free_ids(self):
+        """Test that join sweeps the id space once all candidates are taken"""
+        self.assertEqual(self.hub.join('a', 4, [1, 1]), '1')
+        self.assertEqual(self.hub.join('a', 4, [1, 1]), '2')
+        self.assertEqual(self.hub.join('b', 4, [3]), '3')
+        self.assertEqual(self.hub.join('b', 4, [1]), '0')
+        self.assertIsNone(self.hub.join('b', 4, [1]))
+        self.assertEqual(self.hub.members('a'), {'1', '2'})
+
+    def test_push_validates_members(self):
+        """Test that messages are only pushed between members"""
+        sender = self.hub.join('a', 8, [1])
+        receiver = self.hub.join('a', 8, [2])
+        self.assertEqual(self.hub.push('7', [receiver], b'x'), 'unknown sender')
+        self.assertEqual(self.hub.push(sender, ['7'], b'x'), 'unknown receiver')
+        self.assertIsNone(self.hub.push(sender, [receiver], b'x'))
+        self.assertEqual(self.hub.pop(receiver, None, 10, 0.1), [(sender, b'x')])
+
+    def test_leave(self):
+        """Test that leaving removes a member from its groups"""
+        pid = self.hub.join('a', 8, [1])
+        self.assertTrue(self.hub.leave(pid, 'a'))
+        self.assertFalse(self.hub.leave(pid, 'a'))
+        self.assertEqual(self.hub.are_members([pid], 'a'), [False])
+
+
+class TestLocalChannel(unittest.TestCase):
+    """The test of the channel"""
+
+    def setUp(self):
+        super().setUp()
+        self.chan = LocalChannel(n_bits=4, hub=LocalHub())
+        self.server = self.chan.join('server')
+        self.client = self.chan.join('client')
+
+    def test_join(self):
+        """Test that joined members are listed in the channel and their subgroups"""
+        self.assertTrue(self.chan.exists(self.server))
+        self.assertTrue(self.chan.exists(self.client, 'client'))
+        self.assertFalse(self.chan.exists(self.client, 'server'))
+        self.assertEqual(self.chan.subgroup('server'), {str(self.server)})
+
+    def test_join_full(self):
+        """Test that join fails if the id space is full"""
+        for _ in range(14):
+            self.chan.join('client')
+        with self.assertRaises(ChannelError):
+            self.chan.join('client')
+
+    def test_send_receive(self):
+        """Test sending and receiving with Member endpoints"""
+        self.client.send_to({self.server}, ('GET', 1))
+        self.assertEqual(self.server.receive_from_any(1), (self.client, ('GET', 1)))
+        self.server.send_to({self.client}, 'reply')
+        self.assertEqual(self.client.receive_from({self.server}, 1), (self.server, 'reply'))
+
+    def test_bound_member(self):
+        """Test sending and receiving on behalf of the member bound to the process"""
+        self.chan.bind(self.client)
+        self.chan.send_to({self.server}, 'bound')
+        self.assertEqual(self.chan.receive_from_any(1, member=self.server), (self.client, 'bound'))
+
+    def test_receive_copies(self):
+        """Test that receivers get copies of the sent message"""
+        message = ['mutable']
+        self.client.send_to({self.server}, message)
+        message.append('changed')
+        self.assertEqual(self.server.receive_from_any(1)[1], ['mutable'])
+
+    def test_send_to_all(self):
+        """Test that a broadcast reaches all members including the sender"""
+        self.server.send_to_all('hello')
+        self.assertEqual(self.client.receive_from_any(1), (self.server, 'hello'))
+        self.assertEqual(self.server.receive_from_any(1), (self.server, 'hello'))
+
+    def test_receive_from(self):
+        """Test that a selective receive leaves messages of other senders queued"""
+        other = self.chan.join('client')
+        other.send_to({self.server}, 'first')
+        self.client.send_to({self.server}, 'second')
+        self.assertEqual(self.server.receive_from({self.client}, 1), (self.client, 'second'))
+        self.assertEqual(self.server.receive_from_any(1), (other, 'first'))
+
+    def test_receive_many(self):
+        """Test that up to max_count messages are taken in order"""
+        for i in range(5):
+            self.client.send_to({self.server}, i)
+        self.assertEqual(self.server.receive_many(3, 1), [(self.client, 0), (self.client, 1), (self.client, 2)])
+        self.assertEqual(self.server.receive_from_many({self.client}, 10, 1), [(self.client, 3), (self.client, 4)])
+
+    def test_timeout(self):
+        """Test that receive operations return None (or nothing) on timeout"""
+        start = time.monotonic()
+        self.assertIsNone(self.server.receive_from_any(0.2))
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertEqual(self.server.receive_many(5, 0.1), [])
+
+    def test_blocking_receive(self):
+        """Test that a waiting receiver is woken up by a send from another thread"""
+        sender = threading.Thread(target=lambda: (time.sleep(0.1), self.client.send_to({self.server}, 'late')))
+        sender.start()
+        self.assertEqual(self.server.receive_from_any(5), (self.client, 'late'))
+        sender.join()
+
+    def test_try_send(self):
+        """Test that try_send always sends to unbounded local queues"""
+        self.assertTrue(self.client.try_send({self.server}, 'x'))
+        self.assertEqual(self.server.receive_from_any(1), (self.client, 'x'))
+
+    def test_unknown_members(self):
+        """Test that operations of or with non-members raise UnknownMemberError"""
+        with self.assertRaises(UnknownMemberError):
+            self.client.send_to({'99'}, 'x')
+        with self.assertRaises(UnknownMemberError):
+            self.chan.receive_from_any(0.1, member='99')
+        with self.assertRaises(UnknownMemberError):
+            self.server.receive_from({'99'}, 0.1)
+
+    def test_id_types(self):
+        """Test that destination and sender ids other than strings raise TypeError"""
+        with self.assertRaises(TypeError):
+            self.client.send_to({1}, 'x')
+        with self.assertRaises(TypeError):
+            self.server.receive_from({1}, 0.1)
+        with self.assertRaises(TypeError):
+            self.server.receive_from_many({1}, 5, 0.1)
+
+    def test_leave(self):
+        """Test that members that left can neither send nor receive"""
+        self.client.send_to({self.server}, 'before')
+        self.client.leave()
+        self.assertFalse(self.chan.exists(self.client))
+        with self.assertRaises(UnknownMemberError):
+            self.client.send_to({self.server}, 'after')
+        with self.assertRaises(UnknownMemberError):
+            self.client.leave()
+        # messages of members that left are not received anymore
+        self.assertIsNone(self.server.receive_from_any(0.1))
+
+    def test_serializer(self):
+        """Test that messages of different serializers can be received"""
+        marshalling = LocalChannel(n_bits=4, hub=self.chan.channel, serializer=MarshalSerializer())
+        marshalling.send_to({self.server}, {'key': [1, 2]}, member=self.client)
+        self.assertEqual(self.server.receive_from_any(1), (self.client, {'key': [1, 2]}))
+
+
+if __name__ == "__main__":
+    unittest.main()
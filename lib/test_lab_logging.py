@@ -0,0 +1,108 @@
+"""
+Asynchronous logging unit test
+"""
+
+import io
+import logging
+import os
+import queue
+import tempfile
+import threading
+import unittest
+
+from lib.lab_logging import FORMAT, AsyncWriter, BoundedQueueHandler
+
+
+def make_record(level: int, message: str, *args) -> logging.LogRecord:
+    return logging.LogRecord('vs2lab.test', level, __file__, 0, message, args, None)
+
+
+class TestBoundedQueueHandler(unittest.TestCase):
+    """The test of the queue handler"""
+
+    def test_drop_when_full(self):
+        """Test that debug and info records are dropped and counted if the queue is full"""
+        record_queue = queue.Queue(2)
+        handler = BoundedQueueHandler(record_queue)
+        for i in range(4):
+            handler.handle(make_record(logging.INFO, 'info %d', i))
+        self.assertEqual(record_queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 2)
+
+    def test_warning_timeout(self):
+        """Test that warnings wait for free space at most timeout seconds"""
+        handler = BoundedQueueHandler(queue.Queue(1), timeout=0.1)
+        handler.handle(make_record(logging.WARNING, 'first'))
+        handler.handle(make_record(logging.WARNING, 'second'))
+        self.assertEqual(handler.dropped, 1)
+
+
+class TestAsyncWriter(unittest.TestCase):
+    """The test of the writer thread"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'test.log')
+        self.file_handler = logging.FileHandler(self.path)
+        self.file_handler.setFormatter(logging.Formatter(FORMAT))
+        self.file_handler.setLevel(logging.DEBUG)
+        self.stream = io.StringIO()
+        self.stream_handler = logging.StreamHandler(self.stream)
+        self.stream_handler.setLevel(logging.WARNING)
+        self.queue = queue.Queue(100)
+        self.handler = BoundedQueueHandler(self.queue)
+        self.writer = AsyncWriter(self.queue, self.file_handler, self.stream_handler, batch_size=4)
+
+    def test_write(self):
+        """Test that queued records are written to the file and (by level) to the stream on stop"""
+        self.writer.start()
+        for i in range(10):
+            self.handler.handle(make_record(logging.DEBUG, 'debug %d', i))
+        self.handler.handle(make_record(logging.WARNING, 'warning'))
+        self.writer.stop()
+        with open(self.path, encoding='utf-8') as log:
+            lines = log.read().splitlines()
+        self.assertEqual(len(lines), 11)
+        self.assertTrue(lines[0].endswith('DEBUG - debug 0'))
+        self.assertTrue(lines[-1].endswith('WARNING - warning'))
+        self.assertEqual(self.stream.getvalue().count('\n'), 1)
+        self.assertIn('warning', self.stream.getvalue())
+
+    def test_lazy_formatting(self):
+        """Test that message arguments are converted to text by the writer thread"""
+        threads = []
+
+        class Argument:
+            def __str__(self):
+                threads.append(threading.current_thread())
+                return 'argument'
+
+        self.handler.handle(make_record(logging.DEBUG, 'lazy %s', Argument()))
+        self.assertEqual(threads, [])
+        self.writer.start()
+        self.writer.stop()
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_bad_arguments(self):
+        """Test that a record with wrong message arguments does not stop the writer thread"""
+        errors = []
+        self.file_handler.handleError = errors.append
+        self.writer.start()
+        self.handler.handle(make_record(logging.INFO, 'bad %d', 'x'))
+        self.handler.handle(make_record(logging.INFO, 'good %d', 1))
+        self.writer.stop()
+        self.assertEqual([record.msg for record in errors], ['bad %d'])
+        with open(self.path, encoding='utf-8') as log:
+            lines = log.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith('INFO - good 1'))
+
+    def tearDown(self):
+        self.writer.stop()
+        self.directory.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
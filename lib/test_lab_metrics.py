@@ -0,0 +1,68 @@
+"""
+Channel metrics unit test
+"""
+
+import unittest
+
+from lib.lab_metrics import ChannelStats, Histogram
+
+
+class TestHistogram(unittest.TestCase):
+    """The test of latency histograms"""
+
+    def test_buckets(self):
+        """Test that durations are counted in logarithmic buckets"""
+        histogram = Histogram()
+        histogram.add(0.0000005)  # below 1 us
+        histogram.add(0.0003)  # 300 us
+        histogram.add(0.0003)
+        histogram.add(3600.0)  # beyond the last bucket
+        self.assertEqual(histogram.snapshot(), {'1': 1, '512': 2, str(2 ** (Histogram.BUCKETS - 1)): 1})
+        self.assertAlmostEqual(histogram.total, 3600.0006005)
+
+
+class TestChannelStats(unittest.TestCase):
+    """The test of per-operation metrics"""
+
+    def setUp(self):
+        super().setUp()
+        self.stats = ChannelStats()
+
+    def test_record(self):
+        """Test that calls are summed up per operation and queue"""
+        self.stats.record('send_to', 1, 0.001, bytes_sent=100, bytes_serialized=400, sent=['q1', 'q2'])
+        self.stats.record('send_to', 2, 0.002, bytes_sent=50, sent=['q1'])
+        self.stats.record('receive_from_any', 1, 0.5, bytes_received=100, blocked=0.4, received=['q1'])
+        snapshot = self.stats.snapshot()
+        send = snapshot['operations']['send_to']
+        self.assertEqual(send['calls'], 2)
+        self.assertEqual(send['round_trips'], 3)
+        self.assertEqual(send['bytes_sent'], 150)
+        self.assertEqual(send['bytes_serialized'], 450)
+        self.assertEqual(send['compression_ratio'], 3.0)
+        receive = snapshot['operations']['receive_from_any']
+        self.assertEqual(receive['bytes_received'], 100)
+        self.assertIsNone(receive['compression_ratio'])
+        self.assertAlmostEqual(receive['blocked_seconds'], 0.4)
+        self.assertEqual(snapshot['queues'], {'q1': {'sent': 2, 'received': 1}, 'q2': {'sent': 1, 'received': 0}})
+
+    def test_shared_bytes(self):
+        """Test that bytes saved by shared payloads do not count as compression"""
+        self.stats.record('send_to', 1, 0.001, bytes_sent=1100, bytes_serialized=3000, bytes_shared=1900)
+        send = self.stats.snapshot()['operations']['send_to']
+        self.assertEqual(send['bytes_shared'], 1900)
+        self.assertEqual(send['compression_ratio'], 1.0)
+
+    def test_reset(self):
+        """Test that reset drops all metrics"""
+        self.stats.record('join', 1, 0.001)
+        since = self.stats.snapshot()['since']
+        self.stats.reset()
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot['operations'], {})
+        self.assertEqual(snapshot['queues'], {})
+        self.assertGreaterEqual(snapshot['since'], since)
+
+
+if __name__ == "__main__":
+    unittest.main()
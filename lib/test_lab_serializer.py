@@ -0,0 +1,157 @@
+"""
+Serializer unit test
+"""
+
+import json
+import time
+import unittest
+import zlib
+
+from lib import lab_serializer
+from lib.lab_serializer import (Compressor, LzmaCodec, MarshalSerializer, MsgpackSerializer, PickleSerializer,
+                                ZlibCodec)
+
+
+class TestSerializers(unittest.TestCase):
+    """The test of the serializers"""
+
+    MESSAGE = {'op': 'GET', 'args': [1, 2.5, None], 'key': 'name'}
+
+    def test_pickle(self):
+        """Test round trips of pickled messages"""
+        for serializer in [PickleSerializer(), PickleSerializer(protocol=4)]:
+            data = serializer.dumps(self.MESSAGE)
+            self.assertEqual(data[:1], PickleSerializer.tag)
+            self.assertEqual(lab_serializer.loads(data), self.MESSAGE)
+
+    def test_pickle_out_of_band(self):
+        """Test that large binary objects survive the out-of-band transfer"""
+        payload = bytes(range(256)) * 64
+        data = PickleSerializer(threshold=1024).dumps({'payload': payload, 'view': memoryview(payload)})
+        message = lab_serializer.loads(data)
+        self.assertEqual(message['payload'], payload)
+        self.assertIsInstance(message['payload'], bytes)
+        self.assertIsInstance(message['view'], memoryview)
+        self.assertEqual(message['view'].tobytes(), payload)
+
+    def test_marshal(self):
+        """Test round trips of marshalled messages"""
+        data = MarshalSerializer().dumps(self.MESSAGE)
+        self.assertEqual(data[:1], MarshalSerializer.tag)
+        self.assertEqual(lab_serializer.loads(data), self.MESSAGE)
+
+    @unittest.skipIf(lab_serializer.msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        """Test round trips of msgpack messages (sequences are decoded as tuples)"""
+        data = MsgpackSerializer().dumps(self.MESSAGE)
+        self.assertEqual(lab_serializer.loads(data), dict(self.MESSAGE, args=(1, 2.5, None)))
+
+
+class _JsonSerializer(lab_serializer.Serializer):
+    """Custom serializer of the registration test"""
+
+    tag: bytes = b'J'
+
+    def dumps(self, message: object) -> bytes:
+        return self.tag + json.dumps(message).encode()
+
+    def loads(self, view: memoryview) -> object:
+        return json.loads(bytes(view))
+
+
+class _BestZlibCodec(lab_serializer.Codec):
+    """Custom codec of the registration test"""
+
+    tag: bytes = b'B'
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, 9)
+
+    def decompress(self, view: memoryview) -> bytes:
+        return zlib.decompress(view)
+
+
+class TestRegistration(unittest.TestCase):
+    """The test of custom serializers and codecs"""
+
+    def test_register_serializer(self):
+        """Test that messages of a registered serializer are decoded"""
+        lab_serializer.register_serializer(_JsonSerializer())
+        self.addCleanup(lab_serializer._serializers.pop, _JsonSerializer.tag[0])
+        data = _JsonSerializer().dumps({'a': [1, 2]})
+        self.assertEqual(lab_serializer.loads(data), {'a': [1, 2]})
+        data = _JsonSerializer().dumps(['a'] * 1000)
+        self.assertEqual(lab_serializer.loads(Compressor(threshold=0).pack(data)), ['a'] * 1000)
+        # registering the same kind of serializer again is allowed
+        lab_serializer.register_serializer(_JsonSerializer())
+
+    def test_reject_used_tags(self):
+        """Test that tags of other serializers, codecs and reserved tags are rejected"""
+        for tag in [PickleSerializer.tag, ZlibCodec.tag, b'R', lab_serializer.TIMESTAMP_TAG, b'', b'JJ']:
+            serializer = _JsonSerializer()
+            serializer.tag = tag
+            with self.assertRaises(ValueError):
+                lab_serializer.register_serializer(serializer)
+
+    def test_register_codec(self):
+        """Test that messages of a registered codec are decompressed"""
+        lab_serializer.register_codec(_BestZlibCodec())
+        self.addCleanup(lab_serializer._codecs.pop, _BestZlibCodec.tag[0])
+        packed = Compressor(_BestZlibCodec(), threshold=0).pack(MarshalSerializer().dumps('abc' * 100))
+        self.assertEqual(packed[:1], _BestZlibCodec.tag)
+        self.assertEqual(lab_serializer.loads(packed), 'abc' * 100)
+
+    def test_reject_used_codec_tags(self):
+        """Test that codec tags of serializers, other codecs and reserved tags are rejected"""
+        for tag in [PickleSerializer.tag, LzmaCodec.tag, b'R', lab_serializer.TIMESTAMP_TAG]:
+            codec = _BestZlibCodec()
+            codec.tag = tag
+            with self.assertRaises(ValueError):
+                lab_serializer.register_codec(codec)
+
+
+class TestCompressor(unittest.TestCase):
+    """The test of compression"""
+
+    def test_threshold(self):
+        """Test that only messages of at least threshold bytes are compressed"""
+        compressor = Compressor(threshold=100)
+        small = MarshalSerializer().dumps('x' * 10)
+        self.assertIs(compressor.pack(small), small)
+        large = MarshalSerializer().dumps('x' * 1000)
+        packed = compressor.pack(large)
+        self.assertEqual(packed[:1], ZlibCodec.tag)
+        self.assertLess(len(packed), len(large))
+        self.assertEqual(lab_serializer.loads(packed), 'x' * 1000)
+
+    def test_codecs(self):
+        """Test round trips of compressed messages with each codec"""
+        data = PickleSerializer().dumps(['abc'] * 1000)
+        for codec in [ZlibCodec(), LzmaCodec()]:
+            packed = Compressor(codec, threshold=0).pack(data)
+            self.assertEqual(packed[:1], codec.tag)
+            self.assertEqual(lab_serializer.loads(packed), ['abc'] * 1000)
+
+    def test_incompressible(self):
+        """Test that messages that do not get smaller are left uncompressed"""
+        data = PickleSerializer().dumps(bytes(range(256)))
+        self.assertIs(Compressor(threshold=0).pack(data), data)
+
+
+class TestTimestamps(unittest.TestCase):
+    """The test of timestamps"""
+
+    def test_stamp(self):
+        """Test that stamped (and compressed) messages carry their send time"""
+        data = lab_serializer.stamp(Compressor(threshold=0).pack(MarshalSerializer().dumps('y' * 1000)))
+        self.assertAlmostEqual(lab_serializer.timestamp(data), time.time(), delta=5)
+        self.assertAlmostEqual(lab_serializer.timestamp(data[:9]), time.time(), delta=5)
+        self.assertEqual(lab_serializer.loads(data), 'y' * 1000)
+
+    def test_unstamped(self):
+        """Test that messages without timestamp have none"""
+        self.assertIsNone(lab_serializer.timestamp(MarshalSerializer().dumps('z')))
+
+
+if __name__ == "__main__":
+    unittest.main()